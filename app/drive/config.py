@@ -1,12 +1,12 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Optional, Dict, List, Literal
 from pydantic import field_validator
 import json
-import os
 
 class Settings(BaseSettings):
     GOOGLE_SERVICE_ACCOUNT_JSON: str
     GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT: Optional[str] = None
+    GOOGLE_SERVICE_ACCOUNTS: List[str] = []           # Varias cuentas (ruta o contenido JSON c/u) para repartir la cuota
 
     PROFILE_IMAGE_FOLDER_ID: str
     PRODUCTS_IMAGE_FOLDER_ID: str
@@ -18,6 +18,122 @@ class Settings(BaseSettings):
         ".jpg", ".jpeg", ".png", ".webp",
         ".mp4", ".mov", ".avi", ".webm", ".mkv", ".pdf"
     ]
+
+    # 🔌 Cliente de Google Drive
+    DRIVE_HTTP_TIMEOUT: int = 60                      # Timeout (s) del transporte HTTP por hilo
+    DRIVE_TOKEN_REFRESH_MARGIN_SECONDS: int = 300     # Refresca el token OAuth antes de que expire
+    DRIVE_BACKEND: Literal["googleapiclient", "httpx"] = "googleapiclient"  # Backend hilos vs. async nativo
+    DRIVE_API_BASE_URL: Optional[str] = None          # Endpoint alternativo de la API (por defecto Google)
+    DRIVE_ASYNC_MAX_CONNECTIONS: int = 20             # Conexiones HTTP/2 del backend async
+    DRIVE_ACCOUNT_ROUTING: Literal["least_loaded", "hash"] = "least_loaded"  # Reparto entre service accounts
+    DRIVE_ACCOUNT_EJECT_SECONDS: float = 30.0         # Tiempo fuera de rotación tras un error de cuota
+
+    # 📁 Cache de resolución de carpetas (parent_id, name) -> folder_id
+    FOLDER_CACHE_MAX_ENTRIES: int = 10000
+    FOLDER_CACHE_TTL_SECONDS: int = 3600
+    FOLDER_CACHE_SQLITE_PATH: Optional[str] = None    # Archivo SQLite compartido entre workers (opcional)
+
+    # 📄 Listados paginados
+    LIST_PAGE_SIZE: int = 100                         # Archivos por página pedidos a Drive
+    LIST_MAX_PAGE_SIZE: int = 1000                    # Máximo que acepta files.list
+    LIST_ORDER_BY: str = "name"                       # Orden estable para que los cursores sean consistentes
+
+    # 🗂️ Manifiestos de producto (consultas agrupadas)
+    MANIFEST_PARENTS_PER_QUERY: int = 25              # Carpetas por consulta "'a' in parents or ..."
+    MANIFEST_MAX_PRODUCTS: int = 100                  # Máximo de productos por pedido bulk
+
+    # 📦 Subidas en lote (varios archivos en un mismo request multipart)
+    BATCH_UPLOAD_MAX_FILES: int = 100
+    BATCH_UPLOAD_CONCURRENCY: int = 8                 # Subidas simultáneas por lote
+
+    # 🧺 Pedidos batch de Drive (hasta 100 sub-requests por llamada HTTP)
+    BATCH_MAX_ITEMS: int = 1000                       # Máximo de IDs por pedido a /metadata:batchGet
+    BATCH_MAX_ATTEMPTS: int = 4                       # Intentos por sub-request ante 429/5xx
+
+    # 🗄️ Índice local de metadata sincronizado con changes.list (deshabilitado si no hay ruta)
+    METADATA_INDEX_PATH: Optional[str] = None
+    METADATA_INDEX_POLL_SECONDS: int = 10             # Intervalo de consulta del feed de cambios
+    METADATA_INDEX_MAX_LAG_SECONDS: int = 60          # Con más atraso, las lecturas vuelven a Drive
+
+    # ♻️ Deduplicación de subidas por MD5 del contenido dentro de la carpeta destino (opt-in)
+    UPLOAD_DEDUP: bool = False
+
+    # 🖼️ Miniaturas generadas al subir imágenes (requiere Pillow; opt-in: lista vacía = deshabilitado)
+    THUMBNAIL_SIZES: List[int] = []                   # Lado mayor en px, p.ej. [128, 512, 1024]
+    IMAGE_WORKERS: int = 2                            # Procesos del pool de imágenes
+    IMAGE_MAX_SOURCE_BYTES: int = 25 * 1024 * 1024    # Imágenes más grandes no se procesan
+
+    # 🔄 Transcoding de imágenes al subir (None = se guardan tal cual)
+    TRANSCODE_FORMAT: Optional[Literal["webp", "avif"]] = None
+    TRANSCODE_QUALITY: Dict[str, int] = {             # Tipos a transcodificar y calidad de cada uno
+        "image/jpeg": 80,
+        "image/png": 90,
+    }
+    TRANSCODE_KEEP_ORIGINAL: bool = False             # Guarda el original para clientes sin soporte
+
+    # 📥 Descargas en streaming
+    DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024            # Bytes por chunk pedido a Drive
+    DOWNLOAD_CACHE_CONTROL: str = "private, max-age=300"  # Cache-Control de las descargas
+
+    # 🔏 URLs de descarga firmadas (HMAC) y de corta duración, sin JWT ni validación de carpetas
+    SIGNED_URL_SECRET_KEY: Optional[str] = None       # Por defecto se deriva de JWT_SECRET_KEY
+    SIGNED_URL_BASE_URL: Optional[str] = None         # Origen público (p.ej. la CDN); por defecto, el del request
+    SIGNED_URL_TTL_SECONDS: int = 300
+    SIGNED_URL_MAX_TTL_SECONDS: int = 3600
+    SIGNED_URL_EXPIRY_BUCKET_SECONDS: int = 60        # Redondeo del vencimiento: URLs estables y cacheables
+    SIGNED_URL_CACHE_MAX_AGE_SECONDS: int = 86400     # Tope del max-age (además del vencimiento de la URL)
+
+    # 🗜️ Exportación de carpetas como ZIP en streaming
+    EXPORT_ZIP_CONCURRENCY: int = 4                   # Archivos descargándose a la vez (en orden)
+    EXPORT_ZIP_PREFETCH_CHUNKS: int = 2               # Chunks por archivo bajados antes de escribirlos
+
+    # 👥 Resolución de imágenes de perfil en bloque
+    AVATAR_MAX_ITEMS: int = 200                       # Usuarios + archivos por pedido
+    AVATAR_NAMES_PER_QUERY: int = 120                 # Nombres exactos (usuario × extensión) por consulta "name = 'a.jpg' or ..."
+    AVATAR_INLINE_SIZE: int = 128                     # Lado mayor (px) de las miniaturas incrustadas
+    AVATAR_INLINE_MAX_BYTES: int = 16 * 1024          # Más grandes no se incrustan: queda la URL firmada
+    AVATAR_INLINE_CONCURRENCY: int = 8                # Miniaturas descargadas a la vez
+
+    # 🤝 Descargas simultáneas del mismo archivo comparten una sola llamada a Drive (opt-in)
+    DOWNLOAD_COALESCE: bool = False
+    DOWNLOAD_COALESCE_BUFFER_CHUNKS: int = 8          # Chunks retenidos para los clientes que se suman
+    DOWNLOAD_COALESCE_MAX_LAG_SECONDS: float = 5.0    # Espera máxima por un cliente lento antes de soltarlo
+
+    # 💾 Cache de contenido en disco (deshabilitado si no se define el directorio)
+    CONTENT_CACHE_DIR: Optional[str] = None
+    CONTENT_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    CONTENT_CACHE_MAX_ENTRY_BYTES: int = 50 * 1024 * 1024
+
+    # 📤 Uploads resumables por chunks (múltiplo de 256 KiB)
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024
+
+    # 🚧 Bulkheads: hilos y cola por tipo de tráfico hacia Drive
+    DRIVE_METADATA_WORKERS: int = 16
+    DRIVE_METADATA_QUEUE_SIZE: int = 64
+    DRIVE_UPLOAD_WORKERS: int = 4
+    DRIVE_UPLOAD_QUEUE_SIZE: int = 16
+    DRIVE_DOWNLOAD_WORKERS: int = 8
+    DRIVE_DOWNLOAD_QUEUE_SIZE: int = 32
+    DRIVE_RETRY_AFTER_SECONDS: int = 2                # Header Retry-After de las respuestas 503
+
+    # 🔁 Reintentos de llamadas a Drive (429, 403 por cuota y 5xx) con backoff exponencial y jitter
+    DRIVE_MAX_ATTEMPTS: int = 5
+    DRIVE_RETRY_BASE_SECONDS: float = 0.5
+    DRIVE_RETRY_MAX_SECONDS: float = 16.0
+
+    # 📈 Límite adaptativo (AIMD) de llamadas simultáneas a Drive
+    DRIVE_AIMD_INITIAL_LIMIT: int = 8
+    DRIVE_AIMD_MIN_LIMIT: int = 1
+    DRIVE_AIMD_MAX_LIMIT: int = 64
+    DRIVE_AIMD_DECREASE_FACTOR: float = 0.5           # Factor al recibir un error de cuota
+    DRIVE_AIMD_COOLDOWN_SECONDS: float = 1.0          # Una sola reducción por ventana de errores
+    DRIVE_AIMD_ACQUIRE_TIMEOUT_SECONDS: float = 30.0  # Espera máxima por un lugar antes de responder 503
+
+    # 🔥 Warm-up al arrancar: credenciales, token, carpetas raíz y carpetas de productos frecuentes (opt-in)
+    WARMUP_ENABLED: bool = False
+    WARMUP_PRODUCT_IDS: List[str] = []                # Productos cuyas carpetas se resuelven de antemano
+    WARMUP_TIMEOUT_SECONDS: float = 30.0              # Pasado este tiempo el servicio se declara listo igual
+
     @field_validator("ALLOWED_ORIGINS", mode="before")
     @classmethod
     def parse_origins(cls, v):
@@ -33,21 +149,3 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 settings = Settings()
-
-# --- Reconstrucción segura del archivo de credenciales ---
-cred_path = settings.GOOGLE_SERVICE_ACCOUNT_JSON
-
-if not os.path.isfile(cred_path):
-    if settings.GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT:
-        os.makedirs(os.path.dirname(cred_path), exist_ok=True)
-        try:
-            content = json.loads(settings.GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT)
-        except json.JSONDecodeError:
-            raise RuntimeError("Contenido de GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT inválido.")
-        with open(cred_path, "w") as f:
-            json.dump(content, f, ensure_ascii=False, indent=2)
-    else:
-        raise RuntimeError(
-            "❌ No se encontró el fichero de credenciales "
-            "ni la variable GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT."
-        )
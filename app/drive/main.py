@@ -1,12 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from app.drive.services.backends import get_backend
+from app.drive.services.derivatives import shutdown_image_pool
+from app.drive.services.metadata_index import metadata_index, run_index_sync
+from app.drive.services.warmup import readiness, warm_up
 
 from app.drive.routes.profile_routes import router as profile_router
 from app.drive.routes.product_routes import router as product_router
 from app.drive.routes.subproduct_routes import router as subproduct_router
+from app.drive.routes.metadata_routes import router as metadata_router
+from app.drive.routes.signed_routes import router as signed_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    drive = get_backend()
+    tasks = []
+    # 🔥 El warm-up corre en segundo plano: el proceso ya responde mientras /ready da 503
+    if settings.WARMUP_ENABLED:
+        tasks.append(asyncio.create_task(warm_up(drive)))
+    else:
+        readiness.ready = True
+    # 🗄️ Mantiene el índice local de metadata al día en segundo plano
+    if metadata_index:
+        tasks.append(asyncio.create_task(run_index_sync(metadata_index)))
+
+    yield
 
-app = FastAPI(title="Inventory Drive Storage API")
+    for task in tasks:
+        task.cancel()
+    await drive.aclose()
+    shutdown_image_pool()
+
+app = FastAPI(title="Inventory Drive Storage API", lifespan=lifespan)
 
 # Middleware CORS con lista de orígenes desde settings.ALLOWED_ORIGINS
 app.add_middleware(
@@ -21,7 +52,18 @@ app.add_middleware(
 async def root():
     return {"message": "🚀 API de almacenamiento de archivos con Google Drive"}
 
+@app.get("/ready")
+async def ready():
+    # 🚦 Readiness: listo recién cuando terminó el warm-up de arranque
+    return JSONResponse(readiness.snapshot(), status_code=200 if readiness.ready else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
 # Routers agrupados
 app.include_router(profile_router)
 app.include_router(product_router)
 app.include_router(subproduct_router)
+app.include_router(metadata_router)
+app.include_router(signed_router)
@@ -0,0 +1,45 @@
+from typing import List
+
+from fastapi import APIRouter, Body, HTTPException, Depends, status
+
+from app.drive.auth import auth_dependency
+from app.drive.config import settings
+
+from app.drive.services.backends import get_backend
+from app.drive.utils.responses import build_batch_response
+
+router = APIRouter(
+    prefix="/metadata",
+    tags=["Metadata"],
+    dependencies=[Depends(auth_dependency)]
+)
+
+
+@router.post(":batchGet", summary="Metadata de varios archivos")
+async def batch_get_metadata(
+    file_ids: List[str] = Body(..., embed=True, min_length=1, max_length=settings.BATCH_MAX_ITEMS),
+    _: dict = Depends(auth_dependency)
+):
+    """
+    📑 Devuelve la metadata de varios archivos con pedidos batch de Drive (hasta 100 por llamada HTTP).
+
+    Responde 200 si se encontraron todos o 207 con el resultado de cada archivo
+    (p.ej. 404 para los que no existen).
+    """
+    try:
+        found = await get_backend().get_files_metadata(file_ids)
+        results = []
+        for file_id in dict.fromkeys(file_ids):
+            result = found[file_id]
+            if result["status"] < 300:
+                results.append({"file_id": file_id, "status": result["status"], "metadata": result["result"]})
+            else:
+                results.append({"file_id": file_id, "status": result["status"], "detail": result.get("detail")})
+        return build_batch_response(results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener la metadata: {str(e)}"
+        )
@@ -1,20 +1,20 @@
-import io
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
-from fastapi.responses import StreamingResponse
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Query, Request, UploadFile, File, HTTPException, Depends, status
 
 from app.drive.auth import auth_dependency
 from app.drive.config import settings
 
 # Servicios
-from app.drive.services.upload import prepare_upload, upload_file_to_folder
-from app.drive.services.download import download_file, get_file_metadata
-from app.drive.services.delete import delete_file
-from app.drive.services.folders import get_or_create_subfolder
-from app.drive.services.list_files import list_files_in_folder
-from app.drive.services.client import get_drive_service
+from app.drive.services.upload import prepare_upload
+from app.drive.services.backends import get_backend
+from app.drive.services.manifest import build_manifests
+from app.drive.services.batch import delete_folder_tree, upload_many
 
 # Validación centralizada
-from app.drive.utils.validations import validate_file_extension
+from app.drive.utils.validations import validate_batch_size, validate_file_extension
+from app.drive.utils.responses import build_batch_response, build_download_response, build_listing_response, build_zip_response, prefetch_download, should_prefetch
+from app.drive.utils.task_graph import TaskGraph
 
 router = APIRouter(
     prefix="/product",
@@ -28,31 +28,63 @@ async def upload_product_file(product_id: str, file: UploadFile = File(...), _:
     📤 Sube una imagen a la carpeta específica del producto en Google Drive.
     """
     try:
+        drive = get_backend()
+
         # 1. Validación + preparación
         validate_file_extension(file.filename)
         data, _, mimetype = prepare_upload(file)
 
         # 2. Obtener carpeta del producto
-        service = get_drive_service()
-        folder_id = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
+        folder_id = await drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
 
         # 3. Subida al folder
-        file_id = upload_file_to_folder(data, file.filename, mimetype, folder_id, service)
+        file_id = await drive.upload_file_to_folder(data, file.filename, mimetype, folder_id)
 
         return {"message": "Imagen de producto subida con éxito", "file_id": file_id}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al subir la imagen: {str(e)}"
         )
 
+@router.post("/{product_id}/upload/batch", summary="Subir varias imágenes de producto")
+async def upload_product_files_batch(product_id: str, files: List[UploadFile] = File(...), _: dict = Depends(auth_dependency)):
+    """
+    📦 Sube varias imágenes a la carpeta del producto en un solo request.
+
+    La carpeta se resuelve una vez y los archivos se suben en paralelo. Responde 200 si
+    todos se subieron o 207 con el resultado de cada archivo si alguno falló.
+    """
+    try:
+        validate_batch_size(len(files), settings.BATCH_UPLOAD_MAX_FILES)
+        drive = get_backend()
+        folder_id = await drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        results = await upload_many(drive, files, folder_id)
+        return build_batch_response(results, product_id=product_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al subir las imágenes: {str(e)}"
+        )
+
 @router.get("/{product_id}/list", summary="Listar imágenes del producto")
-async def list_product_files(product_id: str, _: dict = Depends(auth_dependency)):
+async def list_product_files(
+    product_id: str,
+    page_token: Optional[str] = Query(None, description="Cursor devuelto como next_page_token"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.LIST_MAX_PAGE_SIZE, description="Tamaño de página"),
+    stream: bool = Query(False, description="Transmitir el listado como NDJSON"),
+    _: dict = Depends(auth_dependency)
+):
     try:
-        service = get_drive_service()
-        folder_id = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
-        images = list_files_in_folder(folder_id, service)
-        return {"images": images}
+        drive = get_backend()
+        folder_id = await drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        return await build_listing_response(folder_id, page_token, limit, ndjson=stream)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -60,31 +92,100 @@ async def list_product_files(product_id: str, _: dict = Depends(auth_dependency)
         )
         
         
-@router.get("/{product_id}/download/{file_id}", summary="Descargar imagen de producto")
-async def download_product_file(product_id: str, file_id: str, _: dict = Depends(auth_dependency)):
+@router.get("/{product_id}/export.zip", summary="Exportar imágenes del producto como ZIP")
+async def export_product_files(
+    product_id: str,
+    subproducts: bool = Query(True, description="Incluir las imágenes de los subproductos (una carpeta por subproducto)"),
+    _: dict = Depends(auth_dependency)
+):
+    """
+    🗜️ Descarga todas las imágenes del producto en un ZIP que se transmite mientras se arma:
+    los archivos se bajan de Drive en paralelo (acotado) y se guardan sin recomprimir.
+    """
+    try:
+        folder_id = await get_backend().get_subfolder_id(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        if not folder_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Producto {product_id} no encontrado")
+        return await build_zip_response(folder_id, f"{product_id}.zip", subfolders=subproducts)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al exportar las imágenes: {str(e)}"
+        )
+
+
+@router.post("/manifest", summary="Manifiesto de imágenes de varios productos")
+async def bulk_product_manifest(
+    product_ids: List[str] = Body(..., embed=True, min_length=1, max_length=settings.MANIFEST_MAX_PRODUCTS),
+    _: dict = Depends(auth_dependency)
+):
+    """
+    🗂️ Devuelve el árbol de imágenes (producto + subproductos) de varios productos a la vez,
+    pensado para páginas de catálogo. Usa consultas agrupadas en lugar de una por carpeta.
+    """
+    try:
+        manifests = await build_manifests(get_backend(), product_ids)
+        return {"products": manifests}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al construir los manifiestos: {str(e)}"
+        )
+
+
+@router.get("/{product_id}/manifest", summary="Manifiesto de imágenes del producto")
+async def product_manifest(product_id: str, _: dict = Depends(auth_dependency)):
+    """
+    🗂️ Devuelve en una sola respuesta las imágenes del producto y las de cada subproducto.
+    """
     try:
-        service = get_drive_service()
-        expected_folder_id = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
+        manifests = await build_manifests(get_backend(), [product_id])
+        return {"product_id": product_id, **manifests[product_id]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al construir el manifiesto: {str(e)}"
+        )
 
-        metadata = get_file_metadata(file_id, service)
-        parents = metadata.get("parents") or []
 
-        if expected_folder_id not in parents:
+@router.get("/{product_id}/download/{file_id}", summary="Descargar imagen de producto")
+async def download_product_file(
+    product_id: str,
+    file_id: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1, description="Lado mayor deseado en px (sirve la miniatura más cercana)"),
+    _: dict = Depends(auth_dependency)
+):
+    try:
+        drive = get_backend()
+
+        # 🕸️ Carpeta, metadata y (si conviene) el primer chunk se piden en paralelo
+        graph = TaskGraph()
+        graph.add("folder", lambda: drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID))
+        graph.add("metadata", lambda: drive.get_file_metadata(file_id))
+        if should_prefetch(request, size):
+            graph.add("prefetched", lambda: prefetch_download(file_id), cleanup=lambda p: p.aclose())
+        results = await graph.run()
+        metadata, prefetched = results["metadata"], results.get("prefetched")
+
+        if results["folder"] not in (metadata.get("parents") or []):
+            if prefetched:
+                await prefetched.aclose()   # Se corta el stream ya iniciado
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Archivo no pertenece al producto {product_id}"
             )
 
-        data = download_file(file_id, service)
-        mime_type = metadata.get("mimeType", "application/octet-stream")
-        filename = metadata.get("name")
-
-        return StreamingResponse(
-            io.BytesIO(data),
-            media_type=mime_type,
-            headers={"Content-Disposition": f'inline; filename="{filename}"'}
-        )
+        return await build_download_response(request, file_id, metadata, size=size, prefetched=prefetched)
 
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Archivo no encontrado en Google Drive")
     except Exception as e:
@@ -94,10 +195,35 @@ async def download_product_file(product_id: str, file_id: str, _: dict = Depends
 @router.delete("/{product_id}/delete/{file_id}", summary="Eliminar imagen de producto")
 async def delete_product_file(product_id: str, file_id: str, _: dict = Depends(auth_dependency)):
     try:
-        delete_file(file_id)
+        drive = get_backend()
+        await drive.delete_file(file_id)
         return {"message": "Imagen eliminada exitosamente"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al eliminar la imagen: {str(e)}"
         )
+
+
+@router.delete("/{product_id}", summary="Eliminar producto completo")
+async def delete_product(product_id: str, _: dict = Depends(auth_dependency)):
+    """
+    🧨 Elimina la carpeta del producto con todas sus imágenes, miniaturas y subproductos.
+
+    Usa pedidos batch de Drive (hasta 100 borrados por llamada HTTP). Responde 200 si se borró
+    todo o 207 con el resultado de cada elemento si alguno falló.
+    """
+    try:
+        results = await delete_folder_tree(get_backend(), product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        if results is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Producto {product_id} no encontrado")
+        return build_batch_response(results, product_id=product_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al eliminar el producto: {str(e)}"
+        )
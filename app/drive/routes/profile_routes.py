@@ -1,18 +1,19 @@
-import io
-from typing import Dict
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Body, Query, Request, UploadFile, File, HTTPException, Depends
 from googleapiclient.errors import HttpError
 
 from app.drive.auth import auth_dependency                          # 🔐 Dependencia para validar JWT
 from app.drive.config import settings                               # ⚙️ Configuración de carpetas, claves, etc.
 
 # 🧱 Servicios desacoplados
-from app.drive.services.upload import validate_file_extension, prepare_upload, upload_file_to_folder
-from app.drive.services.update import replace_file
-from app.drive.services.download import download_file, get_file_metadata
-from app.drive.services.delete import delete_file
+from app.drive.services.upload import validate_file_extension, prepare_upload
+from app.drive.services.backends import get_backend
+from app.drive.services.avatars import inline_thumbnails, public_metadata, resolve_avatars
+from app.drive.utils.responses import build_batch_response, build_download_response, prefetch_download, should_prefetch
+from app.drive.utils.signed_urls import expiry_for, signed_url
+from app.drive.utils.validations import validate_batch_size
+from app.drive.utils.task_graph import TaskGraph
 
 # 📦 Inicializa el router para imágenes de perfil
 router = APIRouter(
@@ -28,7 +29,7 @@ def get_profile_filename(user_id: str, ext: str) -> str:
     "/",
     summary="Subir imagen de perfil"
 )
-def upload_profile_image(
+async def upload_profile_image(
     file: UploadFile = File(...),
     payload: Dict = Depends(auth_dependency)
 ):
@@ -41,16 +42,17 @@ def upload_profile_image(
         raise HTTPException(status_code=400, detail="Token no contiene 'user_id'")
 
     try:
+        drive = get_backend()
         ext = validate_file_extension(file.filename)           # Verifica que la extensión esté permitida
         filename = get_profile_filename(user_id, ext)          # Genera nombre único basado en user_id
         data, _, mimetype = prepare_upload(file)               # Extrae binarios + MIME
 
-        file_id = upload_file_to_folder(
-            data, filename, mimetype, settings.PROFILE_IMAGE_FOLDER_ID
-        )
+        file_id = await drive.upload_file_to_folder(data, filename, mimetype, settings.PROFILE_IMAGE_FOLDER_ID)
 
         return {"message": "Imagen de perfil subida con éxito", "file_id": file_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al subir imagen de perfil: {str(e)}")
 
@@ -59,7 +61,7 @@ def upload_profile_image(
     "/{file_id}",
     summary="Actualizar imagen de perfil"
 )
-def update_profile_image(
+async def update_profile_image(
     file_id: str,
     new_file: UploadFile = File(...),
     payload: Dict = Depends(auth_dependency)
@@ -72,14 +74,17 @@ def update_profile_image(
         raise HTTPException(status_code=400, detail="Token no contiene 'user_id'")
 
     try:
+        drive = get_backend()
         ext = validate_file_extension(new_file.filename)
         filename = get_profile_filename(user_id, ext)
 
         # Usa el servicio desacoplado para reemplazo
-        new_id = replace_file(file_id, new_file, filename)
+        new_id = await drive.replace_file(file_id, new_file, filename)
 
         return {"message": "Imagen de perfil actualizada con éxito", "new_file_id": new_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar imagen: {str(e)}")
 
@@ -88,35 +93,84 @@ def update_profile_image(
     "/download/{file_id}",
     summary="Descargar imagen de perfil"
 )
-def download_profile_image(
+async def download_profile_image(
     file_id: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1, description="Lado mayor deseado en px (sirve la miniatura más cercana)"),
     payload: Dict = Depends(auth_dependency)
 ):
     """
     📥 Descarga una imagen de perfil desde Google Drive.
     """
     try:
-        content = download_file(file_id)                           # Descarga binaria
-        metadata = get_file_metadata(file_id)                      # Info: nombre, MIME, etc.
-        mime_type = metadata.get("mimeType", "application/octet-stream")
-
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type=mime_type,
-            headers={"Content-Disposition": f"inline; filename={file_id}"}
+        drive = get_backend()
+        graph = TaskGraph()
+        graph.add("metadata", lambda: drive.get_file_metadata(file_id))   # Info: nombre, MIME, tamaño
+        if should_prefetch(request, size):
+            graph.add("prefetched", lambda: prefetch_download(file_id), cleanup=lambda p: p.aclose())
+        results = await graph.run()
+        return await build_download_response(  # Descarga en streaming
+            request, file_id, results["metadata"], filename=file_id, size=size, prefetched=results.get("prefetched")
         )
 
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {file_id}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al descargar imagen: {str(e)}")
 
 
+@router.post(
+    "/avatars",
+    summary="Resolver varias imágenes de perfil"
+)
+async def resolve_profile_avatars(
+    request: Request,
+    user_ids: List[str] = Body([], description="Usuarios cuyas imágenes se buscan por nombre ({user_id}{ext})"),
+    file_ids: List[str] = Body([], description="IDs de imágenes de perfil ya conocidos"),
+    inline: bool = Body(False, description="Incrustar miniaturas chicas como data URI"),
+    size: int = Body(settings.AVATAR_INLINE_SIZE, ge=1, description="Lado mayor deseado en px"),
+    ttl: int = Body(settings.SIGNED_URL_TTL_SECONDS, ge=1, le=settings.SIGNED_URL_MAX_TTL_SECONDS),
+    payload: Dict = Depends(auth_dependency)
+):
+    """
+    👥 Resuelve muchas imágenes de perfil en un solo request (p.ej. un listado de usuarios):
+    metadata, URL firmada (con `size`) y, con `inline`, la miniatura incrustada.
+
+    Los usuarios se buscan con una sola consulta `files.list` y los archivos con un pedido batch.
+    Responde 200 si se resolvieron todos o 207 con el resultado de cada uno.
+    """
+    if not user_ids and not file_ids:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un user_id o file_id")
+    validate_batch_size(len(user_ids) + len(file_ids), settings.AVATAR_MAX_ITEMS)
+
+    try:
+        drive = get_backend()
+        resolved = await resolve_avatars(drive, user_ids, file_ids)
+        found = [(result, file) for result, file in resolved if file]
+        thumbnails = await inline_thumbnails(drive, [file for _, file in found], size) if inline else [None] * len(found)
+
+        expires = expiry_for(ttl)
+        for (result, file), thumbnail in zip(found, thumbnails):
+            result["metadata"] = public_metadata(file)
+            result["url"] = signed_url(request, file["id"], settings.PROFILE_IMAGE_FOLDER_ID, expires, size)
+            result["expires"] = expires
+            if inline:
+                result["thumbnail"] = thumbnail
+        return build_batch_response([result for result, _ in resolved])
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al resolver imágenes de perfil: {str(e)}")
+
+
 @router.delete(
     "/delete/{file_id}",
     summary="Eliminar imagen de perfil"
 )
-def delete_profile_image(
+async def delete_profile_image(
     file_id: str,
     payload: Dict = Depends(auth_dependency)
 ):
@@ -124,9 +178,12 @@ def delete_profile_image(
     🗑️ Elimina una imagen de perfil de Google Drive.
     """
     try:
-        delete_file(file_id)
+        drive = get_backend()
+        await drive.delete_file(file_id)
         return {"message": f"Archivo {file_id} eliminado correctamente"}
 
+    except HTTPException:
+        raise
     except HttpError as e:
         if e.resp.status == 404:
             raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {file_id}")
@@ -0,0 +1,149 @@
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+
+from app.drive.auth import auth_dependency
+from app.drive.config import settings
+
+from app.drive.services.backends import get_backend
+from app.drive.utils.metrics import metrics
+from app.drive.utils.responses import build_batch_response, build_download_response, prefetch_download, should_prefetch
+from app.drive.utils.signed_urls import expiry_for, signed_cache_control, signed_url, verify
+from app.drive.utils.task_graph import TaskGraph
+
+router = APIRouter(tags=["URLs firmadas"])
+
+
+async def resolve_scope(drive, product_id: Optional[str], subproduct_id: Optional[str]) -> str:
+    """
+    📁 Carpeta que acota la URL: la del subproducto, la del producto o (sin ninguno) la de perfiles.
+    No crea carpetas: si no existen, no hay archivos que firmar.
+    """
+    if subproduct_id and not product_id:
+        raise HTTPException(status_code=400, detail="subproduct_id requiere product_id")
+    if not product_id:
+        return settings.PROFILE_IMAGE_FOLDER_ID
+
+    folder_id = await drive.get_subfolder_id(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+    if folder_id and subproduct_id:
+        folder_id = await drive.get_subfolder_id(subproduct_id, folder_id)
+    if not folder_id:
+        raise HTTPException(status_code=404, detail="Carpeta de producto o subproducto no encontrada")
+    return folder_id
+
+
+async def sign_files(request: Request, file_ids: list[str], product_id: Optional[str], subproduct_id: Optional[str], ttl: int) -> list[dict]:
+    """
+    ✍️ Valida una sola vez que los archivos estén en la carpeta indicada (metadata en batch)
+    y firma una URL por archivo. Cada resultado trae su propio `status`.
+    """
+    drive = get_backend()
+    graph = TaskGraph()
+    graph.add("scope", lambda: resolve_scope(drive, product_id, subproduct_id))
+    graph.add("metadata", lambda: drive.get_files_metadata(file_ids))
+    results = await graph.run()
+
+    scope, found, expires = results["scope"], results["metadata"], expiry_for(ttl)
+    signed = []
+    for file_id in dict.fromkeys(file_ids):
+        result = found[file_id]
+        if result["status"] >= 300:
+            signed.append({"file_id": file_id, "status": result["status"], "detail": result.get("detail")})
+        elif scope not in (result["result"].get("parents") or []):
+            signed.append({"file_id": file_id, "status": 403, "detail": "El archivo no pertenece a la carpeta indicada."})
+        else:
+            signed.append({"file_id": file_id, "status": 200, "url": signed_url(request, file_id, scope, expires), "expires": expires})
+
+    metrics.incr("signed_url_issued_total", sum(1 for item in signed if item["status"] == 200))
+    return signed
+
+
+@router.get("/signed-urls/{file_id}", summary="Emitir URL firmada de un archivo")
+async def issue_signed_url(
+    file_id: str,
+    request: Request,
+    product_id: Optional[str] = Query(None, description="Producto dueño del archivo (sin él, imagen de perfil)"),
+    subproduct_id: Optional[str] = Query(None, description="Subproducto dueño del archivo"),
+    ttl: int = Query(settings.SIGNED_URL_TTL_SECONDS, ge=1, le=settings.SIGNED_URL_MAX_TTL_SECONDS, description="Vigencia en segundos"),
+    payload: Dict = Depends(auth_dependency)
+):
+    """
+    🔏 Emite una URL de descarga firmada y de corta duración para un archivo.
+    """
+    try:
+        [result] = await sign_files(request, [file_id], product_id, subproduct_id, ttl)
+        if result["status"] != 200:
+            raise HTTPException(status_code=result["status"], detail=result["detail"])
+        return {"file_id": file_id, "url": result["url"], "expires": result["expires"]}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al firmar la URL: {str(e)}")
+
+
+@router.post("/signed-urls", summary="Emitir URLs firmadas de varios archivos")
+async def issue_signed_urls(
+    request: Request,
+    file_ids: List[str] = Body(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS),
+    product_id: Optional[str] = Body(None),
+    subproduct_id: Optional[str] = Body(None),
+    ttl: int = Body(settings.SIGNED_URL_TTL_SECONDS, ge=1, le=settings.SIGNED_URL_MAX_TTL_SECONDS),
+    payload: Dict = Depends(auth_dependency)
+):
+    """
+    🔏 Emite URLs firmadas para varios archivos de una misma carpeta (perfil, producto o subproducto).
+
+    La pertenencia se valida con una sola consulta batch de metadata. Responde 200 si se firmaron
+    todas o 207 con el resultado de cada archivo (404 si no existe, 403 si está en otra carpeta).
+    """
+    try:
+        results = await sign_files(request, file_ids, product_id, subproduct_id, ttl)
+        return build_batch_response(results, product_id=product_id, subproduct_id=subproduct_id)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al firmar las URLs: {str(e)}")
+
+
+@router.get("/signed/{file_id}", name="download_signed_file", summary="Descargar con URL firmada")
+async def download_signed_file(
+    file_id: str,
+    request: Request,
+    scope: str = Query(..., description="Carpeta firmada junto con el archivo"),
+    expires: int = Query(..., description="Vencimiento (epoch en segundos)"),
+    sig: str = Query(..., description="Firma HMAC"),
+    size: Optional[int] = Query(None, ge=1, description="Lado mayor deseado en px (sirve la miniatura más cercana)")
+):
+    """
+    📥 Descarga sin JWT: solo se valida la firma (en memoria). La pertenencia a la carpeta se
+    comprueba contra la metadata que la descarga necesita de todos modos, sin consultas extra.
+    La respuesta es pública y cacheable hasta el vencimiento de la URL.
+    """
+    remaining = verify(file_id, scope, expires, sig)
+    try:
+        drive = get_backend()
+        graph = TaskGraph()
+        graph.add("metadata", lambda: drive.get_file_metadata(file_id))
+        if should_prefetch(request, size):
+            graph.add("prefetched", lambda: prefetch_download(file_id), cleanup=lambda p: p.aclose())
+        results = await graph.run()
+
+        metadata, prefetched = results["metadata"], results.get("prefetched")
+        if scope not in (metadata.get("parents") or []):
+            if prefetched:
+                await prefetched.aclose()
+            raise HTTPException(403, detail="El archivo ya no pertenece a la carpeta firmada.")
+
+        metrics.incr("signed_downloads_total")
+        return await build_download_response(
+            request, file_id, metadata, size=size, prefetched=prefetched, cache_control=signed_cache_control(remaining)
+        )
+
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {file_id}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al descargar el archivo: {str(e)}")
@@ -1,19 +1,17 @@
-import io
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
-from fastapi.responses import StreamingResponse
+from typing import List, Optional
+
+from fastapi import APIRouter, Query, Request, UploadFile, File, HTTPException, Depends, status
 
 from app.drive.auth import auth_dependency
 from app.drive.config import settings
 
-from app.drive.services.upload import prepare_upload, upload_file_to_folder
-from app.drive.services.update import replace_file
-from app.drive.services.download import download_file, get_file_metadata
-from app.drive.services.delete import delete_file
-from app.drive.services.folders import get_or_create_subfolder
-from app.drive.services.list_files import list_files_in_folder
-from app.drive.services.client import get_drive_service
+from app.drive.services.upload import prepare_upload
+from app.drive.services.backends import get_backend
+from app.drive.services.batch import upload_many
 
-from app.drive.utils.validations import validate_file_extension
+from app.drive.utils.validations import validate_batch_size, validate_file_extension
+from app.drive.utils.responses import build_batch_response, build_download_response, build_listing_response, build_zip_response, prefetch_download, should_prefetch
+from app.drive.utils.task_graph import TaskGraph
 
 router = APIRouter(
     prefix="/subproduct",
@@ -21,6 +19,18 @@ router = APIRouter(
     dependencies=[Depends(auth_dependency)]
 )
 
+def ownership_plan(drive, product_id: str, subproduct_id: str, file_id: str) -> TaskGraph:
+    """
+    🕸️ Plan para validar que un archivo pertenece al subproducto: la cadena de carpetas
+    (producto -> subproducto) y la metadata del archivo son independientes y corren en paralelo.
+    """
+    graph = TaskGraph()
+    graph.add("product_folder", lambda: drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID))
+    graph.add("subproduct_folder", lambda product_folder: drive.get_or_create_subfolder(subproduct_id, product_folder), "product_folder")
+    graph.add("metadata", lambda: drive.get_file_metadata(file_id))
+    return graph
+
+
 @router.post("/{product_id}/{subproduct_id}/upload", summary="Subir imagen de subproducto")
 async def upload_subproduct_file(product_id: str, subproduct_id: str, file: UploadFile = File(...),_: dict = Depends(auth_dependency)
 ):
@@ -28,42 +38,75 @@ async def upload_subproduct_file(product_id: str, subproduct_id: str, file: Uplo
     📤 Sube una imagen a /PRODUCT_ID/SUBPRODUCT_ID/ en Google Drive.
     """
     try:
+        drive = get_backend()
         validate_file_extension(file.filename)
         data, _, mimetype = prepare_upload(file)
 
-        service = get_drive_service()
-
         # 📁 Crear carpeta del producto si no existe
-        product_folder = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
+        product_folder = await drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
 
         # 📁 Crear subcarpeta del subproducto dentro del producto
-        subproduct_folder = get_or_create_subfolder(subproduct_id, product_folder, service)
+        subproduct_folder = await drive.get_or_create_subfolder(subproduct_id, product_folder)
 
         # 🚀 Subir al subfolder
-        file_id = upload_file_to_folder(data, file.filename, mimetype, subproduct_folder, service)
+        file_id = await drive.upload_file_to_folder(data, file.filename, mimetype, subproduct_folder)
 
         return {"message": "Imagen de subproducto subida con éxito", "file_id": file_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al subir la imagen: {str(e)}"
         )
 
+@router.post("/{product_id}/{subproduct_id}/upload/batch", summary="Subir varias imágenes de subproducto")
+async def upload_subproduct_files_batch(
+    product_id: str,
+    subproduct_id: str,
+    files: List[UploadFile] = File(...),
+    _: dict = Depends(auth_dependency)
+):
+    """
+    📦 Sube varias imágenes a /PRODUCT_ID/SUBPRODUCT_ID/ en un solo request.
+
+    Las carpetas se resuelven una vez y los archivos se suben en paralelo. Responde 200 si
+    todos se subieron o 207 con el resultado de cada archivo si alguno falló.
+    """
+    try:
+        validate_batch_size(len(files), settings.BATCH_UPLOAD_MAX_FILES)
+        drive = get_backend()
+        product_folder = await drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        subproduct_folder = await drive.get_or_create_subfolder(subproduct_id, product_folder)
+        results = await upload_many(drive, files, subproduct_folder)
+        return build_batch_response(results, product_id=product_id, subproduct_id=subproduct_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al subir las imágenes: {str(e)}"
+        )
+
 @router.get("/{product_id}/{subproduct_id}/list", summary="Listar imágenes de subproducto")
 async def list_subproduct_files(
     product_id: str,
     subproduct_id: str,
+    page_token: Optional[str] = Query(None, description="Cursor devuelto como next_page_token"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.LIST_MAX_PAGE_SIZE, description="Tamaño de página"),
+    stream: bool = Query(False, description="Transmitir el listado como NDJSON"),
     _: dict = Depends(auth_dependency)
 ):
     try:
-        service = get_drive_service()
-        product_folder = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
-        sub_folder = get_or_create_subfolder(subproduct_id, product_folder, service)
+        drive = get_backend()
+        product_folder = await drive.get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        sub_folder = await drive.get_or_create_subfolder(subproduct_id, product_folder)
 
-        images = list_files_in_folder(sub_folder, service)
-        return {"images": images}
+        return await build_listing_response(sub_folder, page_token, limit, ndjson=stream)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -71,6 +114,29 @@ async def list_subproduct_files(
         )
 
 
+@router.get("/{product_id}/{subproduct_id}/export.zip", summary="Exportar imágenes del subproducto como ZIP")
+async def export_subproduct_files(product_id: str, subproduct_id: str, _: dict = Depends(auth_dependency)):
+    """
+    🗜️ Descarga todas las imágenes del subproducto en un ZIP transmitido mientras se arma.
+    """
+    try:
+        drive = get_backend()
+        product_folder = await drive.get_subfolder_id(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID)
+        sub_folder = await drive.get_subfolder_id(subproduct_id, product_folder) if product_folder else None
+        if not sub_folder:
+            raise HTTPException(status_code=404, detail="Carpeta de producto o subproducto no encontrada")
+
+        return await build_zip_response(sub_folder, f"{product_id}-{subproduct_id}.zip", subfolders=False)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al exportar las imágenes: {str(e)}"
+        )
+
+
 @router.put("/{product_id}/{subproduct_id}/replace/{file_id}", summary="Reemplazar imagen de subproducto")
 async def replace_subproduct_file(
     product_id: str,
@@ -80,20 +146,19 @@ async def replace_subproduct_file(
     _: dict = Depends(auth_dependency)
 ):
     try:
-        service = get_drive_service()
-        product_folder_id = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
-        subproduct_folder_id = get_or_create_subfolder(subproduct_id, product_folder_id, service)
-
-        metadata = get_file_metadata(file_id, service)
-        if subproduct_folder_id not in metadata.get("parents", []):
+        drive = get_backend()
+        results = await ownership_plan(drive, product_id, subproduct_id, file_id).run()
+        if results["subproduct_folder"] not in results["metadata"].get("parents", []):
             raise HTTPException(403, detail="El archivo no pertenece al subproducto indicado.")
 
         ext = validate_file_extension(file.filename)
         filename = f"{subproduct_id}{ext}"
 
-        new_id = replace_file(file_id, file, filename)
+        new_id = await drive.replace_file(file_id, file, filename)
         return {"message": "Imagen reemplazada exitosamente", "new_file_id": new_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -102,31 +167,33 @@ async def replace_subproduct_file(
 
 
 @router.get("/{product_id}/{subproduct_id}/download/{file_id}", summary="Descargar imagen de subproducto")
-async def download_subproduct_file(product_id: str, subproduct_id: str, file_id: str, _: dict = Depends(auth_dependency)
+async def download_subproduct_file(
+    product_id: str,
+    subproduct_id: str,
+    file_id: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1, description="Lado mayor deseado en px (sirve la miniatura más cercana)"),
+    _: dict = Depends(auth_dependency)
 ):
     try:
-        service = get_drive_service()
-
-        # Validar jerarquía de carpetas
-        product_folder_id = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
-        subproduct_folder_id = get_or_create_subfolder(subproduct_id, product_folder_id, service)
-
-        metadata = get_file_metadata(file_id, service)
-        parents = metadata.get("parents", [])
-
-        if subproduct_folder_id not in parents:
+        drive = get_backend()
+
+        # Validar jerarquía de carpetas mientras se piden la metadata y (si conviene) el primer chunk
+        graph = ownership_plan(drive, product_id, subproduct_id, file_id)
+        if should_prefetch(request, size):
+            graph.add("prefetched", lambda: prefetch_download(file_id), cleanup=lambda p: p.aclose())
+        results = await graph.run()
+        metadata, prefetched = results["metadata"], results.get("prefetched")
+
+        if results["subproduct_folder"] not in metadata.get("parents", []):
+            if prefetched:
+                await prefetched.aclose()   # Se corta el stream ya iniciado
             raise HTTPException(status_code=404, detail="Archivo no pertenece a este subproducto")
 
-        content = download_file(file_id, service)
-        mime_type = metadata.get("mimeType", "application/octet-stream")
-        filename = metadata.get("name")
-
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type=mime_type,
-            headers={"Content-Disposition": f'inline; filename="{filename}"'}
-        )
+        return await build_download_response(request, file_id, metadata, size=size, prefetched=prefetched)
 
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Archivo no encontrado en Google Drive")
     except Exception as e:
@@ -143,17 +210,16 @@ async def delete_subproduct_file(
     _: dict = Depends(auth_dependency)
 ):
     try:
-        service = get_drive_service()
-        product_folder_id = get_or_create_subfolder(product_id, settings.PRODUCTS_IMAGE_FOLDER_ID, service)
-        subproduct_folder_id = get_or_create_subfolder(subproduct_id, product_folder_id, service)
-
-        metadata = get_file_metadata(file_id, service)
-        if subproduct_folder_id not in metadata.get("parents", []):
+        drive = get_backend()
+        results = await ownership_plan(drive, product_id, subproduct_id, file_id).run()
+        if results["subproduct_folder"] not in results["metadata"].get("parents", []):
             raise HTTPException(status_code=403, detail="Archivo no pertenece a este subproducto")
 
-        delete_file(file_id)
+        await drive.delete_file(file_id)
         return {"message": "Imagen eliminada exitosamente"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -0,0 +1,390 @@
+import asyncio
+import io
+import json
+import secrets
+import time
+from typing import AsyncIterator, BinaryIO
+from urllib.parse import urlencode
+
+import httplib2
+import httpx
+from fastapi import UploadFile
+from googleapiclient.errors import HttpError
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .client import drive_pool                               # 🔐 Credenciales compartidas con el backend síncrono
+from .batch import BATCH_PATH, chunked, decode_batch, encode_batch, error_detail, record_subrequest
+from .content_cache import content_cache
+from .dedup import duplicate_query
+from .download import METADATA_FIELDS
+from .folder_cache import folder_cache
+from .folders import FOLDER_MIMETYPE, escape_query_value, subfolders_query
+from .list_files import children_params, list_params, match_stems, stems_params
+from .retry import backoff_delay, is_idempotent, send_with_retry
+from .update import prepare_update
+from .upload import report_upload_stats
+
+
+def _raise_for_status(response: httpx.Response, content: bytes = b""):
+    """
+    ❌ Convierte respuestas de error en `HttpError`, igual que el backend de googleapiclient.
+    """
+    if response.status_code < 400:
+        return
+    raise _http_error(response, content or response.content)
+
+
+def _http_error(response: httpx.Response, content: bytes) -> HttpError:
+    resp = httplib2.Response({**response.headers, "status": response.status_code})
+    resp.reason = response.reason_phrase
+    return HttpError(resp, content, uri=str(response.url))
+
+
+class AsyncDriveBackend:
+    """
+    ⚡ Backend de Drive nativo async sobre httpx.
+
+    Expone las mismas operaciones que `services/*` como corrutinas, sobre un único pool de
+    conexiones keep-alive con multiplexación HTTP/2, sin ocupar un hilo por request.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self._folder_locks: dict[tuple[str, str], asyncio.Lock] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.DRIVE_API_BASE_URL or "https://www.googleapis.com",
+                http2=True,
+                timeout=settings.DRIVE_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.DRIVE_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.DRIVE_ASYNC_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _auth_headers(self, account) -> dict:
+        # El refresco del token es bloqueante: solo se delega a un hilo cuando hace falta
+        if not account.token_is_fresh():
+            await asyncio.to_thread(account.ensure_fresh_token)
+        return {"Authorization": f"Bearer {account.credentials.token}"}
+
+    async def _send(self, method: str, url: str, stream: bool = False, key: str | None = None, account=None,
+                    idempotent: bool | None = None, **kwargs) -> httpx.Response:
+        """
+        📡 Envía un request a Drive con reintentos y límite adaptativo (`retry.send_with_retry`).
+        Cada intento elige cuenta en el pool (`key` para el ruteo por hash, `account` para fijarla)
+        y recalcula los headers de autenticación. La cuenta usada queda en
+        `response.extensions["drive_account"]`.
+
+        Los errores transitorios solo se reintentan si el request es idempotente (por defecto,
+        según el método: ver `retry.is_idempotent`).
+        """
+        if idempotent is None:
+            idempotent = is_idempotent(method, url)
+        extra_headers = kwargs.pop("headers", {})
+
+        async def send(account):
+            headers = {**extra_headers, **await self._auth_headers(account)}
+            request = self.client.build_request(method, url, headers=headers, **kwargs)
+            response = await self.client.send(request, stream=stream)
+            response.extensions["drive_account"] = account
+            return response
+
+        return await send_with_retry(lambda: account or drive_pool.pick(key), send, idempotent)
+
+    async def _request(self, method: str, url: str, key: str | None = None, **kwargs) -> httpx.Response:
+        response = await self._send(method, url, key=key, **kwargs)
+        _raise_for_status(response)
+        return response
+
+    # 📑 Metadata
+
+    async def get_file_metadata(self, file_id: str) -> dict:
+        try:
+            response = await self._request("GET", f"/drive/v3/files/{file_id}", key=file_id, params={"fields": METADATA_FIELDS})
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise FileNotFoundError(f"Archivo no encontrado: {file_id}")
+            raise
+        return response.json()
+
+    async def list_files_page(self, folder_id: str, page_token: str | None = None, page_size: int | None = None) -> tuple[list[dict], str | None]:
+        response = await self._request("GET", "/drive/v3/files", params=list_params(folder_id, page_token, page_size))
+        result = response.json()
+        return result.get("files", []), result.get("nextPageToken")
+
+    async def iter_file_pages(self, folder_id: str, page_token: str | None = None, page_size: int | None = None) -> AsyncIterator[list[dict]]:
+        while True:
+            files, page_token = await self.list_files_page(folder_id, page_token, page_size)
+            yield files
+            if not page_token:
+                return
+
+    async def list_files_in_folder(self, folder_id: str) -> list[dict]:
+        return [file async for page in self.iter_file_pages(folder_id) for file in page]
+
+    async def list_children(self, parent_ids: list[str], include_derivatives: bool = False) -> list[dict]:
+        files, page_token = [], None
+        while True:
+            response = await self._request("GET", "/drive/v3/files", params=children_params(parent_ids, page_token, include_derivatives))
+            result = response.json()
+            files.extend(result.get("files", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return files
+
+    async def find_files_by_stem(self, folder_id: str, stems: list[str]) -> dict[str, dict]:
+        files, page_token = [], None
+        while True:
+            response = await self._request("GET", "/drive/v3/files", params=stems_params(folder_id, stems, page_token))
+            result = response.json()
+            files.extend(result.get("files", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return match_stems(files, stems)
+
+    async def delete_file(self, file_id: str):
+        await self._request("DELETE", f"/drive/v3/files/{file_id}", key=file_id)
+        if content_cache:
+            content_cache.invalidate(file_id)
+
+    # 🧺 Pedidos batch
+
+    async def _batch(self, parts: dict[str, tuple[str, str]]) -> dict[str, dict]:
+        """
+        🧺 Envía sub-requests en pedidos multipart/mixed a `/batch/drive/v3` (hasta 100 por llamada)
+        y reintenta por separado los que fallen con un error transitorio.
+
+        Args:
+            parts: clave -> (método, path con query string) de cada sub-request.
+
+        Returns:
+            clave -> {"status", "result"} o {"status", "detail"}, como `batch.execute_batch`.
+        """
+        results: dict[str, dict] = {}
+        pending = list(parts)
+
+        for attempt in range(settings.BATCH_MAX_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt - 1))
+            retry = []
+
+            for keys in chunked(pending):
+                boundary = f"batch_{secrets.token_hex(8)}"
+                response = await self._request(
+                    "POST", BATCH_PATH, idempotent=True,
+                    content=encode_batch({key: parts[key] for key in keys}, boundary),
+                    headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+                )
+                metrics.incr("drive_batch_requests_total")
+                metrics.incr("drive_batch_subrequests_total", len(keys))
+
+                decoded = decode_batch(response.headers["content-type"], response.content)
+                for key in keys:
+                    status_code, body = decoded.get(key, (500, "Sin respuesta en el batch"))
+                    if status_code < 300:
+                        results[key] = {"status": status_code, "result": json.loads(body) if body.strip() else None}
+                        continue
+                    if record_subrequest(response.extensions.get("drive_account"), status_code, body):
+                        retry.append(key)
+                    results[key] = {"status": status_code, "detail": error_detail(body)}
+
+            if not retry:
+                break
+            metrics.incr("drive_batch_retries_total", len(retry))
+            pending = retry
+
+        return results
+
+    async def get_files_metadata(self, file_ids: list[str]) -> dict[str, dict]:
+        query = urlencode({"fields": METADATA_FIELDS})
+        return await self._batch({file_id: ("GET", f"/drive/v3/files/{file_id}?{query}") for file_id in dict.fromkeys(file_ids)})
+
+    async def delete_files(self, file_ids: list[str]) -> dict[str, dict]:
+        results = await self._batch({file_id: ("DELETE", f"/drive/v3/files/{file_id}") for file_id in dict.fromkeys(file_ids)})
+        if content_cache:
+            for file_id, result in results.items():
+                if result["status"] < 300:
+                    content_cache.invalidate(file_id)
+        return results
+
+    # 📁 Carpetas
+
+    async def _find_subfolder(self, name: str, parent_id: str) -> str | None:
+        response = await self._request("GET", "/drive/v3/files", params={
+            "q": (
+                f"name='{escape_query_value(name)}' and '{parent_id}' in parents and "
+                f"mimeType='{FOLDER_MIMETYPE}' and trashed=false"
+            ),
+            "fields": "files(id)",
+        })
+        folders = response.json().get("files", [])
+        return folders[0]["id"] if folders else None
+
+    async def get_or_create_subfolder(self, name: str, parent_id: str) -> str:
+        cached = folder_cache.get(parent_id, name)
+        if cached:
+            return cached
+
+        # 🚦 Single-flight por clave dentro del event loop
+        lock = self._folder_locks.setdefault((parent_id, name), asyncio.Lock())
+        async with lock:
+            cached = folder_cache.get(parent_id, name)
+            if cached:
+                return cached
+
+            folder_id = await self._find_subfolder(name, parent_id)
+            if not folder_id:
+                # 🔒 Mismo lock entre workers que el backend de hilos (cache de carpetas en SQLite)
+                async with folder_cache.async_creation_lock():
+                    # Otro worker pudo crearla mientras esperábamos el lock
+                    folder_id = await self._find_subfolder(name, parent_id)
+                    if not folder_id:
+                        response = await self._request("POST", "/drive/v3/files", params={"fields": "id"}, json={
+                            "name": name,
+                            "mimeType": FOLDER_MIMETYPE,
+                            "parents": [parent_id],
+                        })
+                        folder_id = response.json()["id"]
+
+            # La escritura en SQLite espera si otro worker tiene el lock: nunca en el event loop
+            await asyncio.to_thread(folder_cache.set, parent_id, name, folder_id)
+            self._folder_locks.pop((parent_id, name), None)
+            return folder_id
+
+    async def get_subfolder_id(self, name: str, parent_id: str) -> str | None:
+        cached = folder_cache.get(parent_id, name)
+        if cached:
+            return cached
+
+        folder_id = await self._find_subfolder(name, parent_id)
+        if folder_id:
+            await asyncio.to_thread(folder_cache.set, parent_id, name, folder_id)
+        return folder_id
+
+    async def find_subfolders(self, names: list[str], parent_id: str) -> dict[str, str]:
+        found, page_token = {}, None
+        while True:
+            params = {"q": subfolders_query(names, parent_id), "fields": "nextPageToken, files(id, name)"}
+            if page_token:
+                params["pageToken"] = page_token
+            result = (await self._request("GET", "/drive/v3/files", params=params)).json()
+            for folder in result.get("files", []):
+                found.setdefault(folder["name"], folder["id"])
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+
+        def remember():
+            for name, folder_id in found.items():
+                folder_cache.set(parent_id, name, folder_id)
+
+        if found:
+            await asyncio.to_thread(remember)
+        return found
+
+    async def find_by_content_md5(self, folder_id: str, md5: str, source_name: str | None = None) -> str | None:
+        response = await self._request("GET", "/drive/v3/files", params={
+            "q": duplicate_query(folder_id, md5, source_name),
+            "fields": "files(id)",
+            "pageSize": 1,
+        })
+        files = response.json().get("files", [])
+        return files[0]["id"] if files else None
+
+    # 📤 Uploads resumables
+
+    async def _resumable_upload(self, method: str, url: str, body: dict, data: bytes | BinaryIO, mimetype: str | None) -> dict:
+        stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        mimetype = mimetype or "application/octet-stream"
+        size = await asyncio.to_thread(stream.seek, 0, io.SEEK_END)
+        await asyncio.to_thread(stream.seek, 0)
+
+        started = time.monotonic()
+        # Abrir la sesión no crea el archivo: se puede reintentar aunque sea un POST
+        session = await self._request(method, url, params={"uploadType": "resumable", "fields": "id"}, json=body, idempotent=True, headers={
+            "X-Upload-Content-Type": mimetype,
+            "X-Upload-Content-Length": str(size),
+        })
+        location = session.headers["location"]
+        owner = session.extensions["drive_account"]   # La sesión pertenece a la cuenta que la abrió
+
+        chunk_size = settings.UPLOAD_CHUNK_SIZE
+        position = 0
+        while True:
+            chunk = await asyncio.to_thread(stream.read, chunk_size)
+            end = position + len(chunk) - 1
+            content_range = f"bytes {position}-{end}/{size}" if chunk else f"bytes */{size}"
+            response = await self._send("PUT", location, account=owner, content=chunk, headers={"Content-Range": content_range})
+            if response.status_code == 308:
+                # Drive confirma hasta qué byte recibió
+                received = response.headers.get("range")
+                position = int(received.rsplit("-", 1)[1]) + 1 if received else 0
+                await asyncio.to_thread(stream.seek, position)
+                continue
+            _raise_for_status(response)
+            result = response.json()
+            report_upload_stats(result.get("id"), size, time.monotonic() - started, chunk_size)
+            return result
+
+    async def upload_file_to_folder(self, data: bytes | BinaryIO, filename: str, mimetype: str, folder_id: str, app_properties: dict | None = None) -> str:
+        body = {"name": filename, "parents": [folder_id]}
+        if app_properties:
+            body["appProperties"] = app_properties
+        file = await self._resumable_upload("POST", "/upload/drive/v3/files", body, data, mimetype)
+        return file["id"]
+
+    async def replace_file(self, file_id: str, file: UploadFile, new_filename: str) -> str:
+        data, name, mimetype = prepare_update(file, new_filename)
+        updated = await self._resumable_upload("PATCH", f"/upload/drive/v3/files/{file_id}", {"name": name}, data, mimetype)
+        if content_cache:
+            content_cache.invalidate(file_id)
+        return updated["id"]
+
+    async def set_app_properties(self, file_id: str, app_properties: dict):
+        await self._request("PATCH", f"/drive/v3/files/{file_id}", params={"fields": "id"}, json={"appProperties": app_properties})
+
+    # 📥 Descargas
+
+    async def iter_file_chunks(self, file_id: str, start: int = 0, end: int | None = None) -> AsyncIterator[bytes]:
+        """
+        🌊 Descarga en streaming sobre una sola respuesta HTTP, reenviando los bytes a medida que llegan.
+        Con `start`/`end` se pide solo ese rango de bytes (inclusivo) al endpoint de media.
+        Si el servidor ignora el Range (200), el rango se recorta del archivo completo.
+        """
+        headers = {}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await self._send("GET", f"/drive/v3/files/{file_id}", stream=True, key=file_id, params={"alt": "media"}, headers=headers)
+        try:
+            if response.status_code == 404:
+                raise FileNotFoundError(f"Archivo no encontrado: {file_id}")
+            if response.status_code >= 400:
+                _raise_for_status(response, await response.aread())
+            if response.status_code == 206 and "content-range" not in response.headers:
+                # Un 206 sin Content-Range no dice qué bytes trae: seguir corrompería el archivo
+                raise _http_error(response, await response.aread())
+
+            skip, remaining = (start, None if end is None else end - start + 1) if headers and response.status_code == 200 else (0, None)
+            async for chunk in response.aiter_bytes(settings.DOWNLOAD_CHUNK_SIZE):
+                if skip:
+                    chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                if remaining is not None:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                if chunk:
+                    yield chunk
+                if remaining == 0:
+                    return
+        finally:
+            await response.aclose()
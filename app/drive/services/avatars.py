@@ -0,0 +1,118 @@
+import asyncio
+import base64
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .derivatives import pick_derivative
+
+PUBLIC_FIELDS = ("id", "name", "mimeType", "size", "md5Checksum", "modifiedTime")
+
+
+def public_metadata(file: dict) -> dict:
+    return {key: file[key] for key in PUBLIC_FIELDS if key in file}
+
+
+def _batches(items: list[str], size: int) -> list[list[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def resolve_avatars(drive, user_ids: list[str], file_ids: list[str]) -> list[tuple[dict, dict | None]]:
+    """
+    👥 Resuelve muchas imágenes de perfil a la vez, todas dentro de `PROFILE_IMAGE_FOLDER_ID`.
+
+    - Por usuario: una consulta `files.list` por nombre exacto (`{user_id}{ext}`, una comparación
+      por extensión permitida) con hasta `AVATAR_NAMES_PER_QUERY` nombres.
+    - Por archivo: un pedido batch de metadata, validando que el archivo sea de la carpeta de perfiles.
+
+    Las consultas corren en paralelo.
+
+    Returns:
+        Un par (resultado, archivo) por elemento pedido, en orden: el resultado trae `user_id` o
+        `file_id` y su `status`; el archivo es la metadata completa de Drive o None si no se resolvió.
+    """
+    folder_id = settings.PROFILE_IMAGE_FOLDER_ID
+    user_ids, file_ids = list(dict.fromkeys(user_ids)), list(dict.fromkeys(file_ids))
+
+    users_per_query = max(1, settings.AVATAR_NAMES_PER_QUERY // len(settings.ALLOWED_EXTENSIONS))
+    lookups = [drive.find_files_by_stem(folder_id, batch) for batch in _batches(user_ids, users_per_query)]
+    if file_ids:
+        lookups.append(drive.get_files_metadata(file_ids))
+    results = await asyncio.gather(*lookups)
+
+    by_user = {}
+    for found in results[:len(results) - (1 if file_ids else 0)]:
+        by_user.update(found)
+    by_file = results[-1] if file_ids else {}
+
+    resolved = []
+    for user_id in user_ids:
+        file = by_user.get(user_id)
+        if file:
+            resolved.append(({"user_id": user_id, "status": 200}, file))
+        else:
+            resolved.append(({"user_id": user_id, "status": 404, "detail": "El usuario no tiene imagen de perfil"}, None))
+
+    for file_id in file_ids:
+        result = by_file[file_id]
+        if result["status"] >= 300:
+            resolved.append(({"file_id": file_id, "status": result["status"], "detail": result.get("detail")}, None))
+        elif folder_id not in (result["result"].get("parents") or []):
+            resolved.append(({"file_id": file_id, "status": 403, "detail": "El archivo no es una imagen de perfil."}, None))
+        else:
+            resolved.append(({"file_id": file_id, "status": 200}, result["result"]))
+
+    metrics.incr("avatar_lookups_total", len(resolved))
+    return resolved
+
+
+async def _read_small(drive, file_id: str, limit: int) -> bytes | None:
+    # Corta la descarga apenas supera el límite: no vale la pena incrustarlo
+    data = bytearray()
+    chunks = drive.iter_file_chunks(file_id)
+    try:
+        async for chunk in chunks:
+            data += chunk
+            if len(data) > limit:
+                return None
+    finally:
+        await chunks.aclose()
+    return bytes(data)
+
+
+async def inline_thumbnail(drive, file: dict, size: int) -> str | None:
+    """
+    🖼️ Miniatura del archivo como data URI, para incrustarla en la respuesta.
+
+    Usa la miniatura más chica que cubra `size`; si el archivo no tiene miniaturas, el original
+    si es lo bastante chico. Devuelve None si supera `AVATAR_INLINE_MAX_BYTES` o no se pudo leer
+    (el cliente usa la URL firmada).
+    """
+    file_id = pick_derivative(file, size)
+    if not file_id:
+        if int(file.get("size") or 0) > settings.AVATAR_INLINE_MAX_BYTES or not file.get("mimeType", "").startswith("image/"):
+            return None
+        file_id = file["id"]
+
+    try:
+        data = await _read_small(drive, file_id, settings.AVATAR_INLINE_MAX_BYTES)
+    except Exception:
+        data = None   # Vínculo viejo o error puntual: queda la URL firmada
+    if data is None:
+        metrics.incr("avatar_inline_skipped_total")
+        return None
+
+    metrics.incr("avatar_inline_total")
+    return f"data:{file['mimeType']};base64,{base64.b64encode(data).decode()}"
+
+
+async def inline_thumbnails(drive, files: list[dict], size: int) -> list[str | None]:
+    # 🚦 Una descarga por archivo distinto, de a `AVATAR_INLINE_CONCURRENCY` a la vez
+    slots = asyncio.Semaphore(max(1, settings.AVATAR_INLINE_CONCURRENCY))
+    unique = {file["id"]: file for file in files}
+
+    async def inline_one(file: dict) -> str | None:
+        async with slots:
+            return await inline_thumbnail(drive, file, size)
+
+    thumbnails = dict(zip(unique, await asyncio.gather(*(inline_one(file) for file in unique.values()))))
+    return [thumbnails[file["id"]] for file in files]
@@ -0,0 +1,234 @@
+from typing import AsyncIterator, BinaryIO
+
+from fastapi import UploadFile
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from . import dedup, delete, download, folders, list_files, update, upload
+from .coalescing import CoalescingBackend
+from .dedup import DedupBackend
+from .executors import metadata_pool, upload_pool, download_pool
+from .derivatives import DerivativesBackend
+from .imaging import imaging_available
+from .metadata_index import PAGE_TOKEN_PREFIX, MetadataIndex, metadata_index
+
+
+class ThreadedDriveBackend:
+    """
+    🧵 Backend basado en googleapiclient: cada operación síncrona de `services/*`
+    se ejecuta en su bulkhead (metadata, upload o download) sin bloquear el event loop.
+    """
+
+    async def get_file_metadata(self, file_id: str) -> dict:
+        return await metadata_pool.run(download.get_file_metadata, file_id)
+
+    async def list_files_in_folder(self, folder_id: str) -> list[dict]:
+        return await metadata_pool.run(list_files.list_files_in_folder, folder_id)
+
+    async def list_files_page(self, folder_id: str, page_token: str | None = None, page_size: int | None = None) -> tuple[list[dict], str | None]:
+        return await metadata_pool.run(list_files.list_files_page, folder_id, page_token, page_size)
+
+    def iter_file_pages(self, folder_id: str, page_token: str | None = None, page_size: int | None = None) -> AsyncIterator[list[dict]]:
+        return metadata_pool.iterate(list_files.iter_file_pages(folder_id, page_token, page_size))
+
+    async def list_children(self, parent_ids: list[str], include_derivatives: bool = False) -> list[dict]:
+        return await metadata_pool.run(list_files.list_children, parent_ids, include_derivatives)
+
+    async def get_files_metadata(self, file_ids: list[str]) -> dict[str, dict]:
+        return await metadata_pool.run(download.get_files_metadata, file_ids)
+
+    async def find_files_by_stem(self, folder_id: str, stems: list[str]) -> dict[str, dict]:
+        return await metadata_pool.run(list_files.find_files_by_stem, folder_id, stems)
+
+    async def delete_files(self, file_ids: list[str]) -> dict[str, dict]:
+        return await metadata_pool.run(delete.delete_files, file_ids)
+
+    async def delete_file(self, file_id: str):
+        await metadata_pool.run(delete.delete_file, file_id)
+
+    async def get_or_create_subfolder(self, name: str, parent_id: str) -> str:
+        return await metadata_pool.run(folders.get_or_create_subfolder, name, parent_id)
+
+    async def get_subfolder_id(self, name: str, parent_id: str) -> str | None:
+        return await metadata_pool.run(folders.get_subfolder_id, name, parent_id)
+
+    async def find_subfolders(self, names: list[str], parent_id: str) -> dict[str, str]:
+        return await metadata_pool.run(folders.find_subfolders, names, parent_id)
+
+    async def upload_file_to_folder(self, data: bytes | BinaryIO, filename: str, mimetype: str, folder_id: str, app_properties: dict | None = None) -> str:
+        return await upload_pool.run(upload.upload_file_to_folder, data, filename, mimetype, folder_id, app_properties)
+
+    async def replace_file(self, file_id: str, file: UploadFile, new_filename: str) -> str:
+        return await upload_pool.run(update.replace_file, file_id, file, new_filename)
+
+    async def set_app_properties(self, file_id: str, app_properties: dict):
+        await metadata_pool.run(update.set_app_properties, file_id, app_properties)
+
+    async def find_by_content_md5(self, folder_id: str, md5: str, source_name: str | None = None) -> str | None:
+        return await metadata_pool.run(dedup.find_by_content_md5, folder_id, md5, source_name)
+
+    def iter_file_chunks(self, file_id: str, start: int = 0, end: int | None = None) -> AsyncIterator[bytes]:
+        return download_pool.iterate(download.iter_file_chunks(file_id, start=start, end=end))
+
+    async def aclose(self):
+        pass
+
+
+class IndexedDriveBackend:
+    """
+    🗄️ Envuelve otro backend y responde metadata, listados y resolución de carpetas desde el
+    índice local mientras esté fresco; si está atrasado (o no conoce la carpeta), pregunta a Drive.
+
+    Las escrituras se delegan al backend real y se reflejan en el índice al instante, así
+    un listado justo después de una subida ya incluye el archivo nuevo.
+    """
+
+    def __init__(self, inner, index: MetadataIndex):
+        self._inner = inner
+        self._index = index
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def _serves(self, folder_id: str) -> bool:
+        served = self._index.is_fresh() and self._index.is_tracked_folder(folder_id)
+        metrics.incr("metadata_index_hits_total" if served else "metadata_index_fallbacks_total")
+        return served
+
+    # 📑 Lecturas
+
+    async def get_file_metadata(self, file_id: str) -> dict:
+        metadata = self._index.get(file_id) if self._index.is_fresh() else None
+        metrics.incr("metadata_index_hits_total" if metadata else "metadata_index_fallbacks_total")
+        return metadata or await self._inner.get_file_metadata(file_id)
+
+    async def list_files_in_folder(self, folder_id: str) -> list[dict]:
+        if not self._serves(folder_id):
+            return await self._inner.list_files_in_folder(folder_id)
+        return [list_files.listing_entry(file) for file in self._index.children(folder_id)]
+
+    async def list_files_page(self, folder_id: str, page_token: str | None = None, page_size: int | None = None) -> tuple[list[dict], str | None]:
+        # Los cursores del índice ("idx:<offset>") se siguen sirviendo desde el índice aunque se atrase
+        from_index = page_token.startswith(PAGE_TOKEN_PREFIX) if page_token else self._serves(folder_id)
+        if not from_index:
+            return await self._inner.list_files_page(folder_id, page_token, page_size)
+
+        offset = int(page_token[len(PAGE_TOKEN_PREFIX):]) if page_token else 0
+        size = min(page_size or settings.LIST_PAGE_SIZE, settings.LIST_MAX_PAGE_SIZE)
+        rows = self._index.children(folder_id, offset, size + 1)
+        next_page_token = f"{PAGE_TOKEN_PREFIX}{offset + size}" if len(rows) > size else None
+        return [list_files.listing_entry(file) for file in rows[:size]], next_page_token
+
+    async def iter_file_pages(self, folder_id: str, page_token: str | None = None, page_size: int | None = None) -> AsyncIterator[list[dict]]:
+        files, page_token = await self.list_files_page(folder_id, page_token, page_size)
+        yield files
+        while page_token:
+            if page_token.startswith(PAGE_TOKEN_PREFIX):
+                files, page_token = await self.list_files_page(folder_id, page_token, page_size)
+                yield files
+            else:
+                async for files in self._inner.iter_file_pages(folder_id, page_token, page_size):
+                    yield files
+                return
+
+    async def get_files_metadata(self, file_ids: list[str]) -> dict[str, dict]:
+        indexed = {file_id: self._index.get(file_id) for file_id in file_ids} if self._index.is_fresh() else {}
+        results = {file_id: {"status": 200, "result": metadata} for file_id, metadata in indexed.items() if metadata}
+        missing = [file_id for file_id in file_ids if file_id not in results]
+        metrics.incr("metadata_index_hits_total", len(results))
+        if missing:
+            metrics.incr("metadata_index_fallbacks_total", len(missing))
+            results.update(await self._inner.get_files_metadata(missing))
+        return results
+
+    async def list_children(self, parent_ids: list[str], include_derivatives: bool = False) -> list[dict]:
+        # El índice no lista miniaturas: con `include_derivatives` se pregunta a Drive
+        if include_derivatives or not all(self._serves(parent_id) for parent_id in parent_ids):
+            return await self._inner.list_children(parent_ids, include_derivatives)
+        return [file for parent_id in parent_ids for file in self._index.children(parent_id)]
+
+    async def find_subfolders(self, names: list[str], parent_id: str) -> dict[str, str]:
+        if not self._serves(parent_id):
+            return await self._inner.find_subfolders(names, parent_id)
+        found = {name: self._index.find_subfolder(name, parent_id) for name in names}
+        return {name: folder_id for name, folder_id in found.items() if folder_id}
+
+    async def get_subfolder_id(self, name: str, parent_id: str) -> str | None:
+        folder_id = self._index.find_subfolder(name, parent_id) if self._serves(parent_id) else None
+        return folder_id or await self._inner.get_subfolder_id(name, parent_id)
+
+    async def find_by_content_md5(self, folder_id: str, md5: str, source_name: str | None = None) -> str | None:
+        if not self._serves(folder_id):
+            return await self._inner.find_by_content_md5(folder_id, md5, source_name)
+        return self._index.find_by_md5(folder_id, md5, source_name)
+
+    # ✍️ Escrituras (se reflejan en el índice)
+
+    async def get_or_create_subfolder(self, name: str, parent_id: str) -> str:
+        folder_id = self._index.find_subfolder(name, parent_id) if self._serves(parent_id) else None
+        if folder_id:
+            return folder_id
+        folder_id = await self._inner.get_or_create_subfolder(name, parent_id)
+        self._index.record_local({"id": folder_id, "name": name, "parents": [parent_id], "mimeType": folders.FOLDER_MIMETYPE})
+        return folder_id
+
+    async def upload_file_to_folder(self, data: bytes | BinaryIO, filename: str, mimetype: str, folder_id: str, app_properties: dict | None = None) -> str:
+        file_id = await self._inner.upload_file_to_folder(data, filename, mimetype, folder_id, app_properties)
+        self._index.record_local({
+            "id": file_id, "name": filename, "parents": [folder_id], "mimeType": mimetype,
+            "appProperties": app_properties or {},
+        })
+        return file_id
+
+    async def set_app_properties(self, file_id: str, app_properties: dict):
+        await self._inner.set_app_properties(file_id, app_properties)
+        self._index.record_local({"id": file_id})   # La metadata completa llega con la próxima sincronización
+
+    async def replace_file(self, file_id: str, file: UploadFile, new_filename: str) -> str:
+        new_id = await self._inner.replace_file(file_id, file, new_filename)
+        self._index.record_local({"id": new_id, "name": new_filename})
+        return new_id
+
+    async def delete_file(self, file_id: str):
+        await self._inner.delete_file(file_id)
+        self._index.remove_local(file_id)
+
+    async def delete_files(self, file_ids: list[str]) -> dict[str, dict]:
+        results = await self._inner.delete_files(file_ids)
+        for file_id, result in results.items():
+            if result["status"] < 300 or result["status"] == 404:
+                self._index.remove_local(file_id)
+        return results
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    🔀 Devuelve el backend de Drive configurado en `DRIVE_BACKEND` (instancia única por proceso).
+
+    - "googleapiclient": cliente oficial en pools de hilos acotados.
+    - "httpx": cliente async nativo con conexiones HTTP/2 compartidas.
+
+    Con `DOWNLOAD_COALESCE` las lecturas simultáneas del mismo archivo comparten la llamada a Drive.
+    Si hay `METADATA_INDEX_PATH`, el backend se envuelve con el índice local de metadata;
+    con `THUMBNAIL_SIZES` o `TRANSCODE_FORMAT` (y Pillow instalado), con el pipeline de imágenes;
+    con `UPLOAD_DEDUP`, con la deduplicación de subidas (la capa más externa).
+    """
+    global _backend
+    if _backend is None:
+        if settings.DRIVE_BACKEND == "httpx":
+            from .async_drive import AsyncDriveBackend
+            _backend = AsyncDriveBackend()
+        else:
+            _backend = ThreadedDriveBackend()
+        if settings.DOWNLOAD_COALESCE:
+            _backend = CoalescingBackend(_backend)
+        if metadata_index:
+            _backend = IndexedDriveBackend(_backend, metadata_index)
+        if (settings.THUMBNAIL_SIZES or settings.TRANSCODE_FORMAT) and imaging_available():
+            _backend = DerivativesBackend(_backend)
+        if settings.UPLOAD_DEDUP:
+            _backend = DedupBackend(_backend)
+    return _backend
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import time
+from email.parser import BytesParser
+from typing import Any, Callable
+
+from fastapi import HTTPException, UploadFile, status
+from googleapiclient.errors import HttpError
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .folder_cache import folder_cache
+from .folders import FOLDER_MIMETYPE
+from .retry import FATAL, OK, backoff_delay, classify, record_result
+from .upload import prepare_upload
+
+
+async def upload_many(drive, files: list[UploadFile], folder_id: str) -> list[dict]:
+    """
+    📦 Sube varios archivos a una misma carpeta (ya resuelta) en paralelo.
+
+    Las subidas corren de a `BATCH_UPLOAD_CONCURRENCY` a la vez; un error en un archivo
+    no interrumpe al resto.
+
+    Args:
+        drive: Backend de Drive (`get_backend()`).
+        files: Archivos recibidos en el request multipart.
+        folder_id: ID de la carpeta destino.
+
+    Returns:
+        Un resultado por archivo, en el mismo orden: `status` (HTTP), `filename` y
+        `file_id` si se subió o `detail` con el error.
+    """
+    slots = asyncio.Semaphore(max(1, settings.BATCH_UPLOAD_CONCURRENCY))
+
+    async def upload_one(file: UploadFile) -> dict:
+        async with slots:
+            try:
+                data, _, mimetype = prepare_upload(file)
+                file_id = await drive.upload_file_to_folder(data, file.filename, mimetype, folder_id)
+                metrics.incr("batch_upload_files_total")
+                return {"filename": file.filename, "status": status.HTTP_201_CREATED, "file_id": file_id}
+            except HTTPException as e:
+                metrics.incr("batch_upload_errors_total")
+                return {"filename": file.filename, "status": e.status_code, "detail": e.detail}
+            except Exception as e:
+                metrics.incr("batch_upload_errors_total")
+                return {"filename": file.filename, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": str(e)}
+
+    return await asyncio.gather(*(upload_one(file) for file in files))
+
+
+
+def _deleted(result: dict) -> dict:
+    # Un 404 significa que ya no existe (p.ej. Drive lo borró junto con su carpeta): cuenta como borrado
+    if result["status"] < 300 or result["status"] == 404:
+        return {"status": 200}
+    return {"status": result["status"], "detail": result.get("detail")}
+
+
+async def delete_folder_tree(drive, name: str, parent_id: str) -> list[dict] | None:
+    """
+    🌳 Elimina una carpeta (p.ej. la de un producto) con todo su contenido usando pedidos batch.
+
+    Recorre el árbol por niveles (una consulta por nivel para todas las carpetas), borra
+    primero los archivos (incluidas las miniaturas) y después las carpetas.
+
+    Args:
+        drive: Backend de Drive (`get_backend()`).
+        name: Nombre de la carpeta a eliminar.
+        parent_id: ID de la carpeta que la contiene.
+
+    Returns:
+        Un resultado por elemento (`file_id`, `name`, `status` y `detail` si falló),
+        o None si la carpeta no existe.
+    """
+    folder_id = await drive.get_subfolder_id(name, parent_id)
+    if not folder_id:
+        return None
+
+    folders = {folder_id: (name, parent_id)}
+    files: dict[str, str] = {}
+    level = [folder_id]
+    while level:
+        children = await drive.list_children(level, include_derivatives=True)
+        level = []
+        for child in children:
+            if child.get("mimeType") == FOLDER_MIMETYPE:
+                folders[child["id"]] = (child["name"], child["parents"][0])
+                level.append(child["id"])
+            else:
+                files[child["id"]] = child.get("name")
+
+    results = []
+    if files:
+        deleted = await drive.delete_files(list(files))
+        results += [{"file_id": file_id, "name": files[file_id], **_deleted(deleted[file_id])} for file_id in files]
+
+    # Las subcarpetas primero (dentro de un batch Drive no garantiza el orden: de ahí el 404 tolerado)
+    deleted = await drive.delete_files(list(reversed(folders)))
+    for folder, (folder_name, folder_parent) in folders.items():
+        result = _deleted(deleted[folder])
+        if result["status"] < 300:
+            folder_cache.invalidate(folder_parent, folder_name)
+        results.append({"file_id": folder, "name": folder_name, **result})
+
+    metrics.incr("folder_tree_deletes_total")
+    return results
+
+
+# 🧺 Pedidos batch de Drive: hasta 100 sub-requests por llamada HTTP
+DRIVE_BATCH_LIMIT = 100
+BATCH_PATH = "/batch/drive/v3"
+
+
+def chunked(items: list, size: int = DRIVE_BATCH_LIMIT) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def record_subrequest(route, status_code: int, content: bytes | str | None) -> bool:
+    """
+    🏷️ Informa a la cuenta que hizo el batch el resultado de un sub-request con error (la
+    llamada batch en sí pudo ser un 200) e indica si conviene reintentarlo.
+    """
+    kind = classify(status_code, content)
+    record_result(route, kind)
+    return kind not in (OK, FATAL)
+
+
+def error_detail(content: bytes | str | None) -> str:
+    text = content.decode("utf-8", "replace") if isinstance(content, bytes) else (content or "")
+    try:
+        return json.loads(text)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return text or "Error de Drive"
+
+
+def execute_batch(service, build_requests: dict[str, Callable[[], Any]]) -> dict[str, dict]:
+    """
+    🧺 Ejecuta sub-requests de googleapiclient agrupados en pedidos batch de Drive.
+
+    Cada sub-request tiene su propio resultado; los que fallan por un error transitorio
+    (ver `retry.classify`) se reintentan en un nuevo batch, hasta `BATCH_MAX_ATTEMPTS` veces.
+
+    Args:
+        service: Cliente de Drive.
+        build_requests: clave -> función que arma el `HttpRequest` (se rearma en cada intento).
+
+    Returns:
+        clave -> {"status": código HTTP, "result": respuesta} o {"status", "detail"} si falló.
+    """
+    results: dict[str, dict] = {}
+    pending = list(build_requests)
+    route = getattr(getattr(service, "_http", None), "route", None)   # Cuenta del transporte (`RetryingHttp`)
+
+    for attempt in range(settings.BATCH_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(backoff_delay(attempt - 1))
+        retry = []
+
+        def callback(key, response, exception):
+            if exception is None:
+                results[key] = {"status": 200, "result": response or None}
+            elif isinstance(exception, HttpError):
+                if record_subrequest(route, exception.resp.status, exception.content):
+                    retry.append(key)
+                results[key] = {"status": exception.resp.status, "detail": error_detail(exception.content)}
+            else:
+                results[key] = {"status": 500, "detail": str(exception)}
+
+        for keys in chunked(pending):
+            batch = service.new_batch_http_request(callback=callback)
+            for key in keys:
+                batch.add(build_requests[key](), request_id=key)
+            batch.execute()
+            metrics.incr("drive_batch_requests_total")
+            metrics.incr("drive_batch_subrequests_total", len(keys))
+
+        if not retry:
+            break
+        metrics.incr("drive_batch_retries_total", len(retry))
+        pending = retry
+
+    return results
+
+
+def encode_batch(parts: dict[str, tuple[str, str]], boundary: str) -> bytes:
+    """
+    📨 Arma el cuerpo multipart/mixed de un pedido batch (para el backend httpx).
+
+    Args:
+        parts: clave -> (método, path con query string).
+        boundary: Separador del multipart.
+    """
+    body = []
+    for key, (method, path) in parts.items():
+        body.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <{key}>\r\n\r\n"
+            f"{method} {path} HTTP/1.1\r\n\r\n"
+        )
+    body.append(f"--{boundary}--\r\n")
+    return "".join(body).encode()
+
+
+def decode_batch(content_type: str, content: bytes) -> dict[str, tuple[int, str]]:
+    """
+    📬 Separa la respuesta multipart/mixed de un pedido batch.
+
+    Returns:
+        clave -> (status, cuerpo) de cada sub-request (Drive responde con `Content-ID: <response-clave>`).
+    """
+    message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + content)
+    responses = {}
+    for part in message.get_payload():
+        key = part["Content-ID"].strip("<>").removeprefix("response-")
+        status_line, _, rest = part.get_payload().partition("\n")
+        inner = BytesParser().parsebytes(rest.encode())
+        responses[key] = (int(status_line.split(" ", 2)[1]), inner.get_payload())
+    return responses
@@ -1,38 +1,284 @@
 import os
 import json
-from googleapiclient.discovery import build                       # 📦 Constructor del servicio de Google Drive
-from google.oauth2 import service_account                         # 🔐 Autenticación vía service account
-from app.drive.config import settings                             # ⚙️ Configuración central (env vars, rutas, etc.)
+import time
+import bisect
+import hashlib
+import itertools
+import logging
+import functools
+import threading
+from datetime import datetime, timedelta
 
-def get_drive_service():
+# googleapiclient y google-auth se importan recién al construir credenciales/clientes
+# (en el warm-up), así el proceso arranca y responde liveness sin pagar esas importaciones.
+from app.drive.config import settings                         # ⚙️ Configuración central (env vars, rutas, etc.)
+from app.drive.utils.metrics import metrics                   # 📊 Métricas por cuenta
+from .retry import RATE_LIMITED, RetryingHttp, new_limiter    # 🔁 Reintentos + límite adaptativo en cada llamada
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/drive"]  # Permiso completo para manipular Drive
+ACCOUNT_RATE_WINDOW_SECONDS = 60                    # Ventana de la tasa de llamadas por cuenta
+HASH_RING_REPLICAS = 64                             # Nodos virtuales por cuenta en el anillo de hashing
+
+
+def load_credentials(source: str | None = None):
     """
-    🔌 Inicializa y retorna un cliente autenticado de Google Drive API v3.
+    🔐 Construye las credenciales del Service Account.
 
     La autenticación se hace mediante un JSON de Service Account, que puede ser:
     - Un archivo físico en el sistema.
     - Un string con el contenido del JSON embebido (ideal para Docker/secrets/env vars).
 
-    Returns:
-        googleapiclient.discovery.Resource: Cliente de la API de Drive.
+    Args:
+        source: Ruta o contenido JSON de una cuenta de `GOOGLE_SERVICE_ACCOUNTS`. Si no se
+            indica se usan `GOOGLE_SERVICE_ACCOUNT_JSON` / `GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT`.
     """
-    scopes = ["https://www.googleapis.com/auth/drive"]  # Permiso completo para manipular Drive
-    json_path = settings.GOOGLE_SERVICE_ACCOUNT_JSON     # Ruta al archivo físico (si existe)
+    from google.oauth2 import service_account                     # 🔐 Autenticación vía service account
+
+    json_path = source or settings.GOOGLE_SERVICE_ACCOUNT_JSON     # Ruta al archivo físico (si existe)
 
     if os.path.isfile(json_path):
         # ✅ Si el archivo físico existe, se usa directamente
-        creds = service_account.Credentials.from_service_account_file(
-            json_path,
-            scopes=scopes
+        return service_account.Credentials.from_service_account_file(json_path, scopes=SCOPES)
+
+    # 🧠 Si no hay archivo, se intenta con el contenido de JSON embebido
+    content = source or settings.GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT
+    if not content:
+        raise RuntimeError(
+            "❌ No se encontró el fichero de credenciales "
+            "ni la variable GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT."
+        )
+    try:
+        info = json.loads(content)
+    except json.JSONDecodeError:
+        raise RuntimeError("Contenido de credenciales de la service account inválido.")
+
+    # 🔧 Corrige el formato del private_key (los \n vienen escapados en .env)
+    if isinstance(info.get("private_key"), str):
+        info["private_key"] = info["private_key"].replace("\\n", "\n")
+
+    return service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+
+
+class DriveClientPool:
+    """
+    ♻️ Pool de clientes de Drive de una service account, reutilizable por todo el proceso.
+
+    - Las credenciales y el documento de discovery (estático, sin red) se cargan una sola vez.
+    - El token OAuth se refresca antes de expirar, bajo lock, para que ningún request pague el minting.
+    - httplib2 no es thread-safe: cada hilo obtiene su propio cliente con un transporte keep-alive propio.
+    - Cada cuenta tiene su propio límite adaptativo (la cuota de Drive es por usuario) y se
+      retira temporalmente de la rotación si Drive le responde con errores de cuota.
+    """
+
+    def __init__(self, credentials_factory=load_credentials, name: str = "0"):
+        self.name = name
+        self._credentials_factory = credentials_factory
+        self._credentials = None
+        self._discovery_doc = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.limiter = new_limiter(f"drive_account_{name}")
+        self.ejected_until = 0.0
+        self._requests: dict[int, int] = {}   # segundo -> llamadas, para la tasa por cuenta
+
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    self._credentials = self._credentials_factory()
+        return self._credentials
+
+    @property
+    def discovery_doc(self) -> dict:
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    # 📚 Documento de discovery empaquetado en la librería (sin red)
+                    from googleapiclient.discovery_cache import get_static_doc
+                    doc = json.loads(get_static_doc("drive", "v3"))
+                    if settings.DRIVE_API_BASE_URL:
+                        # 🧪 Permite apuntar a otro endpoint (p.ej. un Drive falso local)
+                        doc["rootUrl"] = settings.DRIVE_API_BASE_URL.rstrip("/") + "/"
+                    self._discovery_doc = doc
+        return self._discovery_doc
+
+    @property
+    def identity(self) -> str:
+        # 🪪 Email de la service account (el nombre de la cuenta si las credenciales no lo traen)
+        return getattr(self.credentials, "service_account_email", None) or self.name
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    def record(self, kind: str):
+        """
+        📊 Registra el resultado de una llamada hecha con esta cuenta: ajusta su límite, la
+        retira de la rotación ante un error de cuota y publica su tasa de llamadas.
+        """
+        self.limiter.record(kind)
+        prefix = f"drive_account_{self.name}"
+        now = time.monotonic()
+        with self._lock:
+            second = int(now)
+            self._requests[second] = self._requests.get(second, 0) + 1
+            window = second - ACCOUNT_RATE_WINDOW_SECONDS
+            for old in [s for s in self._requests if s <= window]:
+                del self._requests[old]
+            rate = sum(self._requests.values()) / ACCOUNT_RATE_WINDOW_SECONDS
+        metrics.incr(f"{prefix}_requests_total")
+        metrics.set_gauge(f"{prefix}_requests_per_second", round(rate, 2))
+
+        if kind == RATE_LIMITED:
+            metrics.incr(f"{prefix}_rate_limited_total")
+            if not self.ejected:
+                metrics.incr(f"{prefix}_ejections_total")
+                logger.warning("⏸️ Service account %s retirada %ss por cuota", self.name, settings.DRIVE_ACCOUNT_EJECT_SECONDS)
+            self.ejected_until = now + settings.DRIVE_ACCOUNT_EJECT_SECONDS
+        metrics.set_gauge(f"{prefix}_ejected", int(self.ejected))
+
+    def token_is_fresh(self) -> bool:
+        """
+        ⏱️ Indica si hay un token vigente más allá del margen de refresco configurado.
+        """
+        creds = self.credentials
+        margin = timedelta(seconds=settings.DRIVE_TOKEN_REFRESH_MARGIN_SECONDS)
+        return bool(creds.token and creds.expiry and creds.expiry - margin > datetime.utcnow())
+
+    def ensure_fresh_token(self):
+        """
+        🔄 Refresca el token si no existe o si expira dentro del margen configurado.
+        """
+        if self.token_is_fresh():
+            return
+
+        with self._lock:
+            # Otro hilo pudo haberlo refrescado mientras esperábamos el lock
+            if self.token_is_fresh():
+                return
+            import httplib2
+            import google_auth_httplib2
+
+            self.credentials.refresh(
+                google_auth_httplib2.Request(httplib2.Http(timeout=settings.DRIVE_HTTP_TIMEOUT))
+            )
+
+    def warm_up(self):
+        """
+        🔥 Carga credenciales (y el discovery, que solo usa el backend googleapiclient) y obtiene
+        el primer token, para que el primer request no pague ese costo.
+        """
+        if settings.DRIVE_BACKEND == "googleapiclient":
+            self.discovery_doc
+        self.ensure_fresh_token()
+
+    def get_service(self):
+        """
+        🔌 Devuelve el cliente de Drive del hilo actual (lo construye la primera vez).
+        """
+        self.ensure_fresh_token()
+
+        service = getattr(self._local, "service", None)
+        if service is None:
+            import google_auth_httplib2
+            from googleapiclient.discovery import build_from_document    # 📦 Constructor del servicio de Google Drive
+            from googleapiclient.http import build_http
+
+            # build_http() deja de tratar el 308 como redirección (lo usan los uploads resumables)
+            transport = build_http()
+            transport.timeout = settings.DRIVE_HTTP_TIMEOUT
+            http = RetryingHttp(google_auth_httplib2.AuthorizedHttp(self.credentials, http=transport), route=self)
+            service = build_from_document(self.discovery_doc, http=http)
+            self._local.service = service
+        return service
+
+
+class DriveAccountPool:
+    """
+    🔀 Reparte las llamadas a Drive entre varias service accounts (`GOOGLE_SERVICE_ACCOUNTS`),
+    así el techo de cuota por usuario se multiplica por la cantidad de cuentas.
+
+    - "least_loaded": la cuenta con menor fracción ocupada de su límite adaptativo.
+    - "hash": hashing consistente por clave (p.ej. el file_id), para que las operaciones sobre
+      un mismo recurso usen la misma cuenta; sin clave se usa la menos cargada.
+
+    Las cuentas retiradas por errores de cuota se saltean; si todas lo están, se usa la que
+    vuelve antes.
+    """
+
+    def __init__(self, accounts: list[DriveClientPool], routing: str = "least_loaded"):
+        self.accounts = accounts
+        self.routing = routing
+        self._turn = itertools.count()
+        self._ring = sorted(
+            (_ring_hash(f"{account.name}-{replica}"), index)
+            for index, account in enumerate(accounts)
+            for replica in range(HASH_RING_REPLICAS)
         )
-    else:
-        # 🧠 Si no hay archivo, se intenta con el contenido de JSON embebido
-        info = json.loads(settings.GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT or "{}")
 
-        # 🔧 Corrige el formato del private_key (los \n vienen escapados en .env)
-        if isinstance(info.get("private_key"), str):
-            info["private_key"] = info["private_key"].replace("\\n", "\n")
+    def _least_loaded(self, candidates: list[DriveClientPool]) -> DriveClientPool:
+        # Se rota el punto de partida para que los empates (p.ej. todas ociosas) no caigan siempre en la primera
+        offset = next(self._turn) % len(candidates)
+        return min(candidates[offset:] + candidates[:offset], key=lambda account: account.limiter.load)
+
+    def pick(self, key: str | None = None) -> DriveClientPool:
+        healthy = [account for account in self.accounts if not account.ejected]
+        if not healthy:
+            return min(self.accounts, key=lambda account: account.ejected_until)
+        if len(self.accounts) == 1:
+            return healthy[0]
+        if self.routing == "hash" and key:
+            start = bisect.bisect(self._ring, (_ring_hash(key), -1))
+            for offset in range(len(self._ring)):
+                account = self.accounts[self._ring[(start + offset) % len(self._ring)][1]]
+                if not account.ejected:
+                    return account
+        return self._least_loaded(healthy)
+
+    def get_service(self, key: str | None = None):
+        return self.pick(key).get_service()
+
+    @property
+    def primary(self) -> DriveClientPool:
+        # Cuenta fija para lo que depende de una sola identidad (p.ej. el feed de cambios del índice)
+        return self.accounts[0]
+
 
-        creds = service_account.Credentials.from_service_account_info(info, scopes=scopes)
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
 
-    # 📦 Devuelve el cliente autenticado listo para usar
-    return build("drive", "v3", credentials=creds)
+
+def build_account_pool() -> DriveAccountPool:
+    """
+    🏗️ Una cuenta por entrada de `GOOGLE_SERVICE_ACCOUNTS` o, si está vacía, la cuenta única
+    de `GOOGLE_SERVICE_ACCOUNT_JSON` / `GOOGLE_SERVICE_ACCOUNT_JSON_CONTENT`.
+    Las credenciales se cargan recién en la primera llamada de cada cuenta.
+    """
+    sources = settings.GOOGLE_SERVICE_ACCOUNTS or [None]
+    accounts = [
+        DriveClientPool(functools.partial(load_credentials, source), name=str(index))
+        for index, source in enumerate(sources)
+    ]
+    return DriveAccountPool(accounts, settings.DRIVE_ACCOUNT_ROUTING)
+
+
+# 🌐 Pool compartido por todo el proceso
+drive_pool = build_account_pool()
+
+
+def get_drive_service(key: str | None = None):
+    """
+    🔌 Retorna un cliente autenticado de Google Drive API v3 desde el pool del proceso.
+
+    El cliente es propio del hilo que lo solicita, por lo que no debe compartirse entre hilos.
+
+    Args:
+        key: Clave de ruteo opcional (p.ej. el file_id) para el ruteo por hash entre cuentas.
+
+    Returns:
+        googleapiclient.discovery.Resource: Cliente de la API de Drive.
+    """
+    return drive_pool.get_service(key)
@@ -0,0 +1,184 @@
+import asyncio
+import copy
+import itertools
+from collections import deque
+from typing import AsyncIterator, Callable
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+
+
+class SharedStream:
+    """
+    📡 Un stream de Drive repartido entre varios lectores con un buffer acotado.
+
+    Una tarea consume el stream de origen y guarda los últimos `limit` chunks; cada lector
+    avanza con su propio cursor. Mientras el buffer conserva el primer chunk se pueden sumar
+    lectores nuevos.
+
+    Si el buffer se llena y un lector lento todavía necesita el chunk más viejo, se lo espera
+    hasta `max_lag` segundos; pasado ese tiempo se descarta el chunk y ese lector continúa
+    con su propia descarga desde el byte donde quedó (`fallback`), sin frenar al resto.
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[bytes],
+        fallback: Callable[[int], AsyncIterator[bytes]],
+        limit: int,
+        max_lag: float
+    ):
+        self._source = chunks
+        self._fallback = fallback
+        self._limit = max(1, limit)
+        self._max_lag = max_lag
+        self._buffer: deque[bytes] = deque()
+        self._base = 0                                # Índice absoluto del primer chunk del buffer
+        self._cursors: dict[int, int] = {}            # lector -> próximo chunk a leer
+        self._ids = itertools.count()
+        self._changed = asyncio.Event()
+        self._error: BaseException | None = None
+        self._done = False
+        self._task = asyncio.create_task(self._pump())
+
+    @property
+    def joinable(self) -> bool:
+        return self._base == 0 and self._error is None
+
+    def add_done_callback(self, callback: Callable[[asyncio.Task], None]):
+        self._task.add_done_callback(callback)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _wait(self, timeout: float | None = None):
+        await asyncio.wait_for(self._changed.wait(), timeout)
+
+    async def _pump(self):
+        try:
+            async for chunk in self._source:
+                self._buffer.append(chunk)
+                await self._make_room()
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._notify()
+            await self._source.aclose()
+
+    async def _make_room(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._max_lag
+        while len(self._buffer) > self._limit:
+            # Solo se espera a quien necesita justo el chunk más viejo; los ya soltados no cuentan
+            if self._base in self._cursors.values():
+                remaining = deadline - loop.time()
+                if remaining > 0:
+                    try:
+                        await self._wait(remaining)
+                        continue
+                    except asyncio.TimeoutError:
+                        pass
+            self._buffer.popleft()
+            self._base += 1
+
+    def subscribe(self) -> AsyncIterator[bytes]:
+        # El lector se registra ya (y no al primer `anext`) para que el buffer lo espere
+        reader = next(self._ids)
+        self._cursors[reader] = self._base
+        return self._read(reader)
+
+    async def _read(self, reader: int) -> AsyncIterator[bytes]:
+        offset = 0
+        try:
+            while True:
+                index = self._cursors[reader]
+                if index < self._base:
+                    # 🐢 Quedó atrás del buffer: sigue con su propia descarga
+                    metrics.incr("download_coalesce_fallbacks_total")
+                    del self._cursors[reader]
+                    self._notify()
+                    async for chunk in self._fallback(offset):
+                        yield chunk
+                    return
+                if index < self._base + len(self._buffer):
+                    chunk = self._buffer[index - self._base]
+                    self._cursors[reader] = index + 1
+                    offset += len(chunk)
+                    self._notify()
+                    yield chunk
+                    continue
+                if self._done:
+                    if self._error:
+                        raise self._error
+                    return
+                await self._wait()
+        finally:
+            self._cursors.pop(reader, None)
+            if not self._cursors and not self._done:
+                self._task.cancel()   # Nadie más lo lee: se corta la descarga de origen
+
+
+class CoalescingBackend:
+    """
+    🤝 Envuelve otro backend y agrupa (single-flight) las lecturas simultáneas del mismo archivo.
+
+    - Metadata: las llamadas concurrentes a `get_file_metadata` para un mismo `file_id`
+      esperan una sola consulta a Drive; cada una recibe su propia copia del resultado.
+    - Contenido: las descargas completas concurrentes comparten un único stream de Drive
+      (`SharedStream`). Las descargas por rango pasan directo al backend interno.
+
+    Métricas: `*_upstream_total` cuenta las llamadas reales a Drive y `*_coalesced_total`
+    las que se resolvieron sumándose a una ya en curso.
+    """
+
+    def __init__(self, inner):
+        self._inner = inner
+        self._metadata: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, SharedStream] = {}
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def _forget_metadata(self, file_id: str, task: asyncio.Task):
+        self._metadata.pop(file_id, None)
+        if not task.cancelled():
+            task.exception()   # Marca el error como leído aunque todos los que esperaban se hayan ido
+
+    def _forget_stream(self, file_id: str, stream: SharedStream):
+        if self._streams.get(file_id) is stream:
+            self._streams.pop(file_id)
+
+    async def get_file_metadata(self, file_id: str) -> dict:
+        task = self._metadata.get(file_id)
+        if task is None:
+            metrics.incr("metadata_upstream_total")
+            task = asyncio.create_task(self._inner.get_file_metadata(file_id))
+            self._metadata[file_id] = task
+            task.add_done_callback(lambda done: self._forget_metadata(file_id, done))
+        else:
+            metrics.incr("metadata_coalesced_total")
+
+        # shield: si un cliente cancela, la consulta sigue para los demás
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def iter_file_chunks(self, file_id: str, start: int = 0, end: int | None = None) -> AsyncIterator[bytes]:
+        if start or end is not None:
+            return self._inner.iter_file_chunks(file_id, start=start, end=end)
+
+        stream = self._streams.get(file_id)
+        if stream is not None and stream.joinable:
+            metrics.incr("download_coalesced_total")
+        else:
+            metrics.incr("download_upstream_total")
+            stream = SharedStream(
+                self._inner.iter_file_chunks(file_id),
+                lambda offset: self._inner.iter_file_chunks(file_id, start=offset),
+                settings.DOWNLOAD_COALESCE_BUFFER_CHUNKS,
+                settings.DOWNLOAD_COALESCE_MAX_LAG_SECONDS
+            )
+            self._streams[file_id] = stream
+            stream.add_done_callback(lambda _: self._forget_stream(file_id, stream))
+        return stream.subscribe()
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+
+SERVE_PREFIX = ".serve-"   # Hard links de respuestas en curso: `.serve-{pid}-{token}`
+
+
+def content_version(metadata: dict) -> Optional[str]:
+    """
+    🏷️ Versión del contenido según Drive (`md5Checksum` + `modifiedTime`).
+
+    Devuelve None para archivos sin checksum (p.ej. documentos nativos de Google), que no se cachean.
+    """
+    md5 = metadata.get("md5Checksum")
+    if not md5:
+        return None
+    raw = f"{md5}:{metadata.get('modifiedTime', '')}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class DiskContentCache:
+    """
+    💾 Cache en disco del contenido descargado de Drive, con presupuesto de bytes y desalojo LRU.
+
+    Cada entrada es un archivo `{file_id}.{version}`; se escribe en un temporal y se publica
+    con `os.replace` (escritura atómica), así nunca se sirve un archivo a medio escribir.
+
+    El directorio es compartido por todos los workers: ante un miss o un desalojo las entradas
+    y los bytes se vuelven a contar desde el directorio (el orden LRU sale del mtime, que se
+    actualiza en cada hit). Cada respuesta sirve un hard link propio (`acquire`/`release`):
+    si la entrada se desaloja o invalida mientras tanto, el enlace mantiene vivo el contenido.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_entry_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[str, str, int]] = OrderedDict()  # file_id -> (version, path, size)
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._remove_orphan_links()
+        with self._lock:
+            self._scan()
+
+    def _remove_orphan_links(self):
+        # 🧹 Enlaces de respuestas de procesos que ya no existen (p.ej. un worker que se cayó)
+        for name in os.listdir(self.directory):
+            if not name.startswith(SERVE_PREFIX):
+                continue
+            pid = int(name[len(SERVE_PREFIX):].split("-", 1)[0])
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                self.release(os.path.join(self.directory, name))
+            except PermissionError:
+                pass   # El proceso existe (de otro usuario)
+
+    def _scan(self):
+        # ♻️ Rearma las entradas desde el directorio, las menos usadas primero
+        found = []
+        for name in os.listdir(self.directory):
+            file_id, _, version = name.rpartition(".")
+            if not file_id or name.startswith("."):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue   # Otro worker lo desalojó mientras tanto
+            found.append((stat.st_mtime, file_id, version, path, stat.st_size))
+
+        self._entries, self._total_bytes = OrderedDict(), 0
+        for _, file_id, version, path, size in sorted(found):
+            previous = self._entries.pop(file_id, None)
+            if previous:
+                self._discard(previous)   # Versión vieja del mismo archivo
+            self._entries[file_id] = (version, path, size)
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._discard(evicted)
+            metrics.incr("content_cache_evictions_total")
+        metrics.set_gauge("content_cache_bytes", self._total_bytes)
+
+    def _add(self, file_id: str, version: str, path: str, size: int):
+        previous = self._entries.pop(file_id, None)
+        if previous:
+            # Dos descargas simultáneas de la misma versión publican en la misma ruta: no se borra
+            self._discard(previous, remove=previous[1] != path)
+        self._entries[file_id] = (version, path, size)
+        self._total_bytes += size
+        if self._total_bytes > self.max_bytes:
+            self._scan()   # Otros workers también escriben: se desaloja según el directorio real
+        else:
+            metrics.set_gauge("content_cache_bytes", self._total_bytes)
+
+    def _discard(self, entry: tuple[str, str, int], remove: bool = True):
+        self._total_bytes -= entry[2]
+        if remove:
+            self.release(entry[1])
+
+    def _link(self, path: str) -> Optional[str]:
+        link = os.path.join(self.directory, f"{SERVE_PREFIX}{os.getpid()}-{secrets.token_hex(8)}")
+        try:
+            os.link(path, link)
+            os.utime(path)   # Marca de uso para el LRU compartido
+        except FileNotFoundError:
+            return None
+        return link
+
+    def accepts(self, metadata: dict) -> bool:
+        size = int(metadata.get("size") or 0)
+        return content_version(metadata) is not None and 0 < size <= self.max_entry_bytes
+
+    def acquire(self, file_id: str, metadata: dict) -> Optional[str]:
+        """
+        🔍 Reserva el contenido cacheado si coincide con la versión actual en Drive.
+
+        Returns:
+            Ruta de un hard link propio de la respuesta (se sirve con `FileResponse`, sin copias
+            en espacio de usuario) que hay que soltar con `release`; None si no está en el cache.
+        """
+        version = content_version(metadata)
+        with self._lock:
+            for attempt in range(2):
+                entry = self._entries.get(file_id)
+                link = self._link(entry[1]) if entry and entry[0] == version else None
+                if link:
+                    self._entries.move_to_end(file_id)
+                    metrics.incr("content_cache_hits_total")
+                    return link
+                if attempt == 0:
+                    self._scan()   # Otro worker pudo haberlo guardado o desalojado
+        metrics.incr("content_cache_misses_total")
+        return None
+
+    @staticmethod
+    def release(path: str):
+        """
+        🔓 Suelta un enlace devuelto por `acquire` (o borra una entrada).
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, file_id: str):
+        """
+        🧹 Elimina la entrada de un archivo (se llama al reemplazarlo o borrarlo en Drive).
+        """
+        with self._lock:
+            self._scan()   # La entrada pudo haberla guardado otro worker
+            entry = self._entries.pop(file_id, None)
+            if entry:
+                self._discard(entry)
+                metrics.set_gauge("content_cache_bytes", self._total_bytes)
+
+    async def fill(self, file_id: str, metadata: dict, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        🌊 Reenvía los chunks al cliente y, en paralelo, los guarda en disco.
+
+        La entrada solo se publica si el archivo llegó completo; si el cliente corta, se descarta.
+        """
+        version = content_version(metadata)
+        expected = int(metadata.get("size") or 0)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                async for chunk in chunks:
+                    await asyncio.to_thread(tmp.write, chunk)
+                    written += len(chunk)
+                    yield chunk
+
+            if written == expected:
+                path = os.path.join(self.directory, f"{file_id}.{version}")
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self._add(file_id, version, path, written)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+# 🌐 Cache compartido por todo el proceso (deshabilitado si no hay CONTENT_CACHE_DIR)
+content_cache = DiskContentCache(
+    settings.CONTENT_CACHE_DIR,
+    settings.CONTENT_CACHE_MAX_BYTES,
+    settings.CONTENT_CACHE_MAX_ENTRY_BYTES,
+) if settings.CONTENT_CACHE_DIR else None
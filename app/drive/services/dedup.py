@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+from typing import BinaryIO, Optional
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .client import get_drive_service
+from .folders import escape_query_value
+
+CONTENT_MD5_KEY = "content_md5"
+SOURCE_NAME_KEY = "source_name"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_md5(data: bytes | BinaryIO) -> str:
+    """
+    🔑 MD5 hexadecimal del contenido (el mismo cálculo que `md5Checksum` de Drive).
+
+    Si `data` es un stream se recorre por chunks, sin cargarlo entero en memoria, y se rebobina.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return hashlib.md5(data).hexdigest()
+
+    digest = hashlib.md5()
+    data.seek(0)
+    for chunk in iter(lambda: data.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    data.seek(0)
+    return digest.hexdigest()
+
+
+def duplicate_query(folder_id: str, md5: str, source_name: Optional[str] = None) -> str:
+    # 🔍 appProperties sí es consultable (md5Checksum no), así el chequeo es una sola consulta
+    query = (
+        f"'{folder_id}' in parents and trashed=false and "
+        f"appProperties has {{ key='{CONTENT_MD5_KEY}' and value='{md5}' }}"
+    )
+    if source_name:
+        query += f" and appProperties has {{ key='{SOURCE_NAME_KEY}' and value='{escape_query_value(source_name)}' }}"
+    return query
+
+
+def find_by_content_md5(folder_id: str, md5: str, source_name: Optional[str] = None, service=None) -> Optional[str]:
+    """
+    🔎 Busca en la carpeta un archivo subido con el mismo contenido.
+
+    Args:
+        folder_id: ID de la carpeta destino.
+        md5: MD5 del contenido (`content_md5`).
+        source_name: Si se indica, además debe coincidir el nombre con el que se subió.
+        service: Cliente de Drive, opcional para testeo/mock.
+
+    Returns:
+        El ID del archivo existente, o None.
+    """
+    service = service or get_drive_service()
+    query = duplicate_query(folder_id, md5, source_name)
+    result = service.files().list(q=query, fields="files(id)", pageSize=1).execute()
+    files = result.get("files", [])
+    return files[0]["id"] if files else None
+
+
+class DedupBackend:
+    """
+    ♻️ Envuelve otro backend y evita subir dos veces el mismo contenido a una carpeta.
+
+    Antes de subir se calcula el MD5 del contenido recibido; si la carpeta ya tiene un archivo
+    con ese `appProperties.content_md5`, se devuelve su ID sin transferir bytes (ni transcodificar
+    ni generar miniaturas). Si no, el MD5 se guarda en el archivo nuevo para futuras subidas.
+
+    La carpeta de perfiles es compartida por todos los usuarios y cada archivo se identifica por
+    su nombre (`{user_id}{ext}`): ahí además debe coincidir el nombre subido.
+    """
+
+    def __init__(self, inner):
+        self._inner = inner
+        self._locks: dict[tuple, list] = {}  # clave -> [lock, referencias]
+        self._checks = 0
+        self._hits = 0
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def _record(self, hit: bool):
+        self._checks += 1
+        self._hits += hit
+        metrics.incr("dedup_checks_total")
+        if hit:
+            metrics.incr("dedup_hits_total")
+        metrics.set_gauge("dedup_hit_rate", round(self._hits / self._checks, 4))
+
+    async def upload_file_to_folder(self, data: bytes | BinaryIO, filename: str, mimetype: str, folder_id: str, app_properties: dict | None = None) -> str:
+        md5 = await asyncio.to_thread(content_md5, data)
+        source_name = filename if folder_id == settings.PROFILE_IMAGE_FOLDER_ID else None
+        properties = {**(app_properties or {}), CONTENT_MD5_KEY: md5}
+        if source_name:
+            properties[SOURCE_NAME_KEY] = source_name
+
+        # 🚦 Subidas simultáneas del mismo contenido (p.ej. reintentos) se serializan
+        key = (folder_id, md5, source_name)
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                existing = await self._inner.find_by_content_md5(folder_id, md5, source_name)
+                self._record(existing is not None)
+                if existing:
+                    return existing
+                return await self._inner.upload_file_to_folder(data, filename, mimetype, folder_id, properties)
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                self._locks.pop(key, None)
+
+    async def replace_file(self, file_id: str, file, new_filename: str) -> str:
+        # El contenido y el nombre cambian: se actualizan ambos para que futuras subidas lo reconozcan
+        md5 = await asyncio.to_thread(content_md5, file.file)
+        previous = await self._inner.get_file_metadata(file_id)
+        properties = {CONTENT_MD5_KEY: md5}
+        if settings.PROFILE_IMAGE_FOLDER_ID in (previous.get("parents") or []):
+            properties[SOURCE_NAME_KEY] = new_filename
+        new_id = await self._inner.replace_file(file_id, file, new_filename)
+        await self._inner.set_app_properties(new_id, properties)
+        return new_id
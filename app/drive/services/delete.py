@@ -1,4 +1,6 @@
+from .batch import execute_batch
 from .client import get_drive_service
+from .content_cache import content_cache
 
 def delete_file(file_id: str, service=None):
     """
@@ -14,7 +16,36 @@ def delete_file(file_id: str, service=None):
     Raises:
         HttpError: Si el archivo no existe o hay un problema con la API.
     """
-    service = service or get_drive_service()  # Usa cliente inyectado o genera uno nuevo
+    service = service or get_drive_service(file_id)  # Usa cliente inyectado o genera uno nuevo
 
     # Ejecuta la operación de borrado
     service.files().delete(fileId=file_id).execute()
+
+    # 🧹 El contenido cacheado en disco ya no es válido
+    if content_cache:
+        content_cache.invalidate(file_id)
+
+
+def delete_files(file_ids: list[str], service=None) -> dict[str, dict]:
+    """
+    🗑️ Elimina varios archivos con pedidos batch de Drive (hasta 100 por llamada HTTP).
+
+    Args:
+        file_ids: IDs de los archivos a eliminar.
+        service: Cliente de Google Drive (opcional para test/mock).
+
+    Returns:
+        file_id -> {"status": ...} con el resultado de cada borrado (`detail` si falló).
+    """
+    service = service or get_drive_service()
+    results = execute_batch(service, {
+        file_id: (lambda file_id=file_id: service.files().delete(fileId=file_id))
+        for file_id in dict.fromkeys(file_ids)
+    })
+
+    # 🧹 El contenido cacheado en disco ya no es válido
+    if content_cache:
+        for file_id, result in results.items():
+            if result["status"] < 300:
+                content_cache.invalidate(file_id)
+    return results
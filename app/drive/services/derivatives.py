@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Optional
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .imaging import IMAGE_FORMATS, TRANSCODE_TARGETS, can_encode, imaging_available, render_thumbnails, transcode_image
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_KEY_PREFIX = "thumb_"
+ORIGINAL_KEY = "original"
+
+_image_pool: ProcessPoolExecutor | None = None
+_pending: dict[str, asyncio.Task] = {}   # file_id -> tarea en curso (y referencia para que no la recolecte el GC)
+
+
+def image_pool() -> ProcessPoolExecutor:
+    # 🏭 Pool de procesos para el trabajo de CPU con imágenes (se crea al primer uso)
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(cancel_futures=True)
+        _image_pool = None
+
+
+def derivatives_enabled(mimetype: Optional[str]) -> bool:
+    return bool(settings.THUMBNAIL_SIZES) and imaging_available() and mimetype in IMAGE_FORMATS
+
+
+def transcode_target(mimetype: Optional[str]) -> Optional[tuple[str, str, str]]:
+    """
+    🔄 Formato de destino (formato Pillow, MIME, extensión) si `mimetype` debe transcodificarse.
+    """
+    if not settings.TRANSCODE_FORMAT or mimetype not in settings.TRANSCODE_QUALITY:
+        return None
+    target = TRANSCODE_TARGETS[settings.TRANSCODE_FORMAT]
+    if target[1] == mimetype or not can_encode(target[0]):
+        return None
+    return target
+
+
+def linked_derivatives(metadata: dict) -> dict[str, str]:
+    """
+    🔗 Todos los derivados vinculados a un archivo (miniaturas y original conservado): clave -> file_id.
+    """
+    return {
+        key: value for key, value in (metadata.get("appProperties") or {}).items()
+        if value and (key.startswith(THUMBNAIL_KEY_PREFIX) or key == ORIGINAL_KEY)
+    }
+
+
+def accepts_explicitly(accept: Optional[str], mimetype: str) -> bool:
+    # Solo cuenta si el cliente nombra el tipo: "*/*" o "image/*" no garantizan soporte de WebP/AVIF
+    for media_range in (accept or "").split(","):
+        media_type, _, params = media_range.strip().partition(";")
+        if media_type.strip().lower() == mimetype and "q=0" not in params.replace(" ", "").split(";"):
+            return True
+    return False
+
+
+def negotiate_original(metadata: dict, accept: Optional[str]) -> Optional[str]:
+    """
+    🤝 Si el archivo se guardó transcodificado y el cliente no declara soporte para su formato,
+    devuelve el ID del original conservado (si lo hay).
+    """
+    original_id = (metadata.get("appProperties") or {}).get(ORIGINAL_KEY)
+    if original_id and not accepts_explicitly(accept, metadata.get("mimeType", "")):
+        return original_id
+    return None
+
+
+def derivative_links(metadata: dict) -> dict[int, str]:
+    """
+    🔗 Miniaturas vinculadas a un archivo en sus `appProperties` (size -> file_id).
+    """
+    links = {}
+    for key, value in (metadata.get("appProperties") or {}).items():
+        if key.startswith(THUMBNAIL_KEY_PREFIX) and value:
+            links[int(key[len(THUMBNAIL_KEY_PREFIX):])] = value
+    return links
+
+
+def pick_derivative(metadata: dict, size: int) -> Optional[str]:
+    """
+    📐 Elige la miniatura más chica que cubre `size` px. Si ninguna alcanza, devuelve None
+    (el original, más grande que todas las miniaturas, es la mejor opción).
+    """
+    links = derivative_links(metadata)
+    fitting = [candidate for candidate in links if candidate >= size]
+    return links[min(fitting)] if fitting else None
+
+
+def _read_source(data: bytes | BinaryIO) -> Optional[bytes]:
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    data.seek(0, io.SEEK_END)
+    size = data.tell()
+    data.seek(0)
+    if size > settings.IMAGE_MAX_SOURCE_BYTES:
+        return None
+    content = data.read()
+    data.seek(0)
+    return content
+
+
+def _with_extension(filename: str, ext: str) -> str:
+    return os.path.splitext(filename)[0] + ext
+
+
+class DerivativesBackend:
+    """
+    🖼️ Envuelve otro backend y agrega el pipeline de imágenes a subidas y reemplazos.
+
+    - Transcoding (`TRANSCODE_FORMAT`): antes de subir, las imágenes de los tipos en
+      `TRANSCODE_QUALITY` se re-codifican a WebP/AVIF en el pool de procesos, sin metadata.
+      Si el resultado no es más chico, se guarda el original. Con `TRANSCODE_KEEP_ORIGINAL`
+      el original se conserva vinculado como `appProperties.original`.
+    - Miniaturas (`THUMBNAIL_SIZES`): tras cada subida o reemplazo se generan en segundo plano,
+      se suben a la misma carpeta marcadas con `appProperties.derivative=true` y se vinculan al
+      archivo como `appProperties.thumb_<size>`.
+
+    Al borrar o reemplazar el archivo se eliminan sus derivados anteriores.
+    """
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    async def _transcode(self, content: bytes, mimetype: str, target: tuple[str, str, str]) -> Optional[bytes]:
+        try:
+            loop = asyncio.get_running_loop()
+            transcoded = await loop.run_in_executor(
+                image_pool(), transcode_image, content, target[0], settings.TRANSCODE_QUALITY[mimetype]
+            )
+        except Exception:
+            metrics.incr("transcode_errors_total")
+            logger.exception("❌ Error transcodificando imagen %s", mimetype)
+            return None
+
+        metrics.incr("transcode_bytes_in_total", len(content))
+        if len(transcoded) >= len(content):
+            metrics.incr("transcode_skipped_total")   # No conviene: se guarda el original
+            metrics.incr("transcode_bytes_out_total", len(content))
+            return None
+        metrics.incr("transcode_bytes_out_total", len(transcoded))
+        return transcoded
+
+    def _schedule(self, file_id: str, content: bytes, filename: str, mimetype: str, folder_id: str, original: tuple | None = None):
+        self._cancel(file_id)
+        task = asyncio.create_task(self._build(file_id, content, filename, mimetype, folder_id, original))
+        _pending[file_id] = task
+        task.add_done_callback(lambda done: _pending.pop(file_id, None) if _pending.get(file_id) is done else None)
+
+    @staticmethod
+    def _cancel(file_id: str):
+        # ✋ Un reemplazo o borrado deja sin sentido los derivados que se estaban generando
+        task = _pending.pop(file_id, None)
+        if task:
+            task.cancel()
+
+    async def _current(self, file_id: str, md5: str) -> bool:
+        # 🔎 El archivo sigue existiendo con el contenido del que salieron los derivados
+        try:
+            metadata = await self._inner.get_file_metadata(file_id)
+        except FileNotFoundError:
+            return False
+        return metadata.get("md5Checksum") in (None, md5)
+
+    async def _build(self, file_id: str, content: bytes, filename: str, mimetype: str, folder_id: str, original: tuple | None = None):
+        links = {}
+        try:
+            md5 = await asyncio.to_thread(lambda: hashlib.md5(content).hexdigest())
+            derivative_properties = {"derivative": "true", "derivative_of": file_id}
+
+            if original:
+                data, original_name, original_type = original
+                links[ORIGINAL_KEY] = await self._inner.upload_file_to_folder(
+                    data, original_name, original_type, folder_id, derivative_properties
+                )
+
+            if derivatives_enabled(mimetype):
+                loop = asyncio.get_running_loop()
+                thumbnails = await loop.run_in_executor(
+                    image_pool(), render_thumbnails, content, mimetype, settings.THUMBNAIL_SIZES
+                )
+                stem, ext = os.path.splitext(filename)
+                links.update({f"{THUMBNAIL_KEY_PREFIX}{size}": None for size in settings.THUMBNAIL_SIZES})
+                for size, data in thumbnails.items():
+                    links[f"{THUMBNAIL_KEY_PREFIX}{size}"] = await self._inner.upload_file_to_folder(
+                        data, f"{stem}_{size}{ext}", mimetype, folder_id, derivative_properties
+                    )
+                metrics.incr("thumbnails_generated_total", len(thumbnails))
+
+            if not links:
+                return
+            # Mientras se generaban, el archivo pudo reemplazarse (en otro worker) o borrarse
+            if not await self._current(file_id, md5):
+                metrics.incr("thumbnails_discarded_total")
+                await self._delete_derivatives(links)
+                return
+            await self._inner.set_app_properties(file_id, links)
+        except asyncio.CancelledError:
+            metrics.incr("thumbnails_discarded_total")
+            await self._delete_derivatives(links)
+            raise
+        except Exception:
+            metrics.incr("thumbnail_errors_total")
+            logger.exception("❌ Error generando derivados de %s", file_id)
+            await self._delete_derivatives(links)
+
+    async def _delete_derivatives(self, links: dict[str, Optional[str]]):
+        for derivative_id in filter(None, links.values()):
+            try:
+                await self._inner.delete_file(derivative_id)
+            except Exception:
+                logger.warning("No se pudo borrar el derivado %s", derivative_id)
+
+    async def _prepare(self, data: bytes | BinaryIO, filename: str, mimetype: str):
+        """
+        🧪 Lee la imagen (si hay algo que hacer con ella) y la transcodifica si corresponde.
+
+        Returns:
+            (contenido final o None, nombre, MIME, original conservado o None)
+        """
+        target = transcode_target(mimetype)
+        if not (target or derivatives_enabled(mimetype)):
+            return None, filename, mimetype, None
+
+        content = await asyncio.to_thread(_read_source, data)
+        if content and target:
+            transcoded = await self._transcode(content, mimetype, target)
+            if transcoded:
+                original = (content, filename, mimetype) if settings.TRANSCODE_KEEP_ORIGINAL else None
+                return transcoded, _with_extension(filename, target[2]), target[1], original
+        return content, filename, mimetype, None
+
+    async def upload_file_to_folder(self, data: bytes | BinaryIO, filename: str, mimetype: str, folder_id: str, app_properties: dict | None = None) -> str:
+        content, filename, stored_type, original = await self._prepare(data, filename, mimetype)
+        if content and stored_type != mimetype:
+            data = content   # Se sube la versión transcodificada
+
+        file_id = await self._inner.upload_file_to_folder(data, filename, stored_type, folder_id, app_properties)
+        if content:
+            self._schedule(file_id, content, filename, stored_type, folder_id, original)
+        return file_id
+
+    async def replace_file(self, file_id: str, file: UploadFile, new_filename: str) -> str:
+        previous = await self._inner.get_file_metadata(file_id)
+        mimetype = file.content_type or mimetypes.guess_type(file.filename)[0]
+        folder_id = (previous.get("parents") or [None])[0]
+
+        content, original = None, None
+        if folder_id:
+            content, new_filename, stored_type, original = await self._prepare(file.file, new_filename, mimetype)
+            if content and stored_type != mimetype:
+                # Se reemplaza con la versión transcodificada (el nombre del upload se conserva para validar la extensión)
+                file = UploadFile(io.BytesIO(content), size=len(content), filename=file.filename,
+                                  headers=Headers({"content-type": stored_type}))
+            mimetype = stored_type
+
+        self._cancel(file_id)
+        new_id = await self._inner.replace_file(file_id, file, new_filename)
+
+        # ♻️ Los derivados anteriores ya no corresponden al contenido nuevo: se desvinculan y se borran
+        old_links = linked_derivatives(previous)
+        if old_links:
+            await self._inner.set_app_properties(new_id, {key: None for key in old_links})
+            await self._delete_derivatives(old_links)
+        if content:
+            self._schedule(new_id, content, new_filename, mimetype, folder_id, original)
+        return new_id
+
+    async def delete_file(self, file_id: str):
+        self._cancel(file_id)
+        try:
+            metadata = await self._inner.get_file_metadata(file_id)
+        except FileNotFoundError:
+            metadata = {}
+        await self._inner.delete_file(file_id)
+        await self._delete_derivatives(linked_derivatives(metadata))
+
+    async def delete_files(self, file_ids: list[str]) -> dict[str, dict]:
+        # Los derivados vinculados se borran en los mismos pedidos batch
+        for file_id in file_ids:
+            self._cancel(file_id)
+        found = await self._inner.get_files_metadata(file_ids)
+        derivatives = [
+            derivative_id
+            for result in found.values() if result["status"] < 300
+            for derivative_id in linked_derivatives(result["result"]).values()
+        ]
+        results = await self._inner.delete_files([*file_ids, *derivatives])
+        return {file_id: results[file_id] for file_id in dict.fromkeys(file_ids)}
@@ -1,12 +1,82 @@
-import io
-from googleapiclient.http import MediaIoBaseDownload     # 📦 Cliente de descarga de archivos en chunks
+from typing import Iterator
+
 from googleapiclient.errors import HttpError             # ❌ Para manejar errores HTTP de la API
+from app.drive.config import settings
+from .batch import execute_batch                         # 🧺 Pedidos batch de Drive
 from .client import get_drive_service                    # 🔌 Cliente autenticado de Google Drive
 
+# 📑 Campos de metadata que necesitan las rutas de descarga
+METADATA_FIELDS = "id, name, mimeType, parents, size, md5Checksum, modifiedTime, appProperties"
+
+
+def iter_file_chunks(
+    file_id: str,
+    service=None,
+    chunk_size: int | None = None,
+    start: int = 0,
+    end: int | None = None
+) -> Iterator[bytes]:
+    """
+    🌊 Descarga un archivo de Google Drive en chunks, entregándolos a medida que llegan.
+
+    Cada chunk se pide con un header `Range`, por lo que en memoria solo vive el chunk actual.
+    Si no se inyecta un cliente, se toma el del hilo que consume cada chunk (los iteradores
+    de `StreamingResponse` pueden avanzar desde hilos distintos).
+
+    Args:
+        file_id: ID único del archivo en Google Drive.
+        service: Cliente de Drive (opcional, para testeo/mockeo).
+        chunk_size: Tamaño de cada chunk en bytes (por defecto `DOWNLOAD_CHUNK_SIZE`).
+        start: Primer byte a descargar.
+        end: Último byte a descargar (inclusivo); None para llegar al final del archivo.
+
+    Yields:
+        Bloques binarios del archivo, en orden.
+
+    Raises:
+        FileNotFoundError: Si el archivo no existe (404).
+        HttpError: Otros errores de la API, o una respuesta 206 sin `Content-Range`.
+    """
+    chunk_size = chunk_size or settings.DOWNLOAD_CHUNK_SIZE
+    position = start
+    total_size = None
+
+    while (total_size is None or position < total_size) and (end is None or position <= end):
+        request = (service or get_drive_service(file_id)).files().get_media(fileId=file_id)
+        chunk_end = position + chunk_size - 1 if end is None else min(position + chunk_size - 1, end)
+        headers = {"range": f"bytes={position}-{chunk_end}"}
+        resp, content = request.http.request(request.uri, method="GET", headers=headers)
+
+        if resp.status == 404:
+            raise FileNotFoundError(f"Archivo no encontrado: {file_id}")
+        if resp.status == 416:
+            # Range no satisfacible: típico de archivos de 0 bytes
+            return
+        if resp.status not in (200, 206):
+            raise HttpError(resp, content, uri=request.uri)
+
+        if resp.status == 200:
+            # El servidor ignoró el Range: el cuerpo es el archivo completo desde el byte 0
+            content = content[position:None if end is None else end + 1]
+            if content:
+                yield content
+            return
+        if "content-range" not in resp:
+            # Un 206 sin Content-Range no dice qué bytes trae: seguir corrompería el archivo
+            raise HttpError(resp, content, uri=request.uri)
+        total_size = int(resp["content-range"].rsplit("/", 1)[1])
+
+        if not content:
+            return
+        position += len(content)
+        yield content
+
 
 def download_file(file_id: str, service=None) -> bytes:
     """
-    📥 Descarga un archivo desde Google Drive usando su ID.
+    📥 Descarga un archivo completo desde Google Drive usando su ID.
+
+    ⚠️ Carga el archivo entero en memoria: para responder a clientes usar `iter_file_chunks`.
 
     Args:
         file_id: ID único del archivo en Google Drive.
@@ -19,40 +89,49 @@ def download_file(file_id: str, service=None) -> bytes:
         FileNotFoundError: Si el archivo no existe (404).
         Otros errores propagados si ocurren durante la descarga.
     """
-    service = service or get_drive_service()
+    return b"".join(iter_file_chunks(file_id, service))
+
+
+def get_file_metadata(file_id: str, service=None) -> dict:
+    """
+    📑 Obtiene metadata de un archivo de Drive (sin descargar su contenido).
 
-    # Solicitud para descargar contenido binario
-    request = service.files().get_media(fileId=file_id)
-    buffer = io.BytesIO()
-    downloader = MediaIoBaseDownload(buffer, request)
+    Args:
+        file_id: ID del archivo en Drive.
+        service: Cliente de Drive (opcional).
+
+    Returns:
+        Diccionario con: id, name, mimeType, parents, size, md5Checksum, modifiedTime.
+
+    Raises:
+        FileNotFoundError: Si el archivo no existe (404).
+    """
+    service = service or get_drive_service(file_id)
 
     try:
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()  # Descarga en chunks si es grande
+        return service.files().get(
+            fileId=file_id,
+            fields=METADATA_FIELDS  # Solo solicitamos lo que necesitamos
+        ).execute()
     except HttpError as e:
         if e.resp.status == 404:
             raise FileNotFoundError(f"Archivo no encontrado: {file_id}")
-        raise  # Re-lanza otros errores
-
-    return buffer.getvalue()  # Contenido final en bytes
+        raise
 
 
-def get_file_metadata(file_id: str, service=None) -> dict:
+def get_files_metadata(file_ids: list[str], service=None) -> dict[str, dict]:
     """
-    📑 Obtiene metadata de un archivo de Drive (sin descargar su contenido).
+    📑 Obtiene la metadata de varios archivos con pedidos batch de Drive (hasta 100 por llamada HTTP).
 
     Args:
-        file_id: ID del archivo en Drive.
+        file_ids: IDs de los archivos.
         service: Cliente de Drive (opcional).
 
     Returns:
-        Diccionario con: id, name, mimeType, parents.
+        file_id -> {"status": 200, "result": metadata} o {"status", "detail"} si falló (p.ej. 404).
     """
     service = service or get_drive_service()
-
-    return service.files().get(
-        fileId=file_id,
-        fields="id, name, mimeType, parents"  # Solo solicitamos lo que necesitamos
-    ).execute()
-
+    return execute_batch(service, {
+        file_id: (lambda file_id=file_id: service.files().get(fileId=file_id, fields=METADATA_FIELDS))
+        for file_id in dict.fromkeys(file_ids)
+    })
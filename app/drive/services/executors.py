@@ -0,0 +1,97 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, TypeVar
+
+from fastapi import HTTPException, status
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+
+T = TypeVar("T")
+_END = object()
+
+
+class Bulkhead:
+    """
+    🚧 Pool de hilos acotado para llamadas bloqueantes a Drive.
+
+    Cada tipo de tráfico (metadata, upload, download) tiene su propio bulkhead, de modo que
+    las transferencias grandes no dejan sin hilos a las llamadas rápidas de metadata/listado.
+    Admite `workers + queue_size` llamadas simultáneas; por encima de eso responde 503.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"drive-{name}")
+        self._slots: asyncio.Semaphore | None = None
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Se crea perezosamente para quedar ligado al event loop que lo usa
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.capacity)
+        return self._slots
+
+    def _reject(self):
+        metrics.incr(f"bulkhead_{self.name}_rejected_total")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Servicio saturado ({self.name}), reintente más tarde",
+            headers={"Retry-After": str(settings.DRIVE_RETRY_AFTER_SECONDS)}
+        )
+
+    async def run(self, fn: Callable[..., T], *args, wait: bool = False, **kwargs) -> T:
+        """
+        ⏳ Ejecuta `fn(*args, **kwargs)` en el pool sin bloquear el event loop.
+
+        Args:
+            fn: Función bloqueante a ejecutar.
+            wait: Si es True espera un lugar libre en vez de responder 503 (para streams ya iniciados).
+
+        Raises:
+            HTTPException(503): Si el bulkhead está saturado y `wait` es False.
+        """
+        if not wait and self.slots.locked():
+            self._reject()
+
+        await self.slots.acquire()
+        metrics.incr(f"bulkhead_{self.name}_calls_total")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.slots.release()
+
+    async def iterate(self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        """
+        🌊 Consume un iterador bloqueante paso a paso dentro del pool.
+
+        El primer paso responde 503 si el bulkhead está saturado (la respuesta aún no empezó);
+        los siguientes esperan un lugar libre para no cortar un stream en curso.
+
+        Args:
+            iterator: Iterador síncrono (p.ej. `iter_file_chunks`).
+        """
+        try:
+            wait = False
+            while True:
+                item = await self.run(next, iterator, _END, wait=wait)
+                wait = True
+                if item is _END:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                try:
+                    close()
+                except ValueError:
+                    pass  # Un hilo del pool sigue avanzando el generador; se liberará al terminar
+
+
+# 🚧 Bulkheads separados por tipo de tráfico
+metadata_pool = Bulkhead("metadata", settings.DRIVE_METADATA_WORKERS, settings.DRIVE_METADATA_QUEUE_SIZE)
+upload_pool = Bulkhead("upload", settings.DRIVE_UPLOAD_WORKERS, settings.DRIVE_UPLOAD_QUEUE_SIZE)
+download_pool = Bulkhead("download", settings.DRIVE_DOWNLOAD_WORKERS, settings.DRIVE_DOWNLOAD_QUEUE_SIZE)
@@ -0,0 +1,154 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from app.drive.utils.zip_stream import ZipStreamWriter
+from .folders import FOLDER_MIMETYPE
+
+ERRORS_ENTRY = "errores.txt"
+
+
+class _Prefetch:
+    """
+    🏎️ Descarga de un archivo que avanza en segundo plano hasta `EXPORT_ZIP_PREFETCH_CHUNKS`
+    chunks por delante del ZIP: mientras se escribe una entrada, las siguientes ya se bajan,
+    sin que ninguna retenga más que esos chunks en memoria.
+    """
+
+    def __init__(self, drive, path: str, file: dict):
+        self.path = path
+        self.file = file
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, settings.EXPORT_ZIP_PREFETCH_CHUNKS))
+        self._task = asyncio.create_task(self._run(drive))
+
+    async def _run(self, drive):
+        chunks = drive.iter_file_chunks(self.file["id"])
+        try:
+            async for chunk in chunks:
+                await self._queue.put(chunk)
+            await self._queue.put(None)
+        except Exception as e:
+            await self._queue.put(e)   # El error se reporta al llegar a esta entrada
+        finally:
+            await chunks.aclose()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while (item := await self._queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def aclose(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+async def _chain(first: list[dict], pages: AsyncIterator[list[dict]]) -> AsyncIterator[list[dict]]:
+    if first:
+        yield first
+    async for page in pages:
+        yield page
+
+
+async def iter_export_files(drive, first: list[dict], pages: AsyncIterator[list[dict]], subfolders: bool = True) -> AsyncIterator[tuple[str, dict]]:
+    """
+    🗂️ Recorre la carpeta página por página y devuelve (ruta en el ZIP, archivo).
+    Con `subfolders`, después sigue con cada subcarpeta (los subproductos) bajo `{nombre}/`.
+
+    Args:
+        first: Primera página, ya pedida (sus errores se devuelven como status HTTP).
+        pages: Resto de las páginas de la carpeta.
+    """
+    folders: deque[tuple[str, str]] = deque()
+    prefix = ""
+    while True:
+        try:
+            async for page in _chain(first, pages):
+                for file in page:
+                    if file.get("mimeType") != FOLDER_MIMETYPE:
+                        yield prefix + file["name"], file
+                    elif subfolders:
+                        folders.append((file["id"], f"{prefix}{file['name']}/"))
+        finally:
+            await pages.aclose()
+
+        if not folders:
+            return
+        folder_id, prefix = folders.popleft()
+        first, pages = [], drive.iter_file_pages(folder_id)
+
+
+async def _iter_entry(writer: ZipStreamWriter, prefetch: _Prefetch, errors: list[str]) -> AsyncIterator[bytes]:
+    # El header se escribe con el primer chunk: si la descarga falla antes, la entrada se omite
+    name, started = writer.unique_name(prefetch.path), False
+    try:
+        async for chunk in prefetch:
+            if not started:
+                yield writer.start_entry(name, prefetch.file.get("modifiedTime"))
+                started = True
+            yield writer.write(chunk)
+        if not started:
+            yield writer.start_entry(name, prefetch.file.get("modifiedTime"))   # Archivo vacío
+        yield writer.end_entry()
+        metrics.incr("export_zip_entries_total")
+    except Exception as e:
+        metrics.incr("export_zip_failed_entries_total")
+        errors.append(f"{name}: {'incompleto, ' if started else ''}{type(e).__name__}: {e}")
+        if started:
+            yield writer.end_entry()   # Entrada truncada pero el ZIP sigue siendo válido
+
+
+async def iter_zip(drive, files: AsyncIterator[tuple[str, dict]]) -> AsyncIterator[bytes]:
+    """
+    🗜️ Transmite el ZIP de los archivos a medida que se arma.
+
+    Se mantienen `EXPORT_ZIP_CONCURRENCY` descargas en curso (la entrada que se escribe y las
+    siguientes, en orden); al terminar una entrada arranca la próxima. La memoria queda acotada
+    por concurrencia × chunks de prefetch, sin importar cuántos archivos tenga la carpeta.
+
+    Los archivos que no se pudieron descargar se detallan en `errores.txt` al final del ZIP
+    (la respuesta ya empezó y no puede cambiar de status).
+    """
+    writer, errors = ZipStreamWriter(), []
+    window: deque[_Prefetch] = deque()
+    concurrency, listed = max(1, settings.EXPORT_ZIP_CONCURRENCY), True
+    metrics.incr("export_zip_total")
+
+    async def fill():
+        nonlocal listed
+        while listed and len(window) < concurrency:
+            try:
+                item = await anext(files, None)
+            except Exception as e:
+                item = None
+                errors.append(f"(listado incompleto) {type(e).__name__}: {e}")
+            if item is None:
+                listed = False
+                return
+            window.append(_Prefetch(drive, *item))
+
+    try:
+        await fill()
+        while window:
+            prefetch = window.popleft()
+            try:
+                await fill()   # La próxima descarga arranca apenas se libera un lugar
+                async for piece in _iter_entry(writer, prefetch, errors):
+                    yield piece
+            finally:
+                await prefetch.aclose()
+
+        if errors:
+            yield writer.start_entry(writer.unique_name(ERRORS_ENTRY))
+            yield writer.write("\n".join(errors).encode() + b"\n")
+            yield writer.end_entry()
+        for piece in writer.finish():
+            yield piece
+        metrics.incr("export_zip_bytes_total", writer.offset)
+
+    finally:
+        for prefetch in window:
+            await prefetch.aclose()   # Cliente desconectado: se cortan las descargas pendientes
+        await files.aclose()
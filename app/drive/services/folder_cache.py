@@ -0,0 +1,180 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from app.drive.config import settings
+
+
+class SqliteFolderStore:
+    """
+    🗄️ Backend compartido (archivo SQLite local) para que varios workers de uvicorn
+    reutilicen las mismas resoluciones de carpetas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS folder_cache ("
+                " parent_id TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " folder_id TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " PRIMARY KEY (parent_id, name))"
+            )
+
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        # Una conexión por operación: sqlite3 no permite compartirlas entre hilos
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=check_same_thread)
+
+    def get(self, parent_id: str, name: str) -> Optional[tuple[str, float]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT folder_id, expires_at FROM folder_cache WHERE parent_id = ? AND name = ?",
+                (parent_id, name)
+            ).fetchone()
+        if row and row[1] > time.time():
+            return row[0], row[1]
+        return None
+
+    def set(self, parent_id: str, name: str, folder_id: str, expires_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO folder_cache (parent_id, name, folder_id, expires_at) VALUES (?, ?, ?, ?)",
+                (parent_id, name, folder_id, expires_at)
+            )
+
+    def delete(self, parent_id: str, name: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM folder_cache WHERE parent_id = ? AND name = ?", (parent_id, name))
+
+    @contextmanager
+    def write_lock(self):
+        """
+        🔒 Lock entre procesos: `BEGIN IMMEDIATE` serializa la creación de carpetas entre workers.
+
+        La conexión se usa de a un hilo por vez, pero el backend async la abre y la cierra desde
+        hilos distintos (ver `FolderCache.async_creation_lock`).
+        """
+        conn = self._connect(check_same_thread=False)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield
+        finally:
+            conn.execute("ROLLBACK")
+            conn.close()
+
+
+class FolderCache:
+    """
+    📁 Cache LRU/TTL en memoria que mapea (parent_id, name) -> folder_id.
+
+    Los misses concurrentes para la misma clave se coalescen (single-flight): solo un hilo
+    consulta/crea la carpeta en Drive y el resto reutiliza su resultado.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, store: Optional[SqliteFolderStore] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._entries: OrderedDict[tuple[str, str], tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: dict[tuple[str, str], list] = {}  # clave -> [lock, referencias]
+
+    def get(self, parent_id: str, name: str) -> Optional[str]:
+        key = (parent_id, name)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+        if self.store:
+            shared = self.store.get(parent_id, name)
+            if shared:
+                self._remember(key, *shared)
+                return shared[0]
+        return None
+
+    def set(self, parent_id: str, name: str, folder_id: str):
+        expires_at = time.time() + self.ttl_seconds
+        self._remember((parent_id, name), folder_id, expires_at)
+        if self.store:
+            self.store.set(parent_id, name, folder_id, expires_at)
+
+    def invalidate(self, parent_id: str, name: str):
+        with self._lock:
+            self._entries.pop((parent_id, name), None)
+        if self.store:
+            self.store.delete(parent_id, name)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: tuple[str, str], folder_id: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (folder_id, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @contextmanager
+    def single_flight(self, parent_id: str, name: str):
+        """
+        🚦 Serializa la resolución de una misma clave dentro del proceso.
+        """
+        key = (parent_id, name)
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    self._key_locks.pop(key, None)
+
+    @contextmanager
+    def creation_lock(self):
+        """
+        🔒 Lock opcional entre workers para la creación de carpetas (solo con backend compartido).
+        """
+        if self.store:
+            with self.store.write_lock():
+                yield
+        else:
+            yield
+
+    @asynccontextmanager
+    async def async_creation_lock(self):
+        """
+        🔒 `creation_lock` para el backend async: el lock de SQLite se toma y se suelta en hilos,
+        así la espera por otro worker no bloquea el event loop.
+        """
+        if not self.store:
+            yield
+            return
+        lock = self.store.write_lock()
+        await asyncio.to_thread(lock.__enter__)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(lock.__exit__, None, None, None)
+
+
+# 🌐 Cache compartido por todo el proceso
+folder_cache = FolderCache(
+    max_entries=settings.FOLDER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.FOLDER_CACHE_TTL_SECONDS,
+    store=SqliteFolderStore(settings.FOLDER_CACHE_SQLITE_PATH) if settings.FOLDER_CACHE_SQLITE_PATH else None,
+)
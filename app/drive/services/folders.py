@@ -1,9 +1,73 @@
 from .client import get_drive_service
+from .folder_cache import folder_cache
+
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+
+
+def escape_query_value(value: str) -> str:
+    """
+    🧼 Escapa un valor para usarlo entre comillas simples en una query de Drive.
+    """
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def _find_subfolder(name: str, parent_id: str, service) -> str | None:
+    # 🔍 Consulta para buscar una carpeta con ese nombre dentro del padre
+    query = (
+        f"name='{escape_query_value(name)}' and '{parent_id}' in parents and "
+        f"mimeType='{FOLDER_MIMETYPE}' and trashed=false"
+    )
+
+    result = service.files().list(q=query, fields="files(id)").execute()
+    folders = result.get("files", [])
+    return folders[0]["id"] if folders else None
+
+
+def subfolders_query(names: list[str], parent_id: str) -> str:
+    # 🔍 Varias carpetas del mismo padre en una sola consulta (name='a' or name='b' ...)
+    names_query = " or ".join(f"name='{escape_query_value(name)}'" for name in names)
+    return f"'{parent_id}' in parents and mimeType='{FOLDER_MIMETYPE}' and trashed=false and ({names_query})"
+
+
+def find_subfolders(names: list[str], parent_id: str, service=None) -> dict[str, str]:
+    """
+    🔎 Resuelve varias subcarpetas de un mismo padre con una sola consulta, sin crearlas.
+
+    Los resultados se guardan en el cache de carpetas; las que no existen no aparecen.
+
+    Args:
+        names: Nombres de las subcarpetas a buscar.
+        parent_id: ID de la carpeta contenedora (padre).
+        service: Cliente de Google Drive (opcional para inyección).
+
+    Returns:
+        Diccionario nombre -> ID de carpeta.
+    """
+    service = service or get_drive_service()
+    found, page_token = {}, None
+    while True:
+        params = {"q": subfolders_query(names, parent_id), "fields": "nextPageToken, files(id, name)"}
+        if page_token:
+            params["pageToken"] = page_token
+        result = service.files().list(**params).execute()
+        for folder in result.get("files", []):
+            found.setdefault(folder["name"], folder["id"])
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            break
+
+    for name, folder_id in found.items():
+        folder_cache.set(parent_id, name, folder_id)
+    return found
+
 
 def get_or_create_subfolder(name: str, parent_id: str, service=None) -> str:
     """
     📁 Busca una subcarpeta por nombre dentro de una carpeta padre. Si no existe, la crea.
 
+    El resultado se guarda en el cache de carpetas, y las resoluciones concurrentes de la misma
+    carpeta se coalescen para no crear duplicados.
+
     Args:
         name: Nombre de la subcarpeta a buscar/crear.
         parent_id: ID de la carpeta contenedora (padre).
@@ -12,30 +76,40 @@ def get_or_create_subfolder(name: str, parent_id: str, service=None) -> str:
     Returns:
         El ID de la subcarpeta existente o recién creada.
     """
-    service = service or get_drive_service()
+    # ⚡ Cache hit: no se toca Drive
+    cached = folder_cache.get(parent_id, name)
+    if cached:
+        return cached
 
-    # 🔍 Consulta para buscar una carpeta con ese nombre dentro del padre
-    query = (
-        f"name='{name}' and '{parent_id}' in parents and "
-        "mimeType='application/vnd.google-apps.folder' and trashed=false"
-    )
+    with folder_cache.single_flight(parent_id, name):
+        # Otro hilo pudo resolverla mientras esperábamos
+        cached = folder_cache.get(parent_id, name)
+        if cached:
+            return cached
 
-    result = service.files().list(q=query, fields="files(id)").execute()
-    folders = result.get("files", [])
+        service = service or get_drive_service()
+
+        # ✅ Si ya existe, se usa su ID
+        folder_id = _find_subfolder(name, parent_id, service)
+
+        if not folder_id:
+            with folder_cache.creation_lock():
+                # Revisamos otra vez: otro worker pudo crearla mientras esperábamos el lock
+                folder_id = _find_subfolder(name, parent_id, service)
 
-    # ✅ Si ya existe, devuelve su ID
-    if folders:
-        return folders[0]["id"]
+                if not folder_id:
+                    # 🚀 Si no existe, crea la subcarpeta
+                    metadata = {
+                        "name": name,
+                        "mimeType": FOLDER_MIMETYPE,
+                        "parents": [parent_id]
+                    }
+                    folder = service.files().create(body=metadata, fields="id").execute()
+                    folder_id = folder["id"]
 
-    # 🚀 Si no existe, crea la subcarpeta
-    metadata = {
-        "name": name,
-        "mimeType": "application/vnd.google-apps.folder",
-        "parents": [parent_id]
-    }
+        folder_cache.set(parent_id, name, folder_id)
+        return folder_id
 
-    folder = service.files().create(body=metadata, fields="id").execute()
-    return folder["id"]
 
 def get_subfolder_id(name: str, parent_id: str, service=None) -> str | None:
     """
@@ -49,15 +123,14 @@ def get_subfolder_id(name: str, parent_id: str, service=None) -> str | None:
     Returns:
         El ID de la carpeta si se encuentra, o None si no existe.
     """
-    service = service or get_drive_service()
+    cached = folder_cache.get(parent_id, name)
+    if cached:
+        return cached
 
-    query = (
-        f"name='{name}' and '{parent_id}' in parents and "
-        "mimeType='application/vnd.google-apps.folder' and trashed=false"
-    )
-
-    result = service.files().list(q=query, fields="files(id)").execute()
-    folders = result.get("files", [])
+    service = service or get_drive_service()
+    folder_id = _find_subfolder(name, parent_id, service)
 
-    # Devuelve el ID si hay resultados; de lo contrario, None
-    return folders[0]["id"] if folders else None
+    # Solo se cachean resultados positivos: una carpeta inexistente puede crearse luego
+    if folder_id:
+        folder_cache.set(parent_id, name, folder_id)
+    return folder_id
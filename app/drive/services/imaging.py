@@ -0,0 +1,114 @@
+import functools
+import importlib.util
+import io
+
+# 🖼️ Tipos de imagen que se pueden procesar y el formato de Pillow con el que se re-codifican
+IMAGE_FORMATS = {
+    "image/jpeg": "JPEG",
+    "image/png": "PNG",
+    "image/webp": "WEBP",
+    "image/avif": "AVIF",
+}
+
+# 🔄 Formatos modernos de destino para el transcoding: formato Pillow, MIME y extensión
+TRANSCODE_TARGETS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "avif": ("AVIF", "image/avif", ".avif"),
+}
+
+
+def imaging_available() -> bool:
+    # Pillow es opcional: sin él no se generan derivados (se detecta sin importarlo)
+    return importlib.util.find_spec("PIL") is not None
+
+
+@functools.cache
+def _pillow():
+    """
+    📦 Importa Pillow recién cuando hace falta (en el pool de imágenes o al primer transcoding),
+    así el arranque del servicio no paga esa importación.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        import pillow_avif  # noqa: F401  # Registra AVIF en versiones de Pillow sin soporte nativo
+    except ImportError:
+        pass
+    return Image, ImageOps
+
+
+def can_encode(image_format: str) -> bool:
+    """
+    🔎 Indica si Pillow (con sus plugins) puede escribir el formato dado, p.ej. "AVIF".
+    """
+    if not imaging_available():
+        return False
+    Image, _ = _pillow()
+    Image.init()
+    return image_format in Image.SAVE
+
+
+def transcode_image(data: bytes, target_format: str, quality: int) -> bytes:
+    """
+    🔄 Re-codifica una imagen a un formato moderno (WEBP/AVIF) con la calidad indicada.
+
+    Se ejecuta en un proceso del pool de imágenes. Aplica la orientación EXIF y descarta la
+    metadata (EXIF, XMP, comentarios); solo conserva el perfil de color ICC.
+
+    Args:
+        data: Contenido de la imagen original.
+        target_format: Formato de Pillow de destino ("WEBP" o "AVIF").
+        quality: Calidad del encoder (0-100).
+
+    Returns:
+        Bytes de la imagen re-codificada.
+    """
+    Image, ImageOps = _pillow()
+    with Image.open(io.BytesIO(data)) as original:
+        icc_profile = original.info.get("icc_profile")
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+        out = io.BytesIO()
+        options = {"quality": quality}
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        if target_format == "WEBP":
+            options["method"] = 6   # Compresión más lenta pero más chica: corre en el pool de procesos
+        image.save(out, format=target_format, **options)
+        return out.getvalue()
+
+
+def render_thumbnails(data: bytes, mimetype: str, sizes: list[int]) -> dict[int, bytes]:
+    """
+    🖼️ Genera miniaturas (lado mayor = size) en el mismo formato que el original.
+
+    Se ejecuta en un proceso del pool de imágenes: solo recibe y devuelve bytes.
+    Solo se generan los tamaños menores que la imagen original.
+
+    Args:
+        data: Contenido de la imagen original.
+        mimetype: Tipo MIME del original (clave de `IMAGE_FORMATS`).
+        sizes: Tamaños (px del lado mayor) a generar.
+
+    Returns:
+        Diccionario size -> bytes de la miniatura.
+    """
+    image_format = IMAGE_FORMATS[mimetype]
+    Image, ImageOps = _pillow()
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)   # Respeta la orientación de la cámara
+        if image_format == "JPEG" and original.mode not in ("RGB", "L"):
+            original = original.convert("RGB")
+
+        thumbnails = {}
+        for size in sorted(set(sizes)):
+            if size >= max(original.size):
+                continue
+            thumbnail = original.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            thumbnail.save(out, format=image_format, optimize=True)
+            thumbnails[size] = out.getvalue()
+        return thumbnails
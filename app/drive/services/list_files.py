@@ -1,4 +1,192 @@
+import os
+from typing import Iterator, Optional
+
+from app.drive.config import settings
 from .client import get_drive_service
+from .folders import escape_query_value
+
+FILE_FIELDS = "id,name,mimeType,createdTime,modifiedTime"
+
+# 🖼️ Las miniaturas viven junto al original pero no se listan
+NOT_DERIVATIVE = "not appProperties has { key='derivative' and value='true' }"
+
+
+def folder_query(folder_id: str) -> str:
+    # 🔍 Consulta para buscar archivos activos dentro de la carpeta dada
+    return f"'{folder_id}' in parents and trashed=false and {NOT_DERIVATIVE}"
+
+
+def listing_entry(file: dict) -> dict:
+    # 📄 Forma de cada archivo en los listados (`FILE_FIELDS`), aunque venga del índice o de una consulta con más campos
+    return {key: file[key] for key in FILE_FIELDS.split(",") if file.get(key) is not None}
+
+
+def list_params(folder_id: str, page_token: Optional[str] = None, page_size: Optional[int] = None,
+                fields: Optional[str] = None, order_by: Optional[str] = None) -> dict:
+    """
+    🧾 Parámetros de `files.list` para una página del listado de una carpeta.
+    Compartidos por ambos backends para que paginen y ordenen igual.
+    """
+    params = {
+        "q": folder_query(folder_id),
+        "spaces": "drive",
+        "pageSize": min(page_size or settings.LIST_PAGE_SIZE, settings.LIST_MAX_PAGE_SIZE),
+        "fields": f"nextPageToken, files({fields or FILE_FIELDS})",
+        "orderBy": order_by or settings.LIST_ORDER_BY,
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    return params
+
+
+def list_files_page(
+    folder_id: str,
+    page_token: Optional[str] = None,
+    page_size: Optional[int] = None,
+    fields: Optional[str] = None,
+    order_by: Optional[str] = None,
+    service=None
+) -> tuple[list[dict], Optional[str]]:
+    """
+    📄 Devuelve una página del listado de una carpeta y el cursor de la siguiente.
+
+    Args:
+        folder_id: ID de la carpeta en Google Drive.
+        page_token: Cursor devuelto por la página anterior (None para la primera).
+        page_size: Cantidad máxima de archivos de la página (por defecto `LIST_PAGE_SIZE`).
+        fields: Proyección de campos de cada archivo (por defecto `FILE_FIELDS`).
+        order_by: Orden de Drive, p.ej. "name" o "modifiedTime desc".
+        service: Cliente de Drive, opcional para testeo/mock.
+
+    Returns:
+        Tupla (archivos, next_page_token); el token es None en la última página.
+    """
+    service = service or get_drive_service()
+    results = service.files().list(**list_params(folder_id, page_token, page_size, fields, order_by)).execute()
+    return results.get("files", []), results.get("nextPageToken")
+
+
+def iter_file_pages(
+    folder_id: str,
+    page_token: Optional[str] = None,
+    page_size: Optional[int] = None,
+    fields: Optional[str] = None,
+    order_by: Optional[str] = None,
+    service=None
+) -> Iterator[list[dict]]:
+    """
+    🔁 Recorre todas las páginas del listado siguiendo `nextPageToken`, una página por vez.
+    """
+    while True:
+        files, page_token = list_files_page(folder_id, page_token, page_size, fields, order_by, service=service)
+        yield files
+        if not page_token:
+            return
+
+
+def children_query(parent_ids: list[str], include_derivatives: bool = False) -> str:
+    # 🔍 Una sola consulta para los hijos de varias carpetas ('a' in parents or 'b' in parents ...)
+    parents = " or ".join(f"'{parent_id}' in parents" for parent_id in parent_ids)
+    query = f"({parents}) and trashed=false"
+    return query if include_derivatives else f"{query} and {NOT_DERIVATIVE}"
+
+
+def children_params(parent_ids: list[str], page_token: Optional[str] = None, include_derivatives: bool = False) -> dict:
+    """
+    🧾 Parámetros de `files.list` para listar juntos los hijos de varias carpetas.
+    Se pide `parents` para poder repartir cada archivo en su carpeta.
+    """
+    params = {
+        "q": children_query(parent_ids, include_derivatives),
+        "spaces": "drive",
+        "pageSize": settings.LIST_MAX_PAGE_SIZE,
+        "fields": f"nextPageToken, files({FILE_FIELDS},parents,size,md5Checksum,appProperties)",
+        "orderBy": settings.LIST_ORDER_BY,
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    return params
+
+
+def list_children(parent_ids: list[str], include_derivatives: bool = False, service=None) -> list[dict]:
+    """
+    🌳 Lista (todas las páginas) los archivos y carpetas hijos de varias carpetas a la vez.
+
+    Args:
+        parent_ids: IDs de las carpetas padre, agrupados en una sola consulta.
+        include_derivatives: Si es True incluye también las miniaturas (para el índice local).
+        service: Cliente de Drive, opcional para testeo/mock.
+
+    Returns:
+        Lista de archivos con `parents` y `mimeType` para clasificarlos.
+    """
+    service = service or get_drive_service()
+    files, page_token = [], None
+    while True:
+        results = service.files().list(**children_params(parent_ids, page_token, include_derivatives)).execute()
+        files.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return files
+
+
+def stems_query(folder_id: str, stems: list[str]) -> str:
+    # 🔍 Varios archivos por nombre sin extensión en una sola consulta, con una comparación exacta por
+    # extensión permitida (`name contains` compara por prefijo: '1' traería todos los '1*')
+    names = " or ".join(
+        f"name = '{escape_query_value(stem + ext)}'" for stem in stems for ext in settings.ALLOWED_EXTENSIONS
+    )
+    return f"'{folder_id}' in parents and trashed=false and {NOT_DERIVATIVE} and ({names})"
+
+
+def stems_params(folder_id: str, stems: list[str], page_token: Optional[str] = None) -> dict:
+    """
+    🧾 Parámetros de `files.list` para buscar archivos por nombre sin extensión (p.ej. `{user_id}{ext}`).
+    Los más recientes primero, así ante duplicados gana la última subida.
+    """
+    params = {
+        "q": stems_query(folder_id, stems),
+        "spaces": "drive",
+        "pageSize": settings.LIST_MAX_PAGE_SIZE,
+        "fields": f"nextPageToken, files({FILE_FIELDS},parents,size,md5Checksum,appProperties)",
+        "orderBy": "modifiedTime desc",
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    return params
+
+
+def match_stems(files: list[dict], stems: list[str]) -> dict[str, dict]:
+    wanted, found = set(stems), {}
+    for file in files:
+        stem = os.path.splitext(file["name"])[0]
+        if stem in wanted:
+            found.setdefault(stem, file)
+    return found
+
+
+def find_files_by_stem(folder_id: str, stems: list[str], service=None) -> dict[str, dict]:
+    """
+    🔎 Resuelve varios archivos de una carpeta por su nombre sin extensión con una sola consulta.
+
+    Args:
+        folder_id: ID de la carpeta donde buscar.
+        stems: Nombres sin extensión (p.ej. IDs de usuario).
+        service: Cliente de Drive, opcional para testeo/mock.
+
+    Returns:
+        Diccionario nombre sin extensión -> archivo (con `size`, `md5Checksum` y `appProperties`);
+        los que no existen no aparecen.
+    """
+    service = service or get_drive_service()
+    files, page_token = [], None
+    while True:
+        results = service.files().list(**stems_params(folder_id, stems, page_token)).execute()
+        files.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return match_stems(files, stems)
+
 
 def list_files_in_folder(folder_id: str, service=None) -> list[dict]:
     """
@@ -9,19 +197,7 @@ def list_files_in_folder(folder_id: str, service=None) -> list[dict]:
         service: Cliente de Drive, opcional para testeo/mock.
 
     Returns:
-        Lista de diccionarios con metadata básica de cada archivo.
+        Lista de diccionarios con metadata básica de cada archivo (todas las páginas).
         Cada elemento contiene: id, name, mimeType, createdTime, modifiedTime
     """
-    service = service or get_drive_service()  # Si no se inyecta un cliente, lo obtenemos aquí
-
-    # 🔍 Consulta para buscar archivos activos dentro de la carpeta dada
-    query = f"'{folder_id}' in parents and trashed=false"
-
-    # 📦 Ejecuta la consulta y devuelve los campos deseados
-    results = service.files().list(
-        q=query,
-        spaces='drive',
-        fields='files(id,name,mimeType,createdTime,modifiedTime)'
-    ).execute()
-
-    return results.get("files", [])  # Si no hay resultados, devuelve lista vacía
+    return [file for page in iter_file_pages(folder_id, service=service) for file in page]
@@ -0,0 +1,101 @@
+import asyncio
+
+from app.drive.config import settings
+from .folder_cache import folder_cache
+from .folders import FOLDER_MIMETYPE
+from .list_files import listing_entry
+
+
+def _batches(items: list[str], size: int) -> list[list[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def _children_by_parent(drive, parent_ids: list[str]) -> dict[str, list[dict]]:
+    """
+    🌳 Hijos de muchas carpetas con pocas consultas: agrupa los IDs de a
+    `MANIFEST_PARENTS_PER_QUERY` y ejecuta los grupos en paralelo.
+    """
+    children = {parent_id: [] for parent_id in parent_ids}
+    if not parent_ids:
+        return children
+
+    batches = _batches(parent_ids, settings.MANIFEST_PARENTS_PER_QUERY)
+    results = await asyncio.gather(*(drive.list_children(batch) for batch in batches))
+    for files in results:
+        for file in files:
+            for parent_id in file.get("parents", []):
+                if parent_id in children:
+                    children[parent_id].append(file)
+    return children
+
+
+async def _resolve_product_folders(drive, product_ids: list[str]) -> dict[str, str]:
+    # 📁 Carpetas de producto, también agrupadas (name='a' or name='b' ...), sin crearlas
+    root = settings.PRODUCTS_IMAGE_FOLDER_ID
+    found, missing = {}, []
+    for product_id in dict.fromkeys(product_ids):
+        cached = folder_cache.get(root, product_id)
+        if cached:
+            found[product_id] = cached
+        else:
+            missing.append(product_id)
+
+    batches = _batches(missing, settings.MANIFEST_PARENTS_PER_QUERY)
+    for result in await asyncio.gather(*(drive.find_subfolders(batch, root) for batch in batches)):
+        found.update(result)
+    return found
+
+
+async def warm_product_folders(drive, product_ids: list[str]) -> int:
+    """
+    🔥 Resuelve de antemano (sin crearlas) las carpetas de producto y de sus subproductos y las
+    deja en el cache de carpetas, con las mismas consultas agrupadas que los manifiestos.
+
+    Returns:
+        Cantidad de carpetas resueltas.
+    """
+    product_folders = await _resolve_product_folders(drive, product_ids)
+    product_children = await _children_by_parent(drive, list(product_folders.values()))
+    resolved = len(product_folders)
+    for folder_id, files in product_children.items():
+        for file in files:
+            if file.get("mimeType") == FOLDER_MIMETYPE:
+                folder_cache.set(folder_id, file["name"], file["id"])
+                resolved += 1
+    return resolved
+
+
+async def build_manifests(drive, product_ids: list[str]) -> dict[str, dict]:
+    """
+    🗂️ Construye el manifiesto (imágenes del producto y de cada subproducto) de varios productos.
+
+    En lugar de resolver y listar carpeta por carpeta, hace tres rondas de consultas agrupadas:
+    carpetas de producto, hijos de esas carpetas (imágenes + carpetas de subproducto) e hijos
+    de todos los subproductos. No crea carpetas: un producto sin carpeta tiene manifiesto vacío.
+
+    Args:
+        drive: Backend de Drive (`get_backend()`).
+        product_ids: IDs de producto a incluir.
+
+    Returns:
+        Diccionario product_id -> {"images": [...], "subproducts": {subproduct_id: {"images": [...]}}}
+    """
+    product_folders = await _resolve_product_folders(drive, product_ids)
+    product_children = await _children_by_parent(drive, list(product_folders.values()))
+
+    manifests = {product_id: {"images": [], "subproducts": {}} for product_id in product_ids}
+    subproduct_folders = {}   # folder_id -> (product_id, subproduct_id)
+    for product_id, folder_id in product_folders.items():
+        for file in product_children[folder_id]:
+            if file.get("mimeType") == FOLDER_MIMETYPE:
+                subproduct_folders.setdefault(file["id"], (product_id, file["name"]))
+                folder_cache.set(folder_id, file["name"], file["id"])   # Calienta el cache para las rutas de subproducto
+            else:
+                manifests[product_id]["images"].append(listing_entry(file))
+
+    subproduct_children = await _children_by_parent(drive, list(subproduct_folders))
+    for folder_id, (product_id, subproduct_id) in subproduct_folders.items():
+        images = [listing_entry(file) for file in subproduct_children[folder_id] if file.get("mimeType") != FOLDER_MIMETYPE]
+        manifests[product_id]["subproducts"][subproduct_id] = {"images": images}
+
+    return manifests
@@ -0,0 +1,384 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .client import drive_pool
+from .folders import FOLDER_MIMETYPE
+from .list_files import list_children
+
+logger = logging.getLogger(__name__)
+
+INDEX_FIELDS = "id, name, parents, mimeType, size, md5Checksum, createdTime, modifiedTime, appProperties, trashed"
+CHANGES_FIELDS = f"nextPageToken, newStartPageToken, changes(fileId, removed, file({INDEX_FIELDS}))"
+PAGE_TOKEN_PREFIX = "idx:"
+
+
+def index_roots() -> list[str]:
+    # 🌳 Carpetas raíz que se reflejan en el índice
+    roots = [settings.PROFILE_IMAGE_FOLDER_ID, settings.PRODUCTS_IMAGE_FOLDER_ID, settings.SUBPRODUCTS_IMAGE_FOLDER_ID]
+    return [root for root in dict.fromkeys(roots) if root]
+
+
+class MetadataIndex:
+    """
+    🗄️ Índice local (SQLite) de la metadata de los archivos bajo las carpetas raíz.
+
+    Se reconstruye completo con `rebuild()` y se mantiene al día con `sync_changes()`,
+    que consume el feed `changes.list` desde el `startPageToken` persistido.
+    El feed y su token son de una service account: el índice siempre usa la cuenta principal
+    del pool y guarda cuál es, así un cambio de cuenta fuerza una reconstrucción.
+    Las lecturas solo se usan mientras el índice está fresco (ver `is_fresh()`).
+    """
+
+    def __init__(self, path: str, max_lag_seconds: int):
+        self.path = path
+        self.max_lag_seconds = max_lag_seconds
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " id TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " parents TEXT NOT NULL,"
+            " mime_type TEXT,"
+            " size INTEGER,"
+            " md5 TEXT,"
+            " created_time TEXT,"
+            " modified_time TEXT);"
+            "CREATE TABLE IF NOT EXISTS file_parents ("
+            " parent_id TEXT NOT NULL,"
+            " file_id TEXT NOT NULL,"
+            " PRIMARY KEY (parent_id, file_id));"
+            "CREATE INDEX IF NOT EXISTS file_parents_by_file ON file_parents (file_id);"
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        # Índices creados antes de las miniaturas no tienen la columna de appProperties
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+        if "app_properties" not in columns:
+            conn.execute("ALTER TABLE files ADD COLUMN app_properties TEXT NOT NULL DEFAULT '{}'")
+
+    def _conn(self) -> sqlite3.Connection:
+        # Una conexión por hilo: sqlite3 no permite compartirlas entre hilos
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    # 🧭 Estado de sincronización
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn: sqlite3.Connection, key: str, value: str):
+        conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def lag_seconds(self) -> Optional[float]:
+        """
+        ⏱️ Segundos desde la última sincronización completa (None si nunca se construyó).
+        """
+        synced_at = self._get_state("synced_at")
+        return time.time() - float(synced_at) if synced_at else None
+
+    def is_fresh(self) -> bool:
+        lag = self.lag_seconds()
+        return lag is not None and lag <= self.max_lag_seconds
+
+    # 🔎 Lecturas
+
+    @staticmethod
+    def _to_metadata(row) -> dict:
+        file = {
+            "id": row[0],
+            "name": row[1],
+            "parents": json.loads(row[2]),
+            "mimeType": row[3],
+            "createdTime": row[6],
+            "modifiedTime": row[7],
+            "appProperties": json.loads(row[8]) or None,
+        }
+        if row[4] is not None:
+            file["size"] = str(row[4])   # Drive devuelve `size` como string
+        if row[5] is not None:
+            file["md5Checksum"] = row[5]
+        return {key: value for key, value in file.items() if value is not None}
+
+    def get(self, file_id: str) -> Optional[dict]:
+        """
+        📑 Metadata de un archivo, con los mismos campos que `get_file_metadata`.
+        Devuelve None si no está o si fue modificado localmente y aún no se sincronizó.
+        """
+        row = self._conn().execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        if not row or row[7] is None:
+            return None
+        return self._to_metadata(row)
+
+    def children(self, parent_id: str, offset: int = 0, limit: int = -1) -> list[dict]:
+        """
+        📄 Hijos de una carpeta ordenados por nombre (como `LIST_ORDER_BY` por defecto), sin miniaturas.
+        """
+        rows = self._conn().execute(
+            "SELECT f.* FROM files f JOIN file_parents p ON p.file_id = f.id"
+            " WHERE p.parent_id = ? AND json_extract(f.app_properties, '$.derivative') IS NOT 'true'"
+            " ORDER BY f.name, f.id LIMIT ? OFFSET ?",
+            (parent_id, limit, offset)
+        ).fetchall()
+        return [self._to_metadata(row) for row in rows]
+
+    def is_tracked_folder(self, folder_id: str) -> bool:
+        """
+        📁 Indica si el índice refleja el contenido de la carpeta (raíz o carpeta indexada).
+        """
+        if folder_id in index_roots():
+            return True
+        return self._conn().execute(
+            "SELECT 1 FROM files WHERE id = ? AND mime_type = ?", (folder_id, FOLDER_MIMETYPE)
+        ).fetchone() is not None
+
+    def find_subfolder(self, name: str, parent_id: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT f.id FROM files f JOIN file_parents p ON p.file_id = f.id"
+            " WHERE p.parent_id = ? AND f.name = ? AND f.mime_type = ? ORDER BY f.id LIMIT 1",
+            (parent_id, name, FOLDER_MIMETYPE)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_by_md5(self, folder_id: str, md5: str, source_name: Optional[str] = None) -> Optional[str]:
+        """
+        ♻️ Archivo de la carpeta con ese contenido: por `md5Checksum` de Drive o por el
+        `content_md5` que guardan las subidas (que llega antes que la metadata completa).
+        Con `source_name`, solo archivos subidos con ese nombre.
+        """
+        row = self._conn().execute(
+            "SELECT f.id FROM files f JOIN file_parents p ON p.file_id = f.id"
+            " WHERE p.parent_id = ? AND (f.md5 = ? OR json_extract(f.app_properties, '$.content_md5') = ?)"
+            " AND (? IS NULL OR json_extract(f.app_properties, '$.source_name') = ?)"
+            " AND json_extract(f.app_properties, '$.derivative') IS NOT 'true' ORDER BY f.id LIMIT 1",
+            (folder_id, md5, md5, source_name, source_name)
+        ).fetchone()
+        return row[0] if row else None
+
+    # ✍️ Escrituras
+
+    def _upsert(self, conn: sqlite3.Connection, file: dict):
+        parents = file.get("parents", [])
+        conn.execute(
+            "INSERT OR REPLACE INTO files (id, name, parents, mime_type, size, md5, created_time, modified_time, app_properties)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                file["id"], file.get("name", ""), json.dumps(parents), file.get("mimeType"),
+                int(file["size"]) if file.get("size") is not None else None,
+                file.get("md5Checksum"), file.get("createdTime"), file.get("modifiedTime"),
+                json.dumps(file.get("appProperties") or {}),
+            )
+        )
+        conn.execute("DELETE FROM file_parents WHERE file_id = ?", (file["id"],))
+        conn.executemany(
+            "INSERT OR IGNORE INTO file_parents (parent_id, file_id) VALUES (?, ?)",
+            [(parent_id, file["id"]) for parent_id in parents]
+        )
+
+    def _remove(self, conn: sqlite3.Connection, file_id: str):
+        # Borra también los descendientes si era una carpeta
+        pending = [file_id]
+        while pending:
+            current = pending.pop()
+            pending.extend(row[0] for row in conn.execute(
+                "SELECT file_id FROM file_parents WHERE parent_id = ?", (current,)
+            ))
+            conn.execute("DELETE FROM files WHERE id = ?", (current,))
+            conn.execute("DELETE FROM file_parents WHERE file_id = ? OR parent_id = ?", (current, current))
+
+    def _prune(self, conn: sqlite3.Connection) -> int:
+        # ✂️ Borra lo que no cuelga de ninguna raíz (movido fuera, o con carpetas no indexadas)
+        roots = index_roots()
+        unreachable = [row[0] for row in conn.execute(
+            "WITH RECURSIVE reachable(id) AS ("
+            f" SELECT file_id FROM file_parents WHERE parent_id IN ({', '.join('?' for _ in roots)})"
+            " UNION SELECT p.file_id FROM file_parents p JOIN reachable r ON p.parent_id = r.id)"
+            " SELECT id FROM files WHERE id NOT IN (SELECT id FROM reachable)",
+            roots
+        )]
+        for file_id in unreachable:
+            self._remove(conn, file_id)
+        conn.execute("DELETE FROM state WHERE key = 'prune_pending'")
+        return len(unreachable)
+
+    def record_local(self, file: dict):
+        """
+        📝 Registra un archivo escrito por esta API (subida, carpeta nueva, reemplazo) antes de
+        que llegue por el feed de cambios, para que los listados lo vean de inmediato.
+        Sin `modifiedTime`, la metadata sigue pidiéndose a Drive hasta la próxima sincronización.
+        """
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM files WHERE id = ?", (file["id"],)).fetchone()
+        if not row and not file.get("parents"):
+            return   # Sin ubicación conocida: lo traerá el feed de cambios
+        merged = self._to_metadata(row) if row else {}
+        merged.update(file)
+        merged.pop("size", None)
+        merged.pop("md5Checksum", None)
+        merged["modifiedTime"] = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._upsert(conn, merged)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove_local(self, file_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove(conn, file_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # 🔄 Sincronización con Drive
+
+    def rebuild(self, service=None) -> int:
+        """
+        🏗️ Reconstrucción completa: toma un `startPageToken` y recorre el árbol desde las raíces.
+
+        El token se pide antes de recorrer, así ningún cambio ocurrido durante el recorrido se pierde
+        (a lo sumo se aplica dos veces, lo que es idempotente).
+
+        Returns:
+            Cantidad de archivos indexados.
+        """
+        account = drive_pool.primary
+        service = service or account.get_service()
+        with self._sync_lock:
+            token = service.changes().getStartPageToken().execute()["startPageToken"]
+
+            files, level = [], index_roots()
+            while level:
+                children = []
+                for i in range(0, len(level), settings.MANIFEST_PARENTS_PER_QUERY):
+                    children.extend(list_children(
+                        level[i:i + settings.MANIFEST_PARENTS_PER_QUERY], include_derivatives=True, service=service
+                    ))
+                files.extend(children)
+                level = [file["id"] for file in children if file.get("mimeType") == FOLDER_MIMETYPE]
+
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM file_parents")
+                for file in files:
+                    self._upsert(conn, file)
+                self._set_state(conn, "page_token", token)
+                self._set_state(conn, "account", account.identity)
+                self._set_state(conn, "synced_at", str(time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        metrics.set_gauge("metadata_index_files", len(files))
+        logger.info("🏗️ Índice de metadata reconstruido: %d archivos", len(files))
+        return len(files)
+
+    def sync_changes(self, service=None) -> int:
+        """
+        🔄 Aplica los cambios pendientes del feed `changes.list` desde el token persistido.
+        Sin token (índice nunca construido) o si el token es de otra service account (cambió
+        `GOOGLE_SERVICE_ACCOUNTS`), hace un `rebuild()` completo.
+
+        Returns:
+            Cantidad de cambios procesados.
+        """
+        account = drive_pool.primary
+        token = self._get_state("page_token")
+        if token and self._get_state("account") != account.identity:
+            logger.warning("🔁 El token del índice es de otra service account: se reconstruye")
+            token = None
+        if not token:
+            self.rebuild(service)
+            return 0
+
+        service = service or account.get_service()
+        processed = 0
+        with self._sync_lock:
+            while True:
+                result = service.changes().list(
+                    pageToken=token,
+                    spaces="drive",
+                    includeRemoved=True,
+                    pageSize=1000,
+                    fields=CHANGES_FIELDS
+                ).execute()
+
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Cada archivo aparece una sola vez, en la posición de su último cambio: una carpeta
+                    # nueva puede llegar después que sus hijos. Primero se aplica todo y al final se
+                    # descarta lo que quedó fuera de las raíces
+                    for change in result.get("changes", []):
+                        file = change.get("file")
+                        if change.get("removed") or not file or file.get("trashed"):
+                            self._remove(conn, change["fileId"])
+                        else:
+                            self._upsert(conn, file)
+                    processed += len(result.get("changes", []))
+                    if result.get("changes"):
+                        self._set_state(conn, "prune_pending", "1")
+
+                    token = result.get("nextPageToken") or result.get("newStartPageToken")
+                    self._set_state(conn, "page_token", token)
+                    if "newStartPageToken" in result:
+                        if self._get_state("prune_pending"):
+                            self._prune(conn)
+                        self._set_state(conn, "synced_at", str(time.time()))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+                if "newStartPageToken" in result:
+                    break
+
+        metrics.incr("metadata_index_changes_total", processed)
+        return processed
+
+
+async def run_index_sync(index: MetadataIndex):
+    """
+    ⏲️ Tarea de fondo: sincroniza el índice cada `METADATA_INDEX_POLL_SECONDS` y publica el lag.
+    Los errores se registran y se reintenta en el siguiente ciclo (el índice queda viejo y las
+    lecturas vuelven a Drive).
+    """
+    while True:
+        try:
+            await asyncio.to_thread(index.sync_changes)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            metrics.incr("metadata_index_sync_errors_total")
+            logger.exception("❌ Error sincronizando el índice de metadata")
+
+        lag = index.lag_seconds()
+        if lag is not None:
+            metrics.set_gauge("metadata_index_lag_seconds", round(lag, 3))
+        await asyncio.sleep(settings.METADATA_INDEX_POLL_SECONDS)
+
+
+# 🌐 Índice compartido por todo el proceso (deshabilitado si no hay METADATA_INDEX_PATH)
+metadata_index = MetadataIndex(
+    settings.METADATA_INDEX_PATH,
+    settings.METADATA_INDEX_MAX_LAG_SECONDS,
+) if settings.METADATA_INDEX_PATH else None
@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+import httplib2
+from fastapi import HTTPException, status
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+
+if TYPE_CHECKING:
+    import httpx   # Solo lo usa el backend async: se importa al enviar el primer request
+
+logger = logging.getLogger(__name__)
+
+# 🏷️ Clasificación de respuestas de Drive
+OK = "ok"
+RATE_LIMITED = "rate_limited"     # 429 o 403 por cuota: reintentar y bajar el ritmo
+TRANSIENT = "transient"           # 5xx o error de red: reintentar
+FATAL = "fatal"                   # Cualquier otro error: no tiene sentido reintentar
+
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# files.update (PATCH) fija valores absolutos y los chunks de una sesión resumable (PUT) declaran
+# su rango: repetirlos no duplica nada. Un POST (files.create) sí puede crear dos veces lo mismo
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"})
+# POST que no crean nada: la apertura de una sesión resumable (el archivo se crea con el último
+# chunk) y los pedidos batch (en este servicio solo agrupan lecturas y borrados)
+IDEMPOTENT_POST_MARKERS = ("uploadType=resumable", "/batch/")
+TRANSIENT_STATUS = {500, 502, 503, 504}
+NETWORK_ERRORS = (OSError, httplib2.HttpLib2Error)
+
+
+def classify(status_code: int, content: bytes | str | None = None) -> str:
+    """
+    🏷️ Clasifica una respuesta de Drive en OK, RATE_LIMITED, TRANSIENT o FATAL.
+    """
+    if status_code < 400:
+        return OK
+    if status_code == 429:
+        return RATE_LIMITED
+    if status_code == 403 and content:
+        text = content.decode("utf-8", "replace") if isinstance(content, bytes) else content
+        if any(reason in text for reason in RATE_LIMIT_REASONS):
+            return RATE_LIMITED
+    if status_code in TRANSIENT_STATUS:
+        return TRANSIENT
+    return FATAL
+
+
+def is_retryable(status_code: int, content: bytes | str | None = None) -> bool:
+    return classify(status_code, content) in (RATE_LIMITED, TRANSIENT)
+
+
+def is_idempotent(method: str, uri: str = "") -> bool:
+    """
+    🔂 Indica si un request puede repetirse sin riesgo tras un error transitorio (5xx o de red),
+    cuando no se sabe si el primer intento llegó a aplicarse en Drive.
+
+    Los errores de cuota (429/403) se reintentan siempre: Drive rechaza el request sin procesarlo.
+    """
+    method = method.upper()
+    return method in IDEMPOTENT_METHODS or (method == "POST" and any(marker in uri for marker in IDEMPOTENT_POST_MARKERS))
+
+
+def _unsafe_to_retry(kind: str):
+    # Error transitorio en un request no idempotente: reintentarlo podría duplicar el efecto
+    metrics.incr("drive_retries_unsafe_total")
+    _exhausted(kind)
+
+
+def backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    """
+    ⏳ Espera antes del reintento `attempt` (0 = primer reintento): backoff exponencial con
+    jitter completo, acotado por `DRIVE_RETRY_MAX_SECONDS`. Si Drive indica `Retry-After`, se respeta.
+    """
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), settings.DRIVE_RETRY_MAX_SECONDS)
+    ceiling = min(settings.DRIVE_RETRY_BASE_SECONDS * (2 ** attempt), settings.DRIVE_RETRY_MAX_SECONDS)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _exhausted(kind: str):
+    metrics.incr("drive_retries_exhausted_total")
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Google Drive no está respondiendo (cuota o error temporal), reintente más tarde"
+        if kind == TRANSIENT else "Cuota de Google Drive agotada momentáneamente, reintente más tarde",
+        headers={"Retry-After": str(settings.DRIVE_RETRY_AFTER_SECONDS)}
+    )
+
+
+class AdaptiveLimiter:
+    """
+    📈 Límite de llamadas simultáneas a Drive ajustado con AIMD.
+
+    Cada respuesta exitosa sube el límite en 1/límite (≈ +1 por ronda completa de llamadas);
+    un error de cuota lo multiplica por `DRIVE_AIMD_DECREASE_FACTOR`, una sola vez por ventana
+    de `DRIVE_AIMD_COOLDOWN_SECONDS` (los 429 de una misma ráfaga cuentan como uno). Así el
+    límite oscila alrededor del máximo ritmo que la cuota de Drive sostiene.
+
+    Hay uno por service account (la cuota de Drive es por usuario) y se comparte entre los
+    hilos de los bulkheads y el event loop (backend httpx).
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_factor: float, cooldown: float, prefix: str = "drive"):
+        self.prefix = prefix
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def load(self) -> float:
+        # Fracción ocupada del límite actual (para elegir la cuenta menos cargada)
+        return self._in_flight / self._limit
+
+    def _publish(self):
+        metrics.set_gauge(f"{self.prefix}_concurrency_limit", round(self._limit, 2))
+        metrics.set_gauge(f"{self.prefix}_in_flight", self._in_flight)
+
+    def _try_acquire(self) -> bool:
+        # Llamar con el lock tomado
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            self._publish()
+            return True
+        return False
+
+    def _wake(self):
+        # Llamar con el lock tomado: despierta a los que esperan (hilos y corrutinas)
+        self._cond.notify_all()
+        for loop, future in list(self._async_waiters):
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._publish()
+            self._wake()
+
+    def _reject(self):
+        metrics.incr("drive_limiter_rejected_total")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas llamadas pendientes a Google Drive, reintente más tarde",
+            headers={"Retry-After": str(settings.DRIVE_RETRY_AFTER_SECONDS)}
+        )
+
+    @contextmanager
+    def slot(self):
+        """
+        🎟️ Ocupa un lugar (bloqueante, para los hilos del backend googleapiclient).
+        """
+        with self._cond:
+            if not self._cond.wait_for(self._try_acquire, timeout=settings.DRIVE_AIMD_ACQUIRE_TIMEOUT_SECONDS):
+                self._reject()
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        🎟️ Ocupa un lugar sin bloquear el event loop (backend httpx).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.DRIVE_AIMD_ACQUIRE_TIMEOUT_SECONDS
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    break
+                waiter = (loop, loop.create_future())
+                self._async_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self._reject()
+            finally:
+                with self._cond:
+                    self._async_waiters.discard(waiter)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record(self, kind: str):
+        """
+        📊 Ajusta el límite según el resultado de una llamada.
+        """
+        with self._cond:
+            if kind == OK:
+                previous = int(self._limit)
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+                if int(self._limit) > previous:
+                    self._wake()
+            elif kind == RATE_LIMITED:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self._limit = max(self.minimum, self._limit * self.decrease_factor)
+                    metrics.incr("drive_limiter_decreases_total")
+            self._publish()
+
+
+def new_limiter(prefix: str = "drive") -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        settings.DRIVE_AIMD_INITIAL_LIMIT,
+        settings.DRIVE_AIMD_MIN_LIMIT,
+        settings.DRIVE_AIMD_MAX_LIMIT,
+        settings.DRIVE_AIMD_DECREASE_FACTOR,
+        settings.DRIVE_AIMD_COOLDOWN_SECONDS,
+        prefix,
+    )
+
+
+def record_result(route, kind: str):
+    """
+    📊 Registra el resultado de una llamada: métricas globales y, si la llamada se hizo con
+    una cuenta (`route` con `limiter` y `record`), su límite adaptativo y su estado.
+    """
+    if kind == RATE_LIMITED:
+        metrics.incr("drive_rate_limited_total")
+    if route is not None:
+        route.record(kind)
+
+
+class RetryingHttp:
+    """
+    🔁 Envuelve el transporte httplib2 de googleapiclient: toda llamada a Drive (`.execute()`,
+    chunks de descarga y de upload, pedidos batch) pasa por el límite adaptativo y se reintenta
+    con backoff si la respuesta es de cuota (429/403) o transitoria (5xx, error de red).
+
+    Agotados los intentos responde 503 con `Retry-After` en lugar de un 500. Los requests no
+    idempotentes (`is_idempotent`) solo se reintentan ante errores de cuota.
+
+    Args:
+        http: Transporte autenticado de una service account.
+        route: La cuenta dueña del transporte (`limiter` + `record(kind)`).
+    """
+
+    def __init__(self, http, route):
+        self._http = http
+        self.route = route
+
+    def __getattr__(self, name):
+        # googleapiclient lee atributos del transporte (credentials, timeout, redirect_codes...)
+        return getattr(self._http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        # googleapiclient envía los GET de URL larga como POST con el método real en este header
+        idempotent = is_idempotent((headers or {}).get("x-http-method-override", method), uri)
+        for attempt in range(settings.DRIVE_MAX_ATTEMPTS):
+            retry_after = None
+            try:
+                with self.route.limiter.slot():
+                    metrics.incr("drive_calls_total")
+                    resp, content = self._http.request(uri, method, body, headers, *args, **kwargs)
+                kind = classify(resp.status, content)
+                retry_after = resp.get("retry-after")
+            except NETWORK_ERRORS:
+                if attempt == settings.DRIVE_MAX_ATTEMPTS - 1 or not idempotent:
+                    raise
+                kind = TRANSIENT
+
+            record_result(self.route, kind)
+            if kind in (OK, FATAL):
+                return resp, content
+            if kind == TRANSIENT and not idempotent:
+                _unsafe_to_retry(kind)
+            if attempt == settings.DRIVE_MAX_ATTEMPTS - 1:
+                _exhausted(kind)
+
+            metrics.incr("drive_retries_total")
+            delay = backoff_delay(attempt, retry_after)
+            logger.warning("🔁 Drive %s en %s %s: reintento %d en %.2fs", kind, method, uri, attempt + 1, delay)
+            time.sleep(delay)
+
+
+async def send_with_retry(
+    pick: Callable[[], Any],
+    send: Callable[[Any], Awaitable["httpx.Response"]],
+    idempotent: bool = True
+) -> "httpx.Response":
+    """
+    🔁 Equivalente async de `RetryingHttp` para el backend httpx.
+
+    Args:
+        pick: Elige la cuenta para cada intento (un reintento puede ir a otra cuenta).
+        send: Envía el request con la cuenta elegida (se vuelve a llamar en cada intento, así
+            los headers de autenticación se recalculan). Puede devolver una respuesta en streaming.
+        idempotent: Si es False (p.ej. files.create) solo se reintenta ante errores de cuota.
+
+    Returns:
+        La respuesta final (exitosa o con un error no reintentable).
+    """
+    import httpx
+
+    network_errors = (*NETWORK_ERRORS, httpx.TransportError)
+    for attempt in range(settings.DRIVE_MAX_ATTEMPTS):
+        response, retry_after = None, None
+        route = pick()
+        try:
+            async with route.limiter.async_slot():
+                metrics.incr("drive_calls_total")
+                response = await send(route)
+            # Solo se lee el cuerpo de los errores: una descarga exitosa sigue en streaming
+            content = await response.aread() if response.is_error else b""
+            kind = classify(response.status_code, content)
+            retry_after = response.headers.get("retry-after")
+        except network_errors:
+            if attempt == settings.DRIVE_MAX_ATTEMPTS - 1 or not idempotent:
+                raise
+            kind = TRANSIENT
+
+        record_result(route, kind)
+        if kind in (OK, FATAL):
+            return response
+        if response is not None:
+            await response.aclose()
+        if kind == TRANSIENT and not idempotent:
+            _unsafe_to_retry(kind)
+        if attempt == settings.DRIVE_MAX_ATTEMPTS - 1:
+            _exhausted(kind)
+
+        metrics.incr("drive_retries_total")
+        delay = backoff_delay(attempt, retry_after)
+        logger.warning("🔁 Drive %s: reintento %d en %.2fs", kind, attempt + 1, delay)
+        await asyncio.sleep(delay)
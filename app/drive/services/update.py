@@ -1,11 +1,11 @@
-import io
 import os
 import mimetypes
 from fastapi import UploadFile, HTTPException
-from googleapiclient.http import MediaIoBaseUpload
 
 from app.drive.config import settings
 from .client import get_drive_service                         # 🔌 Cliente autenticado de Google Drive
+from .upload import build_media, run_resumable_upload         # 🚀 Upload resumable por chunks
+from .content_cache import content_cache                      # 💾 Cache de contenido en disco
 from app.drive.utils.validations import validate_file_extension  # ✅ Usando la función movida a utils
 
 
@@ -18,10 +18,11 @@ def prepare_update(file: UploadFile, new_filename: str):
         new_filename: Nombre con el que será renombrado el archivo.
 
     Returns:
-        Tuple con datos binarios, nombre y tipo MIME.
+        Tuple con stream binario, nombre y tipo MIME.
     """
     ext = validate_file_extension(file.filename)  # Validación de extensión desde utils
-    data = file.file.read()                       # Leemos el contenido binario
+    data = file.file                              # Spool del UploadFile: se sube por chunks sin leerlo entero
+    data.seek(0)
     mimetype = file.content_type or mimetypes.guess_type(file.filename)[0]  # Detectamos MIME si no viene
     return data, new_filename, mimetype
 
@@ -39,20 +40,37 @@ def replace_file(file_id: str, file: UploadFile, new_filename: str, service=None
     Returns:
         ID del archivo actualizado (usualmente igual al original).
     """
-    service = service or get_drive_service()
+    service = service or get_drive_service(file_id)
 
     # Preparamos el nuevo archivo
     data, name, mimetype = prepare_update(file, new_filename)
 
     # Construimos el cuerpo de actualización
-    media = MediaIoBaseUpload(io.BytesIO(data), mimetype or "application/octet-stream", resumable=True)
+    media = build_media(data, mimetype)
 
     # Ejecutamos el update vía API
-    updated = service.files().update(
+    request = service.files().update(
         fileId=file_id,
         media_body=media,
         body={"name": name}
-    ).execute()
+    )
+    updated = run_resumable_upload(request, media)
+
+    # 🧹 El contenido cacheado en disco ya no es válido
+    if content_cache:
+        content_cache.invalidate(file_id)
 
     return updated["id"]
 
+
+def set_app_properties(file_id: str, app_properties: dict, service=None):
+    """
+    🏷️ Actualiza las `appProperties` de un archivo (un valor None elimina la clave).
+
+    Args:
+        file_id: ID del archivo en Drive.
+        app_properties: Claves a escribir o borrar.
+        service: Cliente de Drive (opcional, para testeo o mockeo).
+    """
+    service = service or get_drive_service(file_id)
+    service.files().update(fileId=file_id, body={"appProperties": app_properties}, fields="id").execute()
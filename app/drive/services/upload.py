@@ -1,24 +1,93 @@
 import io
 import os
+import time
+import logging
+import resource
 import mimetypes
+from typing import TYPE_CHECKING, BinaryIO
 from fastapi import UploadFile
-from googleapiclient.http import MediaIoBaseUpload
 
 from app.drive.config import settings
 from .client import get_drive_service                     # 🔌 Inicializa cliente Google Drive
 from .folders import get_or_create_subfolder              # 📁 Maneja carpetas anidadas en Drive
 from app.drive.utils.validations import validate_file_extension  # ✅ Validación de extensiones (ahora en utils)
+from app.drive.utils.metrics import metrics               # 📊 Métricas del proceso
+
+if TYPE_CHECKING:
+    from googleapiclient.http import MediaIoBaseUpload   # Se importa al construir el cliente síncrono
+
+logger = logging.getLogger(__name__)
+
+
+def build_media(data: bytes | BinaryIO, mimetype: str | None) -> "MediaIoBaseUpload":
+    """
+    📦 Envuelve el contenido en un upload resumable por chunks de `UPLOAD_CHUNK_SIZE`.
+
+    Si `data` es un stream (p.ej. el spool de `UploadFile`), se lee directamente desde él:
+    en memoria solo vive el chunk que se está enviando.
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    return MediaIoBaseUpload(
+        stream,
+        mimetype or "application/octet-stream",
+        chunksize=settings.UPLOAD_CHUNK_SIZE,
+        resumable=True
+    )
+
+
+def run_resumable_upload(request, media: "MediaIoBaseUpload") -> dict:
+    """
+    🚀 Ejecuta un upload resumable chunk a chunk y reporta throughput y memoria pico.
+
+    Args:
+        request: HttpRequest de `files().create` o `files().update` con `media_body`.
+        media: El MediaIoBaseUpload asociado al request.
+
+    Returns:
+        El cuerpo de la respuesta final de Drive.
+    """
+    started = time.monotonic()
+    response = None
+    while response is None:
+        _, response = request.next_chunk()
+
+    report_upload_stats(response.get("id"), media.size() or 0, time.monotonic() - started, media.chunksize())
+    return response
+
+
+def report_upload_stats(file_id: str | None, size: int, elapsed: float, chunk_size: int):
+    """
+    📊 Registra throughput, tamaño de chunk y memoria pico de un upload terminado.
+    """
+    elapsed = max(elapsed, 1e-6)
+    throughput = size / elapsed
+    # ru_maxrss viene en KiB en Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    metrics.incr("uploads_total")
+    metrics.incr("upload_bytes_total", size)
+    metrics.set_gauge("upload_last_throughput_bytes_per_second", throughput)
+    metrics.max_gauge("upload_peak_chunk_bytes", min(size, chunk_size))
+    metrics.set_gauge("process_peak_rss_bytes", peak_rss)
+    logger.info(
+        "Upload %s: %d bytes en %.2fs (%.0f B/s, chunk %d B, RSS pico %d B)",
+        file_id, size, elapsed, throughput, chunk_size, peak_rss
+    )
+
 
 # 📤 Subir archivo genérico a una carpeta en Google Drive
-def upload_file_to_folder(data: bytes, filename: str, mimetype: str, folder_id: str, service=None) -> str:
+def upload_file_to_folder(data: bytes | BinaryIO, filename: str, mimetype: str, folder_id: str, app_properties: dict | None = None, service=None) -> str:
     """
-    Sube un archivo (bytes) a una carpeta específica en Google Drive.
+    Sube un archivo (bytes o stream) a una carpeta específica en Google Drive.
 
     Args:
-        data: Contenido binario del archivo.
+        data: Contenido binario del archivo, o un stream seekable (p.ej. `UploadFile.file`).
         filename: Nombre que tendrá el archivo en Drive.
         mimetype: Tipo MIME del archivo.
         folder_id: ID de la carpeta en Drive.
+        app_properties: `appProperties` privadas de la app (p.ej. el vínculo de una miniatura).
         service: Cliente de Google Drive, opcional.
 
     Returns:
@@ -26,25 +95,31 @@ def upload_file_to_folder(data: bytes, filename: str, mimetype: str, folder_id:
     """
     service = service or get_drive_service()
     metadata = {"name": filename, "parents": [folder_id]}  # 📄 Metadata básica para el archivo
-    media = MediaIoBaseUpload(io.BytesIO(data), mimetype or "application/octet-stream", resumable=True)
-    file = service.files().create(body=metadata, media_body=media, fields="id").execute()
+    if app_properties:
+        metadata["appProperties"] = app_properties
+    media = build_media(data, mimetype)
+    request = service.files().create(body=metadata, media_body=media, fields="id")
+    file = run_resumable_upload(request, media)
     return file["id"]
 
-# 🧪 Prepara archivo subido para Drive (validación, lectura de bytes, MIME)
+# 🧪 Prepara archivo subido para Drive (validación, stream, MIME)
 def prepare_upload(file: UploadFile):
     """
     Valida y procesa un archivo de FastAPI antes de subirlo a Google Drive.
 
+    No lee el contenido: devuelve el spool del `UploadFile` para subirlo por chunks.
+
     Args:
         file: Objeto UploadFile recibido desde un formulario HTTP.
 
     Returns:
-        Tuple con contenido binario, extensión y MIME type.
+        Tuple con stream binario, extensión y MIME type.
     """
     ext = validate_file_extension(file.filename)  # Verifica que la extensión esté permitida
-    data = file.file.read()
+    stream = file.file
+    stream.seek(0)
     mimetype = file.content_type or mimetypes.guess_type(file.filename)[0]
-    return data, ext, mimetype
+    return stream, ext, mimetype
 
 # 📦 Subida específica para subproductos: crea carpetas anidadas y sube archivo
 def upload_subproduct_image(file: UploadFile, subproduct_id: str, product_id: str, service=None) -> str:
@@ -62,7 +137,7 @@ def upload_subproduct_image(file: UploadFile, subproduct_id: str, product_id: st
     """
     service = service or get_drive_service()
 
-    # Procesamiento de archivo (validación y extracción de datos)
+    # Procesamiento de archivo (validación y stream)
     data, ext, mimetype = prepare_upload(file)
     filename = file.filename  # Se mantiene nombre original
 
@@ -71,4 +146,4 @@ def upload_subproduct_image(file: UploadFile, subproduct_id: str, product_id: st
     subfolder_id = get_or_create_subfolder(subproduct_id, parent_id, service)
 
     # Subir archivo al folder del subproducto
-    return upload_file_to_folder(data, filename, mimetype, subfolder_id, service)
+    return upload_file_to_folder(data, filename, mimetype, subfolder_id, service=service)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+from .client import drive_pool
+from .imaging import TRANSCODE_TARGETS, can_encode, imaging_available
+from .manifest import warm_product_folders
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    🚦 Estado del warm-up de arranque, expuesto por `/ready`.
+
+    El servicio se declara listo cuando el warm-up termina (o vence `WARMUP_TIMEOUT_SECONDS`).
+    Los pasos son de mejor esfuerzo: si uno falla queda registrado y el primer request
+    simplemente paga ese costo, como sin warm-up.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.steps: dict[str, float] = {}     # paso -> duración en ms
+        self.errors: dict[str, str] = {}      # paso -> error
+
+    def snapshot(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "steps_ms": dict(self.steps),
+            "errors": dict(self.errors),
+        }
+
+
+readiness = Readiness()
+
+
+async def _step(name: str, run):
+    started = time.monotonic()
+    try:
+        await run()
+    except Exception as e:
+        readiness.errors[name] = str(e) or type(e).__name__
+        logger.warning("🔥 Warm-up '%s' falló: %s", name, readiness.errors[name])
+    finally:
+        readiness.steps[name] = round((time.monotonic() - started) * 1000, 1)
+
+
+async def _authenticate():
+    # 🔐 Credenciales, discovery embebido y primer token de cada service account
+    await asyncio.gather(*(asyncio.to_thread(account.warm_up) for account in drive_pool.accounts))
+
+
+async def _root_folders(drive):
+    # 📁 Valida las carpetas raíz y, de paso, abre las conexiones (y el cliente del bulkhead)
+    root_ids = [
+        folder_id for folder_id in (
+            settings.PROFILE_IMAGE_FOLDER_ID,
+            settings.PRODUCTS_IMAGE_FOLDER_ID,
+            settings.SUBPRODUCTS_IMAGE_FOLDER_ID,
+        ) if folder_id
+    ]
+    results = await drive.get_files_metadata(root_ids)
+    missing = [folder_id for folder_id, result in results.items() if result["status"] >= 300]
+    if missing:
+        raise RuntimeError(f"Carpetas raíz inaccesibles: {', '.join(missing)}")
+
+
+async def _hot_products(drive):
+    resolved = await warm_product_folders(drive, settings.WARMUP_PRODUCT_IDS)
+    metrics.set_gauge("warmup_folders_resolved", resolved)
+
+
+async def _imaging():
+    # 🖼️ Importa Pillow (y sus plugins) antes del primer transcoding
+    await asyncio.to_thread(can_encode, TRANSCODE_TARGETS[settings.TRANSCODE_FORMAT][0])
+
+
+async def warm_up(drive):
+    """
+    🔥 Prepara el proceso antes de recibir tráfico: autentica las service accounts, valida las
+    carpetas raíz y resuelve las carpetas de `WARMUP_PRODUCT_IDS`.
+
+    Args:
+        drive: Backend de Drive (`get_backend()`).
+    """
+    started = time.monotonic()
+    try:
+        await asyncio.wait_for(_run(drive), settings.WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        readiness.errors["timeout"] = f"Warm-up incompleto tras {settings.WARMUP_TIMEOUT_SECONDS}s"
+        logger.warning("🔥 %s: el servicio se declara listo igual", readiness.errors["timeout"])
+    finally:
+        readiness.ready = True
+        elapsed = time.monotonic() - started
+        metrics.set_gauge("warmup_seconds", round(elapsed, 3))
+        logger.info("🔥 Warm-up terminado en %.2fs", elapsed)
+
+
+async def _run(drive):
+    await _step("authenticate", _authenticate)
+
+    steps = [_step("root_folders", lambda: _root_folders(drive))]
+    if settings.WARMUP_PRODUCT_IDS:
+        steps.append(_step("hot_products", lambda: _hot_products(drive)))
+    if settings.TRANSCODE_FORMAT and imaging_available():
+        steps.append(_step("imaging", _imaging))
+    await asyncio.gather(*steps)
@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from app.drive.config import settings
+
+
+def _modified_at(metadata: dict) -> datetime | None:
+    modified = metadata.get("modifiedTime")
+    if not modified:
+        return None
+    # Drive usa RFC 3339 con milisegundos: 2024-01-31T12:00:00.000Z
+    return datetime.fromisoformat(modified.replace("Z", "+00:00")).replace(microsecond=0)
+
+
+def cache_headers(metadata: dict, cache_control: str | None = None) -> dict:
+    """
+    🏷️ Headers de cache HTTP para un archivo de Drive.
+
+    - `ETag` fuerte a partir de `md5Checksum`.
+    - `Last-Modified` a partir de `modifiedTime`.
+    - `Cache-Control` configurable con `DOWNLOAD_CACHE_CONTROL` (o el indicado por la ruta).
+    """
+    headers = {"Cache-Control": cache_control or settings.DOWNLOAD_CACHE_CONTROL}
+
+    if metadata.get("md5Checksum"):
+        headers["ETag"] = f'"{metadata["md5Checksum"]}"'
+
+    modified_at = _modified_at(metadata)
+    if modified_at:
+        headers["Last-Modified"] = format_datetime(modified_at.astimezone(timezone.utc), usegmt=True)
+
+    return headers
+
+
+def is_not_modified(request: Request, metadata: dict) -> bool:
+    """
+    🔁 Evalúa `If-None-Match` / `If-Modified-Since` contra la metadata actual (RFC 9110 §13.2.2).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        md5 = metadata.get("md5Checksum")
+        if not md5:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or f'"{md5}"' in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    modified_at = _modified_at(metadata)
+    if if_modified_since and modified_at:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified_at <= since
+
+    return False
+
+
+def not_modified_response(metadata: dict, cache_control: str | None = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(metadata, cache_control))
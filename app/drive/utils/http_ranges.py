@@ -0,0 +1,67 @@
+from fastapi import Request
+
+from app.drive.utils.http_cache import cache_headers
+
+MAX_RANGES = 16  # Más rangos que esto se ignoran y se sirve el archivo completo
+
+
+def parse_range_header(header: str | None, size: int) -> list[tuple[int, int]] | None:
+    """
+    📏 Interpreta un header `Range: bytes=...` (RFC 9110 §14.1.2).
+
+    Args:
+        header: Valor del header `Range`.
+        size: Tamaño total del archivo.
+
+    Returns:
+        - None si no hay header o no es válido: se responde el archivo completo (200).
+        - Lista vacía si ningún rango es satisfacible: se responde 416.
+        - Lista de rangos (inicio, fin) inclusivos en caso contrario.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+
+    specs = [spec.strip() for spec in header[len("bytes="):].split(",") if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        start_text, sep, end_text = spec.partition("-")
+        if not sep:
+            return None
+        try:
+            if start_text == "":
+                # Sufijo: los últimos N bytes
+                length = int(end_text)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_text)
+                end = int(end_text) if end_text else size - 1
+                if end_text and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+
+        if start < size:
+            ranges.append((start, end))
+
+    return ranges
+
+
+def range_applies(request: Request, metadata: dict) -> bool:
+    """
+    🔒 Evalúa `If-Range`: el rango solo se respeta si el validador coincide con la versión actual.
+    """
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+
+    validators = cache_headers(metadata)
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Requiere comparación fuerte: un ETag débil nunca coincide
+        return if_range == validators.get("ETag")
+    return if_range == validators.get("Last-Modified")
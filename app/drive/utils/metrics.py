@@ -0,0 +1,32 @@
+import threading
+
+
+class Metrics:
+    """
+    📊 Registro mínimo de métricas en memoria (contadores y gauges), seguro entre hilos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def max_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = max(self._gauges.get(name, value), value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+
+# 🌐 Registro compartido por todo el proceso
+metrics = Metrics()
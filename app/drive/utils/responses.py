@@ -0,0 +1,357 @@
+import asyncio
+import json
+import secrets
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import HTTPException, Request, Response
+from googleapiclient.errors import HttpError
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+
+from app.drive.services.backends import get_backend
+from app.drive.services.content_cache import content_cache
+from app.drive.services.export import iter_export_files, iter_zip
+from app.drive.services.derivatives import ORIGINAL_KEY, negotiate_original, pick_derivative
+from app.drive.utils.http_cache import cache_headers, is_not_modified, not_modified_response
+from app.drive.utils.http_ranges import parse_range_header, range_applies
+
+RangeSource = Callable[[int, int], AsyncIterator[bytes]]
+
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+async def _iter_local_range(path: str, start: int, end: int, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+    # 💾 Lee un rango del archivo cacheado en disco sin bloquear el event loop
+    with open(path, "rb") as f:
+        await asyncio.to_thread(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _releasing(path: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # 🔓 Suelta el enlace del cache al terminar la respuesta (o si el cliente corta)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        content_cache.release(path)
+
+
+class CachedFileResponse(FileResponse):
+    """
+    💾 `FileResponse` sobre el enlace propio de un hit del cache: envío zero-copy (`pathsend`)
+    cuando el servidor lo soporta, y el enlace se suelta al terminar aunque el cliente corte.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            content_cache.release(str(self.path))
+
+
+async def _iter_multipart(source: RangeSource, ranges: list[tuple[int, int]], parts: list[bytes], boundary: str) -> AsyncIterator[bytes]:
+    for (start, end), part_header in zip(ranges, parts):
+        yield part_header
+        async for chunk in source(start, end):
+            yield chunk
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+
+async def _build_range_response(
+    source: RangeSource,
+    ranges: list[tuple[int, int]],
+    size: int,
+    media_type: str,
+    headers: dict
+) -> Response:
+    """
+    ✂️ Respuesta 206 Partial Content para uno o varios rangos.
+    """
+    if not ranges:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        chunks = source(start, end)
+        first = await anext(chunks, b"")
+        return StreamingResponse(
+            _prepend(first, chunks),
+            status_code=206,
+            media_type=media_type,
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)}
+        )
+
+    # 📦 Varios rangos: multipart/byteranges con Content-Length exacto
+    boundary = secrets.token_hex(16)
+    parts = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    length = sum(len(part) + (end - start + 1) + 2 for part, (start, end) in zip(parts, ranges))
+    length += len(f"--{boundary}--\r\n")
+
+    return StreamingResponse(
+        _iter_multipart(source, ranges, parts, boundary),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers={**headers, "Content-Length": str(length)}
+    )
+
+
+async def _select_representation(request: Request, file_id: str, metadata: dict, size: int | None) -> tuple[str, dict]:
+    """
+    🎯 Elige qué archivo servir: el original conservado si el cliente no acepta el formato
+    transcodificado, o la miniatura más cercana a `size`. Si el derivado ya no existe, el pedido.
+    """
+    derivative_id = negotiate_original(metadata, request.headers.get("accept"))
+    if not derivative_id and size:
+        derivative_id = pick_derivative(metadata, size)
+    if derivative_id:
+        try:
+            return derivative_id, await get_backend().get_file_metadata(derivative_id)
+        except FileNotFoundError:
+            pass   # Vínculo viejo: se sirve el archivo pedido
+    return file_id, metadata
+
+
+class PrefetchedDownload:
+    """
+    🏁 Descarga iniciada de forma especulativa, en paralelo con la resolución de carpetas y la
+    metadata. Si al final no se usa (otra representación, 304, rango, archivo ajeno) se cierra.
+    """
+
+    def __init__(self, file_id: str):
+        self.file_id = file_id
+        self.first = b""
+        self._chunks: AsyncIterator[bytes] | None = None
+
+    async def start(self) -> "PrefetchedDownload":
+        self._chunks = get_backend().iter_file_chunks(self.file_id)
+        self.first = await anext(self._chunks, b"")
+        return self
+
+    def take(self) -> AsyncIterator[bytes]:
+        # El stream pasa a la respuesta: desde acá `aclose()` ya no lo toca
+        chunks, self._chunks = self._chunks, None
+        return _prepend(self.first, chunks)
+
+    async def aclose(self):
+        if self._chunks is not None:
+            chunks, self._chunks = self._chunks, None
+            await chunks.aclose()
+
+
+async def prefetch_download(file_id: str) -> PrefetchedDownload | None:
+    """
+    🔮 Inicia la descarga especulativa. Si falla (p.ej. el archivo no existe) devuelve None:
+    el error real lo reporta la metadata o la descarga normal, con su status correspondiente.
+    """
+    prefetched = PrefetchedDownload(file_id)
+    try:
+        return await prefetched.start()
+    except Exception:
+        await prefetched.aclose()
+        return None
+
+
+def should_prefetch(request: Request, size: int | None = None) -> bool:
+    """
+    🔮 Solo conviene empezar la descarga antes de validar si lo más probable es servir el
+    archivo completo desde Drive: sin headers condicionales ni de rango, sin `?size=` y sin
+    cache de disco (un hit haría innecesaria la descarga).
+    """
+    conditional = any(request.headers.get(h) for h in ("range", "if-none-match", "if-modified-since"))
+    return not conditional and not size and content_cache is None
+
+
+async def build_download_response(
+    request: Request,
+    file_id: str,
+    metadata: dict,
+    filename: str | None = None,
+    size: int | None = None,
+    prefetched: PrefetchedDownload | None = None,
+    cache_control: str | None = None
+):
+    """
+    📤 Construye la respuesta de descarga de un archivo de Drive.
+
+    - Si el archivo se guardó transcodificado (WebP/AVIF) y el cliente no lo declara en `Accept`,
+      se sirve el original conservado; con `size`, la miniatura más cercana.
+    - Si el cliente ya tiene la versión actual (`If-None-Match` / `If-Modified-Since`),
+      responde 304 sin tocar el contenido.
+    - Si pide rangos (`Range`, respetando `If-Range`), responde 206 pidiendo a Drive solo esos bytes.
+    - Si el contenido está en el cache de disco (misma versión), se sirve con `FileResponse`
+      (envío zero-copy cuando el servidor lo soporta) sobre un hard link propio de la respuesta:
+      un desalojo posterior no la corta.
+    - Si no, se reenvían los chunks de Drive a medida que llegan (y se guardan en el cache).
+      El primer chunk se pide antes de responder, así los errores (404, 503 por saturación)
+      todavía pueden devolverse como status HTTP.
+
+    Args:
+        request: Request entrante (para los headers condicionales y de rango).
+        file_id: ID del archivo en Drive.
+        metadata: Metadata obtenida con `get_file_metadata` (mimeType, name, size, md5Checksum...).
+        filename: Nombre a exponer en `Content-Disposition` (por defecto, el nombre en Drive).
+        size: Tamaño deseado en px (`?size=`): se sirve la miniatura más cercana que lo cubra.
+        prefetched: Descarga ya iniciada (`PrefetchedDownload`); se usa si corresponde o se cierra.
+        cache_control: `Cache-Control` propio de la ruta (por defecto `DOWNLOAD_CACHE_CONTROL`).
+    """
+    try:
+        return await _build_download_response(request, file_id, metadata, filename, size, prefetched, cache_control)
+    finally:
+        if prefetched:
+            await prefetched.aclose()   # No-op si el stream pasó a la respuesta
+
+
+async def _build_download_response(request, file_id, metadata, filename, size, prefetched, cache_control):
+    negotiated = ORIGINAL_KEY in (metadata.get("appProperties") or {})
+    file_id, metadata = await _select_representation(request, file_id, metadata, size)
+
+    if is_not_modified(request, metadata):
+        response = not_modified_response(metadata, cache_control)
+        if negotiated:
+            response.headers["Vary"] = "Accept"
+        return response
+
+    filename = filename or metadata.get("name")
+    media_type = metadata.get("mimeType", "application/octet-stream")
+    headers = {"Content-Disposition": f'inline; filename="{filename}"', **cache_headers(metadata, cache_control)}
+    if negotiated:
+        headers["Vary"] = "Accept"   # La respuesta depende del formato que acepta el cliente
+    cached = content_cache.acquire(file_id, metadata) if content_cache else None
+    try:
+        return await _build_content_response(request, file_id, metadata, media_type, headers, cached, prefetched)
+    except BaseException:
+        if cached:
+            content_cache.release(cached)
+        raise
+
+
+async def _build_content_response(request, file_id, metadata, media_type, headers, cached, prefetched):
+    size = metadata.get("size")
+    if size is not None:
+        headers["Accept-Ranges"] = "bytes"
+        ranges = parse_range_header(request.headers.get("range"), int(size))
+        if ranges is not None and range_applies(request, metadata):
+            if cached:
+                source = lambda start, end: _iter_local_range(cached, start, end)
+            else:
+                source = lambda start, end: get_backend().iter_file_chunks(file_id, start=start, end=end)
+            response = await _build_range_response(source, ranges, int(size), media_type, headers)
+            if cached:
+                if isinstance(response, StreamingResponse):
+                    response.body_iterator = _releasing(cached, response.body_iterator)
+                else:
+                    content_cache.release(cached)   # 416: no hay cuerpo que leer
+            return response
+
+    if cached:
+        return CachedFileResponse(cached, media_type=media_type, headers=headers)
+
+    if size is not None:
+        headers["Content-Length"] = str(size)
+
+    if prefetched and prefetched.file_id == file_id:
+        body = prefetched.take()
+    else:
+        chunks = get_backend().iter_file_chunks(file_id)
+        first = await anext(chunks, b"")
+        body = _prepend(first, chunks)
+
+    if content_cache and content_cache.accepts(metadata):
+        body = content_cache.fill(file_id, metadata, body)
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+async def _iter_ndjson(first: list[dict], pages: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    # 🧾 Una línea JSON por archivo, enviada en cuanto llega su página
+    for file in first:
+        yield json.dumps(file, ensure_ascii=False).encode() + b"\n"
+    async for page in pages:
+        for file in page:
+            yield json.dumps(file, ensure_ascii=False).encode() + b"\n"
+
+
+async def build_listing_response(folder_id: str, page_token: Optional[str] = None, limit: Optional[int] = None, ndjson: bool = False):
+    """
+    📄 Construye la respuesta de listado de una carpeta.
+
+    - Con `limit` o `page_token`: devuelve una sola página y el cursor `next_page_token`
+      para pedir la siguiente (None en la última).
+    - Sin ellos: recorre todas las páginas de Drive (nunca se trunca en silencio).
+    - Con `ndjson`: transmite un archivo por línea (`application/x-ndjson`) a medida que
+      llegan las páginas, así el cliente puede empezar a renderizar antes del final.
+      `limit` se usa como tamaño de página y `page_token` como punto de partida.
+
+    Raises:
+        HTTPException(400): Si Drive rechaza el `page_token`.
+    """
+    drive = get_backend()
+    try:
+        if ndjson:
+            pages = drive.iter_file_pages(folder_id, page_token, limit)
+            first = await anext(pages, [])   # Los errores de la primera página aún pueden devolverse como status
+            return StreamingResponse(_iter_ndjson(first, pages), media_type="application/x-ndjson")
+
+        if limit is None and page_token is None:
+            return {"images": await drive.list_files_in_folder(folder_id), "next_page_token": None}
+
+        images, next_page_token = await drive.list_files_page(folder_id, page_token, limit)
+        return {"images": images, "next_page_token": next_page_token}
+
+    except HttpError as e:
+        if page_token and e.resp.status == 400:
+            raise HTTPException(status_code=400, detail="page_token inválido o vencido")
+        raise
+
+
+async def build_zip_response(folder_id: str, filename: str, subfolders: bool = True) -> StreamingResponse:
+    """
+    🗜️ Exporta una carpeta como ZIP transmitido mientras se arma (ver `services.export.iter_zip`).
+
+    Antes de responder solo se pide la primera página del listado, así el primer byte llega
+    en un tiempo constante sin importar la cantidad de archivos, y un error de Drive todavía
+    puede devolverse como status HTTP.
+    """
+    drive = get_backend()
+    pages = drive.iter_file_pages(folder_id)
+    try:
+        first = await anext(pages, [])
+    except BaseException:
+        await pages.aclose()
+        raise
+
+    files = iter_export_files(drive, first, pages, subfolders)
+    return StreamingResponse(
+        iter_zip(drive, files),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
+
+
+def build_batch_response(results: list[dict], **extra) -> JSONResponse:
+    """
+    📦 Respuesta de una operación en lote: 200 si todos los elementos salieron bien y
+    207 Multi-Status si alguno falló. Cada resultado trae su propio `status`.
+    """
+    failed = sum(1 for result in results if result["status"] >= 400)
+    return JSONResponse(
+        status_code=207 if failed else 200,
+        content={**extra, "succeeded": len(results) - failed, "failed": failed, "results": results}
+    )
@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import hmac
+import math
+import time
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, status
+
+from app.drive.config import settings
+from app.drive.utils.metrics import metrics
+
+
+def _signing_key() -> bytes:
+    # 🔑 Sin clave propia se deriva una de JWT_SECRET_KEY: una URL firmada nunca sirve como JWT ni al revés
+    if settings.SIGNED_URL_SECRET_KEY:
+        return settings.SIGNED_URL_SECRET_KEY.encode()
+    return hmac.new(settings.JWT_SECRET_KEY.encode(), b"signed-download-urls", hashlib.sha256).digest()
+
+
+def sign(file_id: str, scope: str, expires: int) -> str:
+    """
+    ✍️ HMAC-SHA256 (base64url, sin padding) sobre el archivo, la carpeta que lo contiene y el vencimiento.
+    """
+    message = f"{file_id}\n{scope}\n{expires}".encode()
+    digest = hmac.new(_signing_key(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def expiry_for(ttl_seconds: int) -> int:
+    """
+    ⏳ Vencimiento redondeado hacia arriba a `SIGNED_URL_EXPIRY_BUCKET_SECONDS`: las URLs que se
+    emiten dentro de la misma ventana son idénticas, así el navegador o la CDN las reutilizan.
+    """
+    bucket = max(1, settings.SIGNED_URL_EXPIRY_BUCKET_SECONDS)
+    return math.ceil((time.time() + ttl_seconds) / bucket) * bucket
+
+
+def signed_query(file_id: str, scope: str, expires: int) -> str:
+    return urlencode({"scope": scope, "expires": expires, "sig": sign(file_id, scope, expires)})
+
+
+def signed_url(request: Request, file_id: str, scope: str, expires: int, size: int | None = None) -> str:
+    """
+    🔗 URL absoluta de `/signed/{file_id}`, sobre `SIGNED_URL_BASE_URL` (p.ej. la CDN) o el origen del request.
+    `size` no se firma: solo elige la miniatura a servir.
+    """
+    path = request.app.url_path_for("download_signed_file", file_id=file_id)
+    base = settings.SIGNED_URL_BASE_URL.rstrip("/") if settings.SIGNED_URL_BASE_URL else str(request.base_url).rstrip("/")
+    url = f"{base}{path}?{signed_query(file_id, scope, expires)}"
+    return f"{url}&size={size}" if size else url
+
+
+def verify(file_id: str, scope: str, expires: int, signature: str) -> int:
+    """
+    🔍 Valida una URL firmada en memoria, sin tocar Drive.
+
+    Returns:
+        Segundos que le quedan de vigencia.
+
+    Raises:
+        HTTPException(403): Si la firma no corresponde o la URL venció.
+    """
+    if not hmac.compare_digest(sign(file_id, scope, expires), signature):
+        metrics.incr("signed_url_rejected_total")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Firma inválida")
+
+    remaining = expires - int(time.time())
+    if remaining <= 0:
+        metrics.incr("signed_url_expired_total")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="URL firmada vencida")
+    return remaining
+
+
+def signed_cache_control(remaining: int) -> str:
+    # 🌐 Cacheable por la CDN y el navegador, nunca más allá del vencimiento de la URL
+    return f"public, max-age={min(remaining, settings.SIGNED_URL_CACHE_MAX_AGE_SECONDS)}"
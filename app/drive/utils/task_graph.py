@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class TaskGraph:
+    """
+    🕸️ Ejecutor mínimo de llamadas async con dependencias, para orquestar un request.
+
+    Cada paso declara de qué pasos depende y recibe sus resultados como argumentos; los pasos
+    independientes corren en paralelo, así la latencia del request es la del camino crítico
+    y no la suma de todas las llamadas a Drive.
+
+    Si un paso falla, se cancelan los que siguen en curso, se liberan (`cleanup`) los resultados
+    de los que ya terminaron y se relanza el primer error.
+
+    Ejemplo:
+        graph = TaskGraph()
+        graph.add("product", lambda: drive.get_or_create_subfolder(product_id, root))
+        graph.add("subproduct", lambda product: drive.get_or_create_subfolder(sub_id, product), "product")
+        graph.add("metadata", lambda: drive.get_file_metadata(file_id))
+        results = await graph.run()
+    """
+
+    def __init__(self):
+        self._steps: dict[str, tuple[Callable[..., Awaitable[Any]], tuple[str, ...]]] = {}
+        self._cleanups: dict[str, Callable[[Any], Awaitable[Any]]] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Awaitable[Any]],
+        *depends_on: str,
+        cleanup: Callable[[Any], Awaitable[Any]] | None = None
+    ) -> "TaskGraph":
+        """
+        ➕ Registra un paso. `fn` recibe, en orden, los resultados de `depends_on`.
+
+        Args:
+            cleanup: Libera el resultado del paso (p.ej. cierra un stream) si otro paso falla.
+                No se llama si el paso devolvió None.
+        """
+        missing = [dep for dep in depends_on if dep not in self._steps]
+        if missing:
+            raise ValueError(f"Dependencias no registradas para '{name}': {missing}")
+        self._steps[name] = (fn, depends_on)
+        if cleanup:
+            self._cleanups[name] = cleanup
+        return self
+
+    async def run(self) -> dict[str, Any]:
+        """
+        🚀 Ejecuta todos los pasos respetando las dependencias.
+
+        Returns:
+            Diccionario nombre -> resultado de cada paso.
+        """
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_step(fn, depends_on):
+            args = [await tasks[dep] for dep in depends_on]
+            return await fn(*args)
+
+        # Los pasos se registran en orden topológico (add exige dependencias previas)
+        for name, (fn, depends_on) in self._steps.items():
+            tasks[name] = asyncio.create_task(run_step(fn, depends_on), name=name)
+
+        try:
+            done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    raise task.exception()
+        except BaseException:
+            await self._abort(tasks)
+            raise
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    async def _abort(self, tasks: dict[str, asyncio.Task]):
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        for name, cleanup in self._cleanups.items():
+            task = tasks[name]
+            if task.done() and not task.cancelled() and task.exception() is None and task.result() is not None:
+                await cleanup(task.result())
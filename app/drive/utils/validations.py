@@ -7,3 +7,7 @@ def validate_file_extension(filename: str) -> str:
     if ext not in settings.ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail=f"Extensión de archivo no permitida: {ext}")
     return ext
+
+def validate_batch_size(count: int, maximum: int) -> None:
+    if count > maximum:
+        raise HTTPException(status_code=413, detail=f"Máximo {maximum} elementos por lote (se recibieron {count})")
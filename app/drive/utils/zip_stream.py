@@ -0,0 +1,137 @@
+import struct
+import zlib
+from datetime import datetime
+from typing import Iterator
+
+ZIP64_LIMIT = 0xFFFFFFFF          # Tamaños y offsets de 4 bytes
+ZIP_ENTRIES_LIMIT = 0xFFFF        # Cantidad de entradas del registro final clásico
+
+FLAG_DATA_DESCRIPTOR = 0x08       # CRC y tamaños van después de los datos
+FLAG_UTF8 = 0x800                 # Nombres en UTF-8
+STORED = 0                        # Sin compresión
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+EXTERNAL_ATTRS = 0o100644 << 16   # Archivo regular rw-r--r--
+
+CENTRAL_BATCH = 512               # Entradas del directorio central por bloque enviado
+
+
+def dos_datetime(modified: str | None) -> tuple[int, int]:
+    """
+    🕰️ Fecha y hora en formato MS-DOS a partir del `modifiedTime` de Drive (RFC 3339).
+    Sin fecha válida se usa 1980-01-01, el mínimo representable.
+    """
+    try:
+        moment = datetime.fromisoformat(modified.replace("Z", "+00:00")) if modified else None
+    except ValueError:
+        moment = None
+    if moment is None or moment.year < 1980:
+        return 0, (1 << 5) | 1
+    time = (moment.hour << 11) | (moment.minute << 5) | (moment.second // 2)
+    date = ((moment.year - 1980) << 9) | (moment.month << 5) | moment.day
+    return time, date
+
+
+class ZipStreamWriter:
+    """
+    🗜️ Arma un ZIP por partes, en el orden en que se envía: nunca retrocede para corregir
+    un header, así el archivo puede transmitirse mientras se construye.
+
+    - Las entradas se guardan sin compresión (STORED): las imágenes ya están comprimidas.
+    - Como el CRC y el tamaño no se conocen hasta terminar cada archivo, van en un
+      descriptor de datos al final de la entrada (bit 3), y luego en el directorio central.
+    - Si el archivo supera 4 GiB o las 65535 entradas, el final usa los registros ZIP64.
+
+    En memoria solo quedan los datos del directorio central (nombre, CRC, tamaño y offset
+    de cada entrada), nunca el contenido.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self._entries: list[tuple[bytes, int, int, int, int, int]] = []
+        self._names: set[str] = set()
+        self._current: tuple[bytes, int, int, int] | None = None
+        self._crc = 0
+        self._size = 0
+
+    def unique_name(self, name: str) -> str:
+        """
+        🏷️ Drive admite nombres repetidos en una carpeta; en el ZIP se numeran ("foto (2).jpg").
+        Los segmentos vacíos, "." y ".." se descartan: ninguna entrada puede salir de la carpeta
+        donde se extrae el ZIP.
+        """
+        segments = name.replace("\\", "_").split("/")
+        name = "/".join(segment for segment in segments if segment not in ("", ".", "..")) or "archivo"
+        stem, dot, ext = name.rpartition(".") if "." in name.rsplit("/", 1)[-1] else (name, "", "")
+        candidate, n = name, 1
+        while candidate in self._names:
+            n += 1
+            candidate = f"{stem} ({n}){dot}{ext}"
+        self._names.add(candidate)
+        return candidate
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def start_entry(self, name: str, modified: str | None = None) -> bytes:
+        """
+        📄 Header local de una entrada nueva (CRC y tamaños en cero, van en el descriptor).
+        """
+        encoded = name.encode("utf-8")
+        time, date = dos_datetime(modified)
+        self._current = (encoded, self.offset, time, date)
+        self._crc, self._size = 0, 0
+        header = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50, VERSION_DEFAULT, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, STORED,
+            time, date, 0, 0, 0, len(encoded), 0
+        )
+        return self._emit(header + encoded)
+
+    def write(self, chunk: bytes) -> bytes:
+        if self._size + len(chunk) > ZIP64_LIMIT:
+            raise ValueError("Las entradas de más de 4 GiB no están soportadas")
+        self._crc = zlib.crc32(chunk, self._crc)
+        self._size += len(chunk)
+        return self._emit(chunk)
+
+    def end_entry(self) -> bytes:
+        """
+        🧾 Descriptor de datos con el CRC y el tamaño reales de la entrada en curso.
+        """
+        encoded, offset, time, date = self._current
+        self._entries.append((encoded, self._crc, self._size, offset, time, date))
+        self._current = None
+        return self._emit(struct.pack("<IIII", 0x08074B50, self._crc, self._size, self._size))
+
+    def _central_record(self, encoded: bytes, crc: int, size: int, offset: int, time: int, date: int) -> bytes:
+        extra, version = b"", VERSION_DEFAULT
+        if offset >= ZIP64_LIMIT:
+            extra, version, offset = struct.pack("<HHQ", 0x0001, 8, offset), VERSION_ZIP64, ZIP64_LIMIT
+        header = struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50, (3 << 8) | version, version, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, STORED,
+            time, date, crc, size, size, len(encoded), len(extra), 0, 0, 0, EXTERNAL_ATTRS, offset
+        )
+        return header + encoded + extra
+
+    def finish(self) -> Iterator[bytes]:
+        """
+        🏁 Directorio central y registro final, en bloques de `CENTRAL_BATCH` entradas.
+        """
+        start = self.offset
+        for i in range(0, len(self._entries), CENTRAL_BATCH):
+            yield self._emit(b"".join(self._central_record(*entry) for entry in self._entries[i:i + CENTRAL_BATCH]))
+
+        count, size, end = len(self._entries), self.offset - start, self.offset
+        tail = b""
+        if count >= ZIP_ENTRIES_LIMIT or size >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            tail += struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0, count, count, size, start)
+            tail += struct.pack("<IIQI", 0x07064B50, 0, end, 1)
+        tail += struct.pack(
+            "<IHHHHIIH",
+            0x06054B50, 0, 0, min(count, ZIP_ENTRIES_LIMIT), min(count, ZIP_ENTRIES_LIMIT),
+            min(size, ZIP64_LIMIT), min(start, ZIP64_LIMIT), 0
+        )
+        yield self._emit(tail)
@@ -0,0 +1,72 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_BUDGET_MS = 1500            # Import de app.drive.main (tests/test_cold_start.py lo exige)
+FIRST_RESPONSE_BUDGET_MS = 200     # Desde el arranque del lifespan hasta la primera respuesta
+
+# 🧪 Se ejecuta en un proceso nuevo por ronda: cada medición es un arranque en frío real
+PROBE = r"""
+import asyncio, json, time
+started = time.perf_counter()
+import app.drive.main as main
+imported = time.perf_counter()
+
+import httpx
+
+async def probe():
+    booted = time.perf_counter()
+    # Lifespan explícito (ASGITransport no lo ejecuta): arranca el warm-up en segundo plano
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://probe") as client:
+            await client.get("/")
+            first = time.perf_counter()
+            while (response := await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.005)
+            ready = time.perf_counter()
+    return {
+        "import_ms": (imported - started) * 1000,
+        "first_response_ms": (first - booted) * 1000,
+        "ready_ms": (ready - booted) * 1000,
+        "errors": response.json()["errors"],
+    }
+
+print(json.dumps(asyncio.run(probe())))
+"""
+
+
+def measure_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(rounds: int, import_budget_ms: float, first_response_budget_ms: float) -> bool:
+    samples = [measure_once() for _ in range(rounds)]
+    import_ms = statistics.median(sample["import_ms"] for sample in samples)
+    first_ms = statistics.median(sample["first_response_ms"] for sample in samples)
+    ready_ms = statistics.median(sample["ready_ms"] for sample in samples)
+
+    print(f"⏱️ Arranque en frío (mediana de {rounds} procesos)")
+    print(f"   Import de app.drive.main: {import_ms:7.1f} ms  (presupuesto {import_budget_ms:.0f} ms)")
+    print(f"   Primera respuesta:        {first_ms:7.1f} ms  (presupuesto {first_response_budget_ms:.0f} ms)")
+    print(f"   Listo (/ready 200):       {ready_ms:7.1f} ms")
+    if samples[-1]["errors"]:
+        print(f"   ⚠️ Pasos del warm-up con error: {samples[-1]['errors']}")
+
+    within_budget = import_ms <= import_budget_ms and first_ms <= first_response_budget_ms
+    print("   ✅ Dentro del presupuesto" if within_budget else "   ❌ Fuera del presupuesto")
+    return within_budget
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    import_budget_ms = float(sys.argv[2]) if len(sys.argv) > 2 else IMPORT_BUDGET_MS
+    first_response_budget_ms = float(sys.argv[3]) if len(sys.argv) > 3 else FIRST_RESPONSE_BUDGET_MS
+    sys.exit(0 if run_benchmark(rounds, import_budget_ms, first_response_budget_ms) else 1)
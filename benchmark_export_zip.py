@@ -0,0 +1,56 @@
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from app.drive.services.export import iter_export_files, iter_zip
+
+
+class FakeDrive:
+    """
+    🧪 Backend simulado: una carpeta con `count` imágenes de `size` bytes, con latencia fija
+    por página del listado y por chunk descargado.
+    """
+
+    def __init__(self, count: int, size: int, latency: float, page_size: int = 100, chunk_size: int = 256 * 1024):
+        self.count, self.size, self.latency = count, size, latency
+        self.page_size, self.chunk_size = page_size, chunk_size
+
+    async def iter_file_pages(self, folder_id: str):
+        for start in range(0, self.count, self.page_size):
+            await asyncio.sleep(self.latency)
+            yield [{"id": str(i), "name": f"img{i}.jpg", "mimeType": "image/jpeg"} for i in range(start, min(start + self.page_size, self.count))]
+
+    async def iter_file_chunks(self, file_id: str):
+        for start in range(0, self.size, self.chunk_size):
+            await asyncio.sleep(self.latency)
+            yield bytes(min(self.chunk_size, self.size - start))
+
+
+async def export(drive: FakeDrive) -> tuple[float, float, int]:
+    started = time.perf_counter()
+    pages = drive.iter_file_pages("folder")
+    first = await anext(pages, [])
+    first_byte, total = None, 0
+    async for piece in iter_zip(drive, iter_export_files(drive, first, pages)):
+        first_byte = first_byte or time.perf_counter()
+        total += len(piece)
+    return (first_byte - started) * 1000, time.perf_counter() - started, total
+
+
+def run_benchmark(counts: list[int], size: int, latency: float):
+    print(f"🗜️ Exportación ZIP en streaming ({size // 1024} KiB por imagen, {latency * 1000:.0f} ms por llamada)")
+    for count in counts:
+        tracemalloc.start()
+        ttfb_ms, seconds, total = asyncio.run(export(FakeDrive(count, size, latency)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"   {count:6d} imágenes: primer byte {ttfb_ms:6.1f} ms | pico de memoria {peak / 2**20:6.1f} MiB | "
+              f"{total / 2**20:8.1f} MiB en {seconds:6.2f} s ({total / 2**20 / seconds:6.1f} MiB/s)")
+
+
+if __name__ == "__main__":
+    counts = [int(n) for n in sys.argv[1].split(",")] if len(sys.argv) > 1 else [100, 1000, 5000]
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 512 * 1024
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.005
+    run_benchmark(counts, size, latency)
@@ -0,0 +1,64 @@
+import asyncio
+import sys
+import time
+
+from app.drive.utils.task_graph import TaskGraph
+
+
+class FakeDrive:
+    """
+    🧪 Backend simulado: cada llamada tarda una latencia fija, como un round-trip a Drive.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def get_or_create_subfolder(self, name: str, parent_id: str) -> str:
+        await asyncio.sleep(self.latency)
+        return f"{parent_id}/{name}"
+
+    async def get_file_metadata(self, file_id: str) -> dict:
+        await asyncio.sleep(self.latency)
+        return {"id": file_id, "parents": ["root/product/subproduct"]}
+
+    async def first_chunk(self, file_id: str) -> bytes:
+        await asyncio.sleep(self.latency)
+        return b"x"
+
+
+async def sequential(drive: FakeDrive):
+    product = await drive.get_or_create_subfolder("product", "root")
+    await drive.get_or_create_subfolder("subproduct", product)
+    await drive.get_file_metadata("file")
+    await drive.first_chunk("file")
+
+
+async def planned(drive: FakeDrive):
+    graph = TaskGraph()
+    graph.add("product_folder", lambda: drive.get_or_create_subfolder("product", "root"))
+    graph.add("subproduct_folder", lambda product: drive.get_or_create_subfolder("subproduct", product), "product_folder")
+    graph.add("metadata", lambda: drive.get_file_metadata("file"))
+    graph.add("prefetched", lambda: drive.first_chunk("file"))
+    await graph.run()
+
+
+async def measure(fn, drive: FakeDrive, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await fn(drive)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def run_benchmark(latency_ms: float, rounds: int):
+    drive = FakeDrive(latency_ms / 1000)
+    before = await measure(sequential, drive, rounds)
+    after = await measure(planned, drive, rounds)
+    print(f"⏱️ Descarga de subproducto con {latency_ms:.0f} ms por llamada a Drive ({rounds} rondas)")
+    print(f"   Secuencial:    {before:7.1f} ms")
+    print(f"   Con TaskGraph: {after:7.1f} ms  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 80
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(run_benchmark(latency_ms, rounds))
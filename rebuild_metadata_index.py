@@ -0,0 +1,19 @@
+import sys
+
+from app.drive.services.metadata_index import metadata_index
+
+
+def rebuild_index():
+    if not metadata_index:
+        print("❗ Definí METADATA_INDEX_PATH para usar el índice de metadata")
+        sys.exit(1)
+
+    try:
+        total = metadata_index.rebuild()
+        print(f"✅ Índice reconstruido: {total} archivos en {metadata_index.path}")
+    except Exception as e:
+        print("💣 EXCEPCIÓN:", str(e))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    rebuild_index()
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+# ⚙️ Configuración mínima para importar la app sin un .env (las credenciales se leen recién en el warm-up)
+os.environ.setdefault("GOOGLE_SERVICE_ACCOUNT_JSON", "/nonexistent/service-account.json")
+os.environ.setdefault("PROFILE_IMAGE_FOLDER_ID", "profile-folder")
+os.environ.setdefault("PRODUCTS_IMAGE_FOLDER_ID", "products-folder")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("ALLOWED_ORIGINS", '["*"]')
+sys.path.insert(0, os.path.dirname(__file__))   # Helpers de los tests (`fake_drive`)
+
+from fake_drive import FakeDrive, serve  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action="store_true", help="Incluye los tests marcados como slow (tiempos de reloj)")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: mide tiempos reales; solo corre con --run-slow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip = pytest.mark.skip(reason="usar --run-slow para correrlo")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def fake_drive():
+    with serve(FakeDrive()) as drive:
+        yield drive
+
+
+@pytest.fixture(params=["googleapiclient", "httpx"])
+def backend(request, fake_drive, monkeypatch):
+    """
+    🔀 El mismo escenario contra ambos backends, apuntando al Drive falso con un token ficticio.
+    """
+    from google.oauth2.credentials import Credentials
+
+    from app.drive.config import settings
+    from app.drive.services import client
+    from app.drive.services.folder_cache import folder_cache
+
+    monkeypatch.setattr(settings, "DRIVE_API_BASE_URL", fake_drive.url)
+    monkeypatch.setattr(settings, "DRIVE_BACKEND", request.param)
+    monkeypatch.setattr(settings, "DRIVE_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "DRIVE_RETRY_MAX_SECONDS", 0.001)
+
+    account = client.drive_pool.accounts[0]
+    monkeypatch.setattr(account, "_credentials", Credentials("test-token", expiry=datetime.utcnow() + timedelta(hours=1)))
+    monkeypatch.setattr(account, "_discovery_doc", None)
+    monkeypatch.setattr(account, "_local", threading.local())
+    monkeypatch.setattr(account, "ejected_until", 0.0)
+    folder_cache.clear()
+
+    if request.param == "httpx":
+        from app.drive.services.async_drive import AsyncDriveBackend
+        yield AsyncDriveBackend()
+    else:
+        from app.drive.services.backends import ThreadedDriveBackend
+        yield ThreadedDriveBackend()
+    folder_cache.clear()
+
+
+def run(backend, scenario):
+    """
+    ▶️ Ejecuta un escenario async y cierra el backend en el mismo event loop.
+    """
+    async def main():
+        try:
+            return await scenario(backend)
+        finally:
+            await backend.aclose()
+    return asyncio.run(main())
@@ -0,0 +1,335 @@
+import hashlib
+import itertools
+import json
+import re
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from urllib.parse import parse_qsl
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+
+# 🔍 Subconjunto de la sintaxis de consultas de Drive que usa el servicio
+_STRING = r"'((?:[^'\\]|\\.)*)'"
+_TOKEN = re.compile(
+    r"\s*(?:"
+    r"(?P<lp>\()|(?P<rp>\))"
+    rf"|(?P<has>appProperties\s+has\s+\{{\s*key={_STRING}\s+and\s+value={_STRING}\s*\}})"
+    rf"|(?P<parent>{_STRING}\s+in\s+parents)"
+    rf"|(?P<field>name|mimeType|trashed|md5Checksum)\s*(?P<op>!=|=|contains)\s*(?P<value>{_STRING}|true|false)"
+    r"|(?P<kw>and|or|not)\b"
+    r")"
+)
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _tokenize(query: str) -> list[tuple[str, object]]:
+    tokens, position = [], 0
+    while position < len(query.rstrip()):
+        match = _TOKEN.match(query, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Consulta no soportada: {query[position:]!r}")
+        position = match.end()
+        groups = match.groups()
+        if match["lp"] or match["rp"]:
+            tokens.append((match["lp"] or match["rp"], None))
+        elif match["has"]:
+            tokens.append(("has", (_unescape(groups[3]), _unescape(groups[4]))))
+        elif match["parent"]:
+            tokens.append(("parent", _unescape(groups[6])))
+        elif match["field"]:
+            value = match["value"]
+            value = _unescape(value[1:-1]) if value.startswith("'") else value == "true"
+            tokens.append(("field", (match["field"], match["op"], value)))
+        else:
+            tokens.append((match["kw"], None))
+    return tokens
+
+
+def compile_query(query: str):
+    """
+    🧮 Convierte una consulta `q` de Drive en un predicado sobre la metadata de un archivo.
+    """
+    tokens = _tokenize(query)
+    position = 0
+
+    def peek():
+        return tokens[position][0] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def atom():
+        kind, value = take()
+        if kind == "(":
+            predicate = expression()
+            take()
+            return predicate
+        if kind == "not":
+            inner = atom()
+            return lambda file: not inner(file)
+        if kind == "parent":
+            return lambda file: value in file.get("parents", [])
+        if kind == "has":
+            key, expected = value
+            return lambda file: (file.get("appProperties") or {}).get(key) == expected
+        field, op, expected = value
+        if op == "contains":
+            return lambda file: expected in file.get(field, "")
+        if op == "!=":
+            return lambda file: file.get(field, False if field == "trashed" else None) != expected
+        return lambda file: file.get(field, False if field == "trashed" else None) == expected
+
+    def conjunction():
+        predicates = [atom()]
+        while peek() == "and":
+            take()
+            predicates.append(atom())
+        return lambda file: all(predicate(file) for predicate in predicates)
+
+    def expression():
+        predicates = [conjunction()]
+        while peek() == "or":
+            take()
+            predicates.append(conjunction())
+        return lambda file: any(predicate(file) for predicate in predicates)
+
+    return expression() if tokens else (lambda file: True)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _error(status: int, message: str, reason: str = "error") -> dict:
+    return {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+
+
+class FakeDrive:
+    """
+    🧪 Drive falso en memoria, servido por HTTP: archivos, listados con `q` y paginación,
+    descargas con `Range`, uploads resumables, pedidos batch y errores inyectados.
+
+    Ambos backends (googleapiclient y httpx) hablan con él por la red, así los tests
+    comprueban que se comportan igual frente a las mismas respuestas.
+    """
+
+    def __init__(self):
+        self.files: dict[str, dict] = {}
+        self.media: dict[str, bytes] = {}
+        self.requests: list[tuple[str, str]] = []
+        self._sessions: dict[str, tuple[str | None, dict, bytearray]] = {}
+        self._failures: deque[tuple[int, str]] = deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.url = ""
+        self.ignore_range = False           # Responde 200 con el archivo completo aunque se pida un rango
+        self.omit_content_range = False     # Responde 206 sin el header Content-Range
+
+    # 🧰 Preparación de escenarios
+
+    def _new_id(self, prefix: str = "f") -> str:
+        with self._lock:
+            return f"{prefix}{next(self._ids)}"
+
+    def _store(self, file_id: str, metadata: dict, data: bytes | None = None):
+        now = _now()
+        file = {"createdTime": now, **self.files.get(file_id, {}), **metadata, "id": file_id, "modifiedTime": now}
+        file.setdefault("mimeType", "application/octet-stream")
+        file.setdefault("parents", [])
+        if data is not None:
+            self.media[file_id] = data
+            file["size"] = str(len(data))
+            file["md5Checksum"] = hashlib.md5(data).hexdigest()
+        self.files[file_id] = file
+        return file
+
+    def add_file(self, name: str, parent: str, data: bytes = b"", **metadata) -> str:
+        file_id = self._new_id()
+        self._store(file_id, {"name": name, "parents": [parent], "mimeType": "image/png", **metadata}, data)
+        return file_id
+
+    def add_folder(self, name: str, parent: str) -> str:
+        file_id = self._new_id("d")
+        self._store(file_id, {"name": name, "parents": [parent], "mimeType": FOLDER_MIMETYPE})
+        return file_id
+
+    def fail_next(self, status: int, count: int = 1, reason: str = "backendError"):
+        # Los próximos `count` requests (fuera de batch) responden con este error
+        self._failures.extend([(status, reason)] * count)
+
+    def count(self, method: str, path: str) -> int:
+        return sum(1 for m, p in self.requests if m == method and p == path)
+
+    # 🌐 Rutas
+
+    async def _list(self, request: Request, params=None):
+        params = params or request.query_params
+        predicate = compile_query(params.get("q", ""))
+        found = [file for file in self.files.values() if predicate(file)]
+        order = params.get("orderBy", "name")
+        key, _, direction = order.partition(" ")
+        found.sort(key=lambda file: file.get(key, ""), reverse=direction == "desc")
+
+        offset = int(params.get("pageToken") or 0)
+        size = int(params.get("pageSize", 100))
+        page = found[offset:offset + size]
+        projection = re.search(r"files\(([^)]*)\)", params.get("fields", ""))
+        if projection:   # Como Drive, solo los campos pedidos
+            fields = [field.strip() for field in projection[1].split(",")]
+            page = [{key: file[key] for key in fields if key in file} for file in page]
+        body = {"files": page}
+        if offset + size < len(found):
+            body["nextPageToken"] = str(offset + size)
+        return JSONResponse(body)
+
+    async def _files(self, request: Request):
+        if request.method == "GET":
+            return await self._list(request)
+        if request.headers.get("x-http-method-override") == "GET":
+            # googleapiclient manda los GET de URL larga como POST con los parámetros en el cuerpo
+            return await self._list(request, dict(parse_qsl((await request.body()).decode())) | dict(request.query_params))
+        metadata = await request.json()
+        file = self._store(self._new_id("d" if metadata.get("mimeType") == FOLDER_MIMETYPE else "f"), metadata)
+        return JSONResponse({"id": file["id"]})
+
+    def _media(self, request: Request, file_id: str) -> Response:
+        data = self.media.get(file_id, b"")
+        header = request.headers.get("range")
+        if not header or self.ignore_range:
+            return Response(data)
+        start_text, _, end_text = header.removeprefix("bytes=").partition("-")
+        start = int(start_text)
+        end = min(int(end_text) if end_text else len(data) - 1, len(data) - 1)
+        if start >= len(data):
+            return Response(status_code=416, headers={"content-range": f"bytes */{len(data)}"})
+        headers = {} if self.omit_content_range else {"content-range": f"bytes {start}-{end}/{len(data)}"}
+        return Response(data[start:end + 1], status_code=206, headers=headers)
+
+    async def _file(self, request: Request):
+        file_id = request.path_params["file_id"]
+        if file_id not in self.files:
+            return JSONResponse(_error(404, f"File not found: {file_id}.", "notFound"), status_code=404)
+        if request.method == "DELETE":
+            self.files.pop(file_id)
+            self.media.pop(file_id, None)
+            return Response(status_code=204)
+        if request.method == "PATCH":
+            body = await request.json()
+            properties = dict(self.files[file_id].get("appProperties") or {})
+            for key, value in (body.pop("appProperties", None) or {}).items():
+                if value is None:
+                    properties.pop(key, None)
+                else:
+                    properties[key] = value
+            self._store(file_id, {**body, "appProperties": properties})
+            return JSONResponse({"id": file_id})
+        if request.query_params.get("alt") == "media":
+            return self._media(request, file_id)
+        return JSONResponse(self.files[file_id])
+
+    async def _start_upload(self, request: Request):
+        file_id = request.path_params.get("file_id")
+        if file_id and file_id not in self.files:
+            return JSONResponse(_error(404, f"File not found: {file_id}.", "notFound"), status_code=404)
+        metadata = await request.json() if await request.body() else {}
+        if request.headers.get("x-upload-content-type"):
+            metadata["mimeType"] = request.headers["x-upload-content-type"]
+        session_id = self._new_id("s")
+        self._sessions[session_id] = (file_id, metadata, bytearray())
+        return Response(headers={"location": f"{self.url}/upload/sessions/{session_id}"})
+
+    async def _upload_chunk(self, request: Request):
+        file_id, metadata, buffer = self._sessions[request.path_params["session_id"]]
+        content_range = request.headers.get("content-range", "")
+        body = await request.body()
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range)
+        if match and int(match[1]) == len(buffer):
+            buffer += body
+        total = content_range.rsplit("/", 1)[-1]
+        if total == "*" or len(buffer) < int(total):
+            headers = {"range": f"bytes=0-{len(buffer) - 1}"} if buffer else {}
+            return Response(status_code=308, headers=headers)
+        file_id = file_id or self._new_id()
+        file = self._store(file_id, metadata, bytes(buffer))
+        return JSONResponse({"id": file["id"], "name": file.get("name")})
+
+    async def _batch(self, request: Request):
+        raw = await request.body()
+        message = BytesParser().parsebytes(f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode() + raw)
+        boundary, parts = "fake_batch_response", []
+        for part in message.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            method, path, _ = part.get_payload().splitlines()[0].split(" ", 2)
+            self.requests.append((f"BATCH {method}", path.split("?")[0]))
+            file_id = path.split("?")[0].rsplit("/", 1)[1]
+            if file_id not in self.files:
+                status, body = 404, json.dumps(_error(404, f"File not found: {file_id}.", "notFound"))
+            elif method == "DELETE":
+                self.files.pop(file_id)
+                status, body = 204, ""
+            else:
+                status, body = 200, json.dumps(self.files[file_id])
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n\r\n{body}\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        return Response("".join(parts), headers={"content-type": f"multipart/mixed; boundary={boundary}"})
+
+    @property
+    def app(self):
+        inner = Starlette(routes=[
+            Route("/drive/v3/files", self._files, methods=["GET", "POST"]),
+            Route("/drive/v3/files/{file_id}", self._file, methods=["GET", "PATCH", "DELETE"]),
+            Route("/upload/drive/v3/files", self._start_upload, methods=["POST"]),
+            Route("/upload/drive/v3/files/{file_id}", self._start_upload, methods=["PATCH"]),
+            Route("/upload/sessions/{session_id}", self._upload_chunk, methods=["PUT"]),
+            Route("/batch/drive/v3", self._batch, methods=["POST"]),
+        ])
+
+        async def app(scope, receive, send):
+            if scope["type"] == "http":
+                self.requests.append((scope["method"], scope["path"]))
+                if self._failures and not scope["path"].startswith("/batch"):
+                    status, reason = self._failures.popleft()
+                    response = JSONResponse(_error(status, reason, reason), status_code=status)
+                    return await response(scope, receive, send)
+            return await inner(scope, receive, send)
+
+        return app
+
+
+@contextmanager
+def serve(drive: FakeDrive):
+    """
+    🚀 Sirve el Drive falso en un puerto libre de localhost mientras dura el bloque.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    drive.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server = uvicorn.Server(uvicorn.Config(drive.app, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield drive
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from googleapiclient.errors import HttpError
+
+from app.drive.config import settings
+from app.drive.services.folder_cache import SqliteFolderStore, folder_cache
+from conftest import run
+from fake_drive import FOLDER_MIMETYPE
+
+
+async def _read(backend, file_id: str, **kwargs) -> bytes:
+    return b"".join([chunk async for chunk in backend.iter_file_chunks(file_id, **kwargs)])
+
+
+def test_resumable_upload_and_download(backend, fake_drive, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 256 * 1024)
+    monkeypatch.setattr(settings, "DOWNLOAD_CHUNK_SIZE", 64 * 1024)
+    data = bytes(range(256)) * 2500   # Varios chunks de subida y de descarga
+
+    async def scenario(drive):
+        file_id = await drive.upload_file_to_folder(data, "foto.png", "image/png", "folder", {"origen": "test"})
+        return file_id, await drive.get_file_metadata(file_id), await _read(drive, file_id)
+
+    file_id, metadata, downloaded = run(backend, scenario)
+    assert downloaded == data
+    assert metadata["name"] == "foto.png" and metadata["parents"] == ["folder"]
+    assert metadata["mimeType"] == "image/png" and int(metadata["size"]) == len(data)
+    assert metadata["appProperties"] == {"origen": "test"}
+    assert fake_drive.media[file_id] == data
+
+
+def test_download_with_range(backend, fake_drive):
+    data = bytes(range(200))
+    file_id = fake_drive.add_file("a.png", "folder", data)
+    empty_id = fake_drive.add_file("vacio.png", "folder", b"")
+
+    async def scenario(drive):
+        return (
+            await _read(drive, file_id, start=10, end=19),
+            await _read(drive, file_id, start=150),
+            await _read(drive, empty_id),
+        )
+
+    middle, tail, empty = run(backend, scenario)
+    assert middle == data[10:20]
+    assert tail == data[150:]
+    assert empty == b""
+
+
+def test_batch_metadata_and_delete(backend, fake_drive):
+    first = fake_drive.add_file("a.png", "folder", b"a")
+    second = fake_drive.add_file("b.png", "folder", b"b")
+
+    async def scenario(drive):
+        metadata = await drive.get_files_metadata([first, second, "missing"])
+        deleted = await drive.delete_files([first, "missing"])
+        with pytest.raises(FileNotFoundError):
+            await drive.get_file_metadata(first)
+        return metadata, deleted
+
+    metadata, deleted = run(backend, scenario)
+    assert metadata[first]["status"] == 200 and metadata[first]["result"]["name"] == "a.png"
+    assert metadata[second]["result"]["md5Checksum"] == fake_drive.files[second]["md5Checksum"]
+    assert metadata["missing"]["status"] == 404
+    assert deleted[first]["status"] < 300 and deleted["missing"]["status"] == 404
+    assert first not in fake_drive.files and second in fake_drive.files
+    assert fake_drive.count("POST", "/batch/drive/v3") == 2   # Un pedido HTTP por operación
+
+
+def test_list_pages_skip_derivatives(backend, fake_drive):
+    for name in ["c.png", "a.png", "e.png", "b.png", "d.png"]:
+        fake_drive.add_file(name, "folder", b"x")
+    fake_drive.add_file("a_128.png", "folder", b"t", appProperties={"derivative": "true"})
+    fake_drive.add_file("otra.png", "other-folder", b"x")
+
+    async def scenario(drive):
+        first, token = await drive.list_files_page("folder", None, 2)
+        pages = [page async for page in drive.iter_file_pages("folder", None, 2)]
+        return first, token, pages, await drive.list_files_in_folder("folder")
+
+    first, token, pages, everything = run(backend, scenario)
+    assert [file["name"] for file in first] == ["a.png", "b.png"] and token
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [file["name"] for file in everything] == ["a.png", "b.png", "c.png", "d.png", "e.png"]
+
+
+def test_error_mapping(backend, fake_drive):
+    async def scenario(drive):
+        with pytest.raises(FileNotFoundError):
+            await drive.get_file_metadata("missing")
+        with pytest.raises(FileNotFoundError):
+            await _read(drive, "missing")
+
+        fake_drive.fail_next(400, reason="badRequest")
+        with pytest.raises(HttpError) as bad_request:
+            await drive.list_files_page("folder")
+        assert bad_request.value.resp.status == 400
+
+        fake_drive.fail_next(503, count=settings.DRIVE_MAX_ATTEMPTS)
+        with pytest.raises(HTTPException) as exhausted:
+            await drive.list_files_page("folder")
+        assert exhausted.value.status_code == 503 and exhausted.value.headers["Retry-After"]
+
+        fake_drive.fail_next(429, reason="rateLimitExceeded")
+        files, _ = await drive.list_files_page("folder")
+        return files
+
+    assert run(backend, scenario) == []
+
+
+def test_get_or_create_subfolder(backend, fake_drive):
+    async def scenario(drive):
+        created = await drive.get_or_create_subfolder("P1", "products")
+        folder_cache.clear()
+        again = await drive.get_or_create_subfolder("P1", "products")
+        return created, again, await drive.get_subfolder_id("P1", "products"), await drive.get_subfolder_id("P2", "products")
+
+    created, again, found, missing = run(backend, scenario)
+    assert created == again == found and missing is None
+    assert fake_drive.files[created]["mimeType"] == FOLDER_MIMETYPE
+    assert fake_drive.count("POST", "/drive/v3/files") == 1
+
+
+def test_folder_creation_is_serialized_across_workers(backend, fake_drive, tmp_path, monkeypatch):
+    # Dos instancias del backend simulan dos workers: solo las une el lock de SQLite
+    monkeypatch.setattr(folder_cache, "store", SqliteFolderStore(str(tmp_path / "folders.db")))
+    other = type(backend)()
+
+    async def scenario(drive):
+        try:
+            return await asyncio.gather(*(
+                worker.get_or_create_subfolder("P1", "products") for worker in (drive, other, drive, other)
+            ))
+        finally:
+            await other.aclose()
+
+    ids = run(backend, scenario)
+    assert len(set(ids)) == 1
+    assert fake_drive.count("POST", "/drive/v3/files") == 1
+
+
+def test_range_ignored_by_server(backend, fake_drive, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_CHUNK_SIZE", 16)
+    data = bytes(range(200))
+    file_id = fake_drive.add_file("a.png", "folder", data)
+    fake_drive.ignore_range = True   # 200 con el archivo completo desde el byte 0
+
+    async def scenario(drive):
+        return await _read(drive, file_id, start=10, end=49), await _read(drive, file_id, start=150)
+
+    middle, tail = run(backend, scenario)
+    assert middle == data[10:50]
+    assert tail == data[150:]
+
+
+def test_partial_response_without_content_range(backend, fake_drive):
+    file_id = fake_drive.add_file("a.png", "folder", bytes(100))
+    fake_drive.omit_content_range = True
+
+    async def scenario(drive):
+        with pytest.raises(HttpError) as error:
+            await _read(drive, file_id, start=10, end=19)
+        return error.value.resp.status
+
+    assert run(backend, scenario) == 206
+
+
+def test_find_files_by_stem_matches_exact_names(backend, fake_drive, monkeypatch):
+    monkeypatch.setattr(settings, "LIST_MAX_PAGE_SIZE", 2)
+    profiles = settings.PROFILE_IMAGE_FOLDER_ID
+    for name in ["1.png", "12.jpg", "10.png", "100.png", "123.png", "1a.webp", "1.png.bak"]:
+        fake_drive.add_file(name, profiles, b"x")
+
+    # Un lote completo: la URL es tan larga que googleapiclient la envía como POST con override
+    stems = ["1", "12"] + [f"u{i}" for i in range(settings.AVATAR_NAMES_PER_QUERY // len(settings.ALLOWED_EXTENSIONS) - 2)]
+
+    async def scenario(drive):
+        return await drive.find_files_by_stem(profiles, stems)
+
+    found = run(backend, scenario)
+    assert {stem: file["name"] for stem, file in found.items()} == {"1": "1.png", "12": "12.jpg"}
+    # Sin prefijos de más: una sola página
+    assert fake_drive.count("GET", "/drive/v3/files") + fake_drive.count("POST", "/drive/v3/files") == 1
@@ -0,0 +1,21 @@
+import pytest
+
+from benchmark_cold_start import FIRST_RESPONSE_BUDGET_MS, IMPORT_BUDGET_MS, measure_once
+
+
+def test_cold_start_probe_serves_the_app(monkeypatch):
+    # Sin tiempos: el arranque en un proceso nuevo responde y queda listo sin warm-up
+    monkeypatch.setenv("WARMUP_ENABLED", "false")
+    sample = measure_once()
+    assert sample["errors"] == {}
+    assert 0 < sample["first_response_ms"] <= sample["ready_ms"]
+
+
+@pytest.mark.slow
+def test_cold_start_within_budget():
+    # El mejor de tres procesos nuevos: descarta el ruido de una sola medición
+    samples = [measure_once() for _ in range(3)]
+    import_ms = min(sample["import_ms"] for sample in samples)
+    first_ms = min(sample["first_response_ms"] for sample in samples)
+    assert import_ms <= IMPORT_BUDGET_MS, f"Import de app.drive.main: {import_ms:.0f} ms"
+    assert first_ms <= FIRST_RESPONSE_BUDGET_MS, f"Primera respuesta: {first_ms:.0f} ms"
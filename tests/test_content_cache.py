@@ -0,0 +1,152 @@
+import asyncio
+import os
+
+from fastapi import Request
+
+from app.drive.utils import responses
+from app.drive.services.content_cache import SERVE_PREFIX, DiskContentCache
+
+METADATA = {"md5Checksum": "abc", "modifiedTime": "2025-01-01T00:00:00.000Z", "size": "6"}
+
+
+async def _chunks(data: bytes):
+    for i in range(0, len(data), 2):
+        await asyncio.sleep(0)
+        yield data[i:i + 2]
+
+
+async def _drain(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _fill(cache: DiskContentCache, file_id: str, data: bytes, metadata: dict = METADATA):
+    asyncio.run(_drain(cache.fill(file_id, {**metadata, "size": str(len(data))}, _chunks(data))))
+
+
+def test_concurrent_fills_of_same_version_keep_the_entry(tmp_path):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+
+    async def fill_twice():
+        return await asyncio.gather(
+            _drain(cache.fill("f1", METADATA, _chunks(b"abcdef"))),
+            _drain(cache.fill("f1", METADATA, _chunks(b"abcdef"))),
+        )
+
+    assert asyncio.run(fill_twice()) == [b"abcdef", b"abcdef"]
+    cached = cache.acquire("f1", METADATA)
+    assert cached is not None and _read(cached) == b"abcdef"
+    cache.release(cached)
+    assert cache._total_bytes == 6
+
+
+def test_refill_after_same_version_still_served(tmp_path):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    for _ in range(3):
+        _fill(cache, "f1", b"abcdef")
+    cached = cache.acquire("f1", METADATA)
+    assert _read(cached) == b"abcdef"
+    cache.release(cached)
+
+
+def test_acquired_link_survives_invalidate(tmp_path):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    _fill(cache, "f1", b"abcdef")
+
+    cached = cache.acquire("f1", METADATA)
+    cache.invalidate("f1")
+    assert _read(cached) == b"abcdef"   # El enlace de la respuesta mantiene vivo el contenido
+    cache.release(cached)
+    assert cache.acquire("f1", METADATA) is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_other_version_misses(tmp_path):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    _fill(cache, "f1", b"abcdef")
+    assert cache.acquire("f1", {**METADATA, "md5Checksum": "other"}) is None
+
+
+def test_workers_share_entries_and_byte_budget(tmp_path):
+    # Dos instancias sobre el mismo directorio simulan dos workers
+    first = DiskContentCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    second = DiskContentCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    _fill(first, "f1", b"abcdef")
+
+    cached = second.acquire("f1", METADATA)   # Miss local: se relee el directorio
+    assert cached is not None and _read(cached) == b"abcdef"
+    second.release(cached)
+
+    _fill(second, "f2", b"ghijkl")             # 12 bytes > 10: se desaloja f1, el menos usado
+    assert second._total_bytes == 6
+    assert first.acquire("f1", METADATA) is None
+    assert first._total_bytes == 6 and list(first._entries) == ["f2"]
+
+
+def test_orphan_links_are_removed_on_startup(tmp_path):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    _fill(cache, "f1", b"abcdef")
+    live = cache.acquire("f1", METADATA)
+    orphan = os.path.join(tmp_path, f"{SERVE_PREFIX}999999999-dead")
+    os.link(live, orphan)
+
+    DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    assert os.path.exists(live) and not os.path.exists(orphan)
+
+
+def _serve(cache: DiskContentCache, monkeypatch, headers: dict | None = None, extensions: dict | None = None) -> list[dict]:
+    monkeypatch.setattr(responses, "content_cache", cache)
+    scope = {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "extensions": extensions or {},
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        metadata = {**METADATA, "id": "f1", "name": "a.png", "mimeType": "image/png"}
+        response = await responses.build_download_response(Request(scope), "f1", metadata)
+        await response(scope, receive, send)
+
+    asyncio.run(run())
+    return messages
+
+
+def _links(path) -> list[str]:
+    return [name for name in os.listdir(path) if name.startswith(SERVE_PREFIX)]
+
+
+def test_cache_hit_is_sent_with_pathsend_and_released(tmp_path, monkeypatch):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    _fill(cache, "f1", b"abcdef")
+
+    messages = _serve(cache, monkeypatch, extensions={"http.response.pathsend": {}})
+    assert messages[0]["status"] == 200
+    assert messages[1]["type"] == "http.response.pathsend"
+    assert os.path.basename(messages[1]["path"]).startswith(SERVE_PREFIX)
+    assert _links(tmp_path) == []
+
+    messages = _serve(cache, monkeypatch)   # Sin pathsend: FileResponse lee el archivo
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == b"abcdef"
+    assert _links(tmp_path) == []
+
+
+def test_cached_range_and_unsatisfiable_range_release_the_link(tmp_path, monkeypatch):
+    cache = DiskContentCache(str(tmp_path), max_bytes=1024, max_entry_bytes=1024)
+    _fill(cache, "f1", b"abcdef")
+
+    messages = _serve(cache, monkeypatch, {"Range": "bytes=1-3"})
+    assert messages[0]["status"] == 206
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == b"bcd"
+    assert _serve(cache, monkeypatch, {"Range": "bytes=10-"})[0]["status"] == 416
+    assert _links(tmp_path) == []
@@ -0,0 +1,40 @@
+import io
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.drive.config import settings
+from app.drive.services.dedup import CONTENT_MD5_KEY, SOURCE_NAME_KEY, DedupBackend, content_md5
+from conftest import run
+
+
+def _upload(data: bytes, filename: str) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=filename, headers=Headers({"content-type": "image/png"}))
+
+
+def test_upload_reuses_existing_content(backend, fake_drive):
+    async def scenario(drive):
+        drive = DedupBackend(drive)
+        first = await drive.upload_file_to_folder(b"foto", "a.png", "image/png", "folder")
+        return first, await drive.upload_file_to_folder(b"foto", "b.png", "image/png", "folder")
+
+    first, second = run(backend, scenario)
+    assert first == second
+    assert fake_drive.files[first]["appProperties"][CONTENT_MD5_KEY] == content_md5(b"foto")
+
+
+def test_replace_refreshes_md5_and_source_name(backend, fake_drive):
+    profiles = settings.PROFILE_IMAGE_FOLDER_ID
+
+    async def scenario(drive):
+        drive = DedupBackend(drive)
+        file_id = await drive.upload_file_to_folder(b"vieja", "7.png", "image/png", profiles)
+        await drive.replace_file(file_id, _upload(b"nueva", "avatar.jpg"), "7.jpg")
+        again = await drive.upload_file_to_folder(b"nueva", "7.jpg", "image/jpeg", profiles)
+        return file_id, again
+
+    file_id, again = run(backend, scenario)
+    properties = fake_drive.files[file_id]["appProperties"]
+    assert properties[CONTENT_MD5_KEY] == content_md5(b"nueva")
+    assert properties[SOURCE_NAME_KEY] == "7.jpg"
+    assert again == file_id   # La misma imagen subida de nuevo con el nombre actual se reconoce
@@ -0,0 +1,71 @@
+import asyncio
+import io
+
+import pytest
+
+from app.drive.config import settings
+from app.drive.services import derivatives
+from app.drive.services.derivatives import DerivativesBackend, shutdown_image_pool
+from conftest import run
+
+PIL = pytest.importorskip("PIL.Image")
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    PIL.new("RGB", (64, 48), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def thumbnails(monkeypatch):
+    monkeypatch.setattr(settings, "THUMBNAIL_SIZES", [16])
+    monkeypatch.setattr(settings, "TRANSCODE_FORMAT", None)
+    yield
+    shutdown_image_pool()
+
+
+def _derivatives(fake_drive) -> list[str]:
+    return [file_id for file_id, file in fake_drive.files.items() if (file.get("appProperties") or {}).get("derivative")]
+
+
+async def _upload(drive) -> str:
+    return await drive.upload_file_to_folder(_png(), "a.png", "image/png", "folder")
+
+
+def test_thumbnails_are_linked(backend, fake_drive, thumbnails):
+    async def scenario(drive):
+        file_id = await _upload(DerivativesBackend(drive))
+        await derivatives._pending[file_id]
+        return file_id
+
+    file_id = run(backend, scenario)
+    [thumbnail] = _derivatives(fake_drive)
+    assert fake_drive.files[file_id]["appProperties"] == {"thumb_16": thumbnail}
+
+
+def test_thumbnails_of_replaced_content_are_discarded(backend, fake_drive, thumbnails):
+    async def scenario(drive):
+        file_id = await _upload(DerivativesBackend(drive))
+        fake_drive.files[file_id]["md5Checksum"] = "otro-contenido"   # Reemplazado desde otro worker
+        await derivatives._pending[file_id]
+        return file_id
+
+    file_id = run(backend, scenario)
+    assert _derivatives(fake_drive) == []
+    assert not fake_drive.files[file_id].get("appProperties")
+
+
+def test_delete_during_build_leaves_no_orphans(backend, fake_drive, thumbnails):
+    async def scenario(drive):
+        drive = DerivativesBackend(drive)
+        file_id = await _upload(drive)
+        task = derivatives._pending[file_id]
+        await asyncio.sleep(0.2)   # La generación ya está en curso
+        await drive.delete_file(file_id)
+        await asyncio.gather(task, return_exceptions=True)
+        return file_id
+
+    file_id = run(backend, scenario)
+    assert file_id not in fake_drive.files
+    assert _derivatives(fake_drive) == []
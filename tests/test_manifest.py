@@ -0,0 +1,23 @@
+from app.drive.config import settings
+from app.drive.services.manifest import build_manifests
+from conftest import run
+
+
+def test_manifest_entries_match_the_listing(backend, fake_drive):
+    product = fake_drive.add_folder("P1", settings.PRODUCTS_IMAGE_FOLDER_ID)
+    image = fake_drive.add_file("a.png", product, b"a", appProperties={"content_md5": "x"})
+    fake_drive.add_file("a_128.png", product, b"t", appProperties={"derivative": "true", "derivative_of": image})
+    fake_drive.files[image]["appProperties"]["thumb_128"] = "t"
+    subproduct = fake_drive.add_folder("S1", product)
+    fake_drive.add_file("b.png", subproduct, b"b", appProperties={"source_name": "b.png"})
+
+    async def scenario(drive):
+        manifests = await build_manifests(drive, ["P1", "P2"])
+        listed = (await drive.list_files_page(product))[0], (await drive.list_files_page(subproduct))[0]
+        return manifests, listed
+
+    manifests, (product_listing, subproduct_listing) = run(backend, scenario)
+    assert manifests["P1"]["images"] == [file for file in product_listing if file["id"] == image]
+    assert manifests["P1"]["subproducts"] == {"S1": {"images": subproduct_listing}}
+    assert set(manifests["P1"]["images"][0]) == {"id", "name", "mimeType", "createdTime", "modifiedTime"}
+    assert manifests["P2"] == {"images": [], "subproducts": {}}
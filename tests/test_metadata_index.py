@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+from app.drive.config import settings
+from app.drive.services import metadata_index as module
+from app.drive.services.folders import FOLDER_MIMETYPE
+from app.drive.services.metadata_index import MetadataIndex
+
+
+class _Call:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class FakeService:
+    """
+    🧪 Cliente de Drive mínimo: una carpeta raíz vacía y un feed de cambios con un token propio.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = []
+        self.pages: list[list[dict]] = []   # Páginas pendientes del feed de cambios
+
+    def changes(self):
+        return self
+
+    def files(self):
+        return self
+
+    def getStartPageToken(self):
+        self.calls.append("getStartPageToken")
+        return _Call({"startPageToken": f"{self.name}-1"})
+
+    def list(self, **params):
+        if "pageToken" in params and "q" not in params:
+            self.calls.append(("changes.list", params["pageToken"]))
+            changes = self.pages.pop(0) if self.pages else []
+            if self.pages:
+                return _Call({"changes": changes, "nextPageToken": f"{params['pageToken']}+"})
+            return _Call({"changes": changes, "newStartPageToken": params["pageToken"]})
+        self.calls.append("files.list")
+        return _Call({"files": []})
+
+
+def _use_account(monkeypatch, name: str) -> FakeService:
+    service = FakeService(name)
+    account = SimpleNamespace(identity=f"{name}@example.iam.gserviceaccount.com", get_service=lambda: service)
+    monkeypatch.setattr(module, "drive_pool", SimpleNamespace(primary=account))
+    return service
+
+
+def test_sync_uses_the_account_that_owns_the_token(tmp_path, monkeypatch):
+    index = MetadataIndex(str(tmp_path / "index.db"), max_lag_seconds=60)
+    first = _use_account(monkeypatch, "a")
+    index.rebuild()
+    assert index._get_state("account") == "a@example.iam.gserviceaccount.com"
+
+    index.sync_changes()
+    assert first.calls[-1] == ("changes.list", "a-1")
+
+
+def test_sync_rebuilds_when_the_account_changes(tmp_path, monkeypatch):
+    index = MetadataIndex(str(tmp_path / "index.db"), max_lag_seconds=60)
+    _use_account(monkeypatch, "a")
+    index.rebuild()
+
+    second = _use_account(monkeypatch, "b")
+    index.sync_changes()
+    assert "getStartPageToken" in second.calls
+    assert not any(isinstance(call, tuple) for call in second.calls)   # Nunca usa el token de la otra cuenta
+    assert index._get_state("page_token") == "b-1"
+    assert index._get_state("account") == "b@example.iam.gserviceaccount.com"
+
+
+def _change(file_id: str, parent: str, mime_type: str = "image/png", **extra) -> dict:
+    file = {"id": file_id, "name": file_id, "parents": [parent], "mimeType": mime_type, "modifiedTime": "2025-01-01T00:00:00Z"}
+    return {"fileId": file_id, "file": {**file, **extra}}
+
+
+def test_sync_keeps_children_listed_before_their_new_folder(tmp_path, monkeypatch):
+    root = settings.PRODUCTS_IMAGE_FOLDER_ID
+    index = MetadataIndex(str(tmp_path / "index.db"), max_lag_seconds=60)
+    service = _use_account(monkeypatch, "a")
+    index.rebuild()
+
+    service.pages = [
+        [_change("photo", "p1"), _change("stray", "elsewhere")],
+        [_change("p1", root, FOLDER_MIMETYPE), _change("nested", "p1", FOLDER_MIMETYPE)],
+        [_change("moved", "nested"), _change("nested", "elsewhere", FOLDER_MIMETYPE)],
+    ]
+    index.sync_changes()
+
+    assert [file["id"] for file in index.children("p1")] == ["photo"]
+    assert index.is_tracked_folder("p1")
+    for file_id in ("stray", "nested", "moved"):   # Fuera de las raíces (directo o por su carpeta)
+        assert index._conn().execute("SELECT 1 FROM files WHERE id = ?", (file_id,)).fetchone() is None
+    assert index._get_state("prune_pending") is None
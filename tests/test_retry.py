@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.drive.config import settings
+from app.drive.services.retry import RetryingHttp, is_idempotent, new_limiter, send_with_retry
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "DRIVE_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "DRIVE_RETRY_MAX_SECONDS", 0.001)
+
+
+def _route():
+    return SimpleNamespace(limiter=new_limiter("test"), record=lambda kind: None)
+
+
+class FakeHttp:
+    """
+    🧪 Transporte httplib2 falso: devuelve las respuestas programadas y cuenta los envíos.
+    """
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return SimpleNamespace(status=status, get=lambda key, default=None: default), b"{}"
+
+
+def test_idempotency_rules():
+    assert is_idempotent("GET") and is_idempotent("delete") and is_idempotent("PUT") and is_idempotent("PATCH")
+    assert not is_idempotent("POST", "https://www.googleapis.com/drive/v3/files?fields=id")
+    assert is_idempotent("POST", "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable")
+    assert is_idempotent("POST", "https://www.googleapis.com/batch/drive/v3")
+
+
+def test_get_is_retried_on_transient_errors():
+    http = FakeHttp(503, 200)
+    resp, _ = RetryingHttp(http, _route()).request("https://drive/files/1", "GET")
+    assert resp.status == 200 and http.calls == 2
+
+
+def test_create_is_not_retried_on_transient_errors():
+    http = FakeHttp(503, 200)
+    with pytest.raises(HTTPException) as error:
+        RetryingHttp(http, _route()).request("https://drive/files?fields=id", "POST")
+    assert error.value.status_code == 503 and http.calls == 1
+
+
+def test_create_is_not_retried_on_network_errors():
+    http = FakeHttp(OSError("reset"), 200)
+    with pytest.raises(OSError):
+        RetryingHttp(http, _route()).request("https://drive/files?fields=id", "POST")
+    assert http.calls == 1
+
+
+def test_create_is_retried_on_rate_limit():
+    http = FakeHttp(429, 200)
+    resp, _ = RetryingHttp(http, _route()).request("https://drive/files?fields=id", "POST")
+    assert resp.status == 200 and http.calls == 2
+
+
+def test_resumable_session_is_retried_on_transient_errors():
+    http = FakeHttp(503, 200)
+    resp, _ = RetryingHttp(http, _route()).request("https://drive/upload/files?uploadType=resumable", "POST")
+    assert resp.status == 200 and http.calls == 2
+
+
+def _async_send(*statuses):
+    calls = []
+
+    async def send(route):
+        calls.append(route)
+        return httpx.Response(statuses[len(calls) - 1])
+
+    return send, calls
+
+
+def test_async_create_is_not_retried_on_transient_errors():
+    route = _route()
+    send, calls = _async_send(503, 200)
+    with pytest.raises(HTTPException):
+        asyncio.run(send_with_retry(lambda: route, send, idempotent=False))
+    assert len(calls) == 1
+
+
+def test_async_idempotent_request_is_retried():
+    route = _route()
+    send, calls = _async_send(503, 200)
+    response = asyncio.run(send_with_retry(lambda: route, send))
+    assert response.status_code == 200 and len(calls) == 2
@@ -0,0 +1,71 @@
+import asyncio
+import io
+import zipfile
+
+from app.drive.services.export import ERRORS_ENTRY, iter_zip
+from app.drive.utils.zip_stream import ZIP_ENTRIES_LIMIT, ZipStreamWriter
+
+
+def _build(entries: list[tuple[str, bytes]]) -> bytes:
+    writer, parts = ZipStreamWriter(), []
+    for name, data in entries:
+        parts.append(writer.start_entry(writer.unique_name(name)))
+        if data:
+            parts.append(writer.write(data))
+        parts.append(writer.end_entry())
+    parts.extend(writer.finish())
+    return b"".join(parts)
+
+
+def test_duplicate_and_empty_entries():
+    archive = zipfile.ZipFile(io.BytesIO(_build([
+        ("foto.jpg", b"uno"), ("foto.jpg", b"dos"), ("vacio.png", b""), ("p/foto.jpg", b"tres"),
+    ])))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["foto.jpg", "foto (2).jpg", "vacio.png", "p/foto.jpg"]
+    assert archive.read("foto (2).jpg") == b"dos"
+    assert archive.read("vacio.png") == b""
+
+
+def test_names_cannot_escape_the_archive():
+    writer = ZipStreamWriter()
+    assert writer.unique_name("../../etc/passwd") == "etc/passwd"
+    assert writer.unique_name("/abs/./x.jpg") == "abs/x.jpg"
+    assert writer.unique_name("p//..\\x.jpg") == "p/.._x.jpg"
+    assert writer.unique_name("..") == "archivo"
+    assert writer.unique_name("") == "archivo (2)"
+
+
+def test_zip64_tail_beyond_entry_limit():
+    count = ZIP_ENTRIES_LIMIT + 1
+    data = _build([(f"{i}.txt", b"") for i in range(count)])
+    assert b"PK\x06\x06" in data[-200:]   # Registro final ZIP64
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    assert len(archive.infolist()) == count
+    assert archive.namelist()[-1] == f"{count - 1}.txt"
+
+
+class _FakeDrive:
+    def __init__(self, files: dict[str, bytes | Exception]):
+        self.files = files
+
+    async def iter_file_chunks(self, file_id: str):
+        content = self.files[file_id]
+        if isinstance(content, Exception):
+            raise content
+        yield content
+
+
+def test_failed_downloads_are_listed_in_errors_entry():
+    drive = _FakeDrive({"1": b"ok", "2": FileNotFoundError("no existe"), "3": b""})
+
+    async def files():
+        for file_id, name in [("1", "a.jpg"), ("2", "../b.jpg"), ("3", "c.jpg")]:
+            yield name, {"id": file_id, "name": name}
+
+    async def export() -> bytes:
+        return b"".join([piece async for piece in iter_zip(drive, files())])
+
+    archive = zipfile.ZipFile(io.BytesIO(asyncio.run(export())))
+    assert archive.namelist() == ["a.jpg", "c.jpg", ERRORS_ENTRY]
+    assert archive.read(ERRORS_ENTRY).decode() == "b.jpg: FileNotFoundError: no existe\n"